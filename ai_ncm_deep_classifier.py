@@ -29,9 +29,8 @@ import json
 import base64
 import logging
 import asyncio
-from typing import Dict, List, Optional, Union, Any, Tuple
+from typing import Dict, List, Optional, Union, Any, Tuple, Iterable, AsyncIterator
 from pathlib import Path
-import requests
 from datetime import datetime
 import re
 import traceback
@@ -42,7 +41,7 @@ logger = logging.getLogger(__name__)
 
 # Intentar importar OpenAI
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
@@ -56,7 +55,19 @@ except ImportError:
     # Fallback para cuando se ejecuta independientemente
     OPENAI_API_KEY = ""
 
+from async_clients import async_chat_completion, fetch_url_bytes, get_async_openai_client
+
 # --- Enhanced Customs Agent System Prompt ---
+# Productos clasificados a la vez en modo lote (las llamadas al LLM tienen su propio límite)
+DEFAULT_BATCH_CONCURRENCY = 8
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
 CUSTOMS_AGENT_SYSTEM_PROMPT = """
 Eres un DESPACHANTE DE ADUANAS ARGENTINO con más de 20 años de experiencia en clasificación arancelaria NCM. 
 Tu especialidad es la clasificación precisa de mercaderías para importación y exportación en Argentina, con conocimiento profundo de:
@@ -123,13 +134,21 @@ IMPORTANTE:
 class DeepNCMClassifier:
     """Clasificador profundo de NCM con exploración jerárquica completa"""
     
-    def __init__(self, api_key: str = None, debug_callback=None):
+    def __init__(self, api_key: str = None, debug_callback=None, ncm_backend=None, semantic_index=None,
+                 refine_hierarchical_matches: Optional[bool] = None):
         """
         Inicializar el clasificador profundo
         
         Args:
             api_key: API key de OpenAI
             debug_callback: Función para logging de debug
+            ncm_backend: Integración NCM a utilizar. Si None, usa la instancia
+                compartida del proceso (`get_ncm_integration()`)
+            semantic_index: Índice semántico local de posiciones NCM. Si None, se
+                usa el índice compartido de la integración NCM (se carga al primer uso)
+            refine_hierarchical_matches: Analizar con el LLM las subcategorías de los
+                matches jerárquicos intermedios (hasta 5 llamadas más por producto).
+                Si None, se toma de NCM_REFINE_HIERARCHICAL_MATCHES (desactivado por defecto)
         """
         if not OPENAI_AVAILABLE:
             raise ImportError("OpenAI library not installed. Install with: pip install openai")
@@ -138,28 +157,88 @@ class DeepNCMClassifier:
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
         
-        self.client = OpenAI(api_key=self.api_key)
         self.debug_log = debug_callback or self._default_debug_log
         
-        # Inicializar integración NCM oficial
-        try:
-            from ncm_official_integration import NCMOfficialIntegration
-            self.ncm_integration = NCMOfficialIntegration()
-        except ImportError:
-            logger.error("NCM Official Integration not available")
-            self.ncm_integration = None
+        # Integración NCM oficial (compartida por proceso salvo que se inyecte otra)
+        if ncm_backend is not None:
+            self.ncm_integration = ncm_backend
+        else:
+            try:
+                from ncm_official_integration import get_ncm_integration
+                self.ncm_integration = get_ncm_integration()
+            except ImportError:
+                logger.error("NCM Official Integration not available")
+                self.ncm_integration = None
+        
+        self._semantic_index = semantic_index
+        self.refine_hierarchical_matches = (
+            _env_flag('NCM_REFINE_HIERARCHICAL_MATCHES') if refine_hierarchical_matches is None
+            else refine_hierarchical_matches
+        )
             
         logger.info("Deep NCM Classifier initialized with customs agent expertise")
     
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """Cliente AsyncOpenAI compartido en el event loop actual"""
+        return get_async_openai_client(self.api_key)
+    
     def _default_debug_log(self, message, data=None, level="INFO"):
         """Debug logging por defecto"""
         logger.info(f"[{level}] {message}")
         if data:
             logger.debug(f"Data: {data}")
     
-    async def initial_ncm_estimation(self, description: str, image_url: Optional[str] = None) -> Dict[str, Any]:
+    def semantic_shortlist(self, description: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Lista corta de posiciones NCM plausibles por similitud semántica local
+        (sin llamadas de red). Devuelve lista vacía si el índice no está disponible.
+        """
+        if not self.ncm_integration or not getattr(self.ncm_integration, 'ncm_data', None):
+            return []
+        
+        try:
+            if self._semantic_index is None:
+                from ncm_semantic_index import get_semantic_index
+                self._semantic_index = get_semantic_index(self.ncm_integration)
+            if self._semantic_index is None:
+                return []
+            
+            shortlist = []
+            seen = set()
+            # Pedir de más: varias filas comparten código y descripción
+            for row, score in self._semantic_index.search(description, top_k=top_k * 3):
+                record = self.ncm_integration.ncm_data[row]
+                key = (record.get('code', ''), record.get('description', ''))
+                if key in seen:
+                    continue
+                seen.add(key)
+                shortlist.append({
+                    "ncm_code": record.get('code', ''),
+                    "sim_code": record.get('sim', ''),
+                    "description": record.get('description', ''),
+                    "chapter": record.get('chapter', 0),
+                    "record_type": record.get('record_type', ''),
+                    "semantic_score": round(score, 4)
+                })
+                if len(shortlist) >= top_k:
+                    break
+            return shortlist
+            
+        except Exception as e:
+            self.debug_log(f"⚠️ Búsqueda semántica local no disponible: {e}", level="WARNING")
+            return []
+    
+    async def initial_ncm_estimation(self, description: str, image_url: Optional[str] = None,
+                                     candidate_positions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         Estimación inicial del NCM usando prompt de despachante de aduanas
+        
+        Args:
+            description: Descripción del producto
+            image_url: URL de imagen opcional
+            candidate_positions: Posiciones sugeridas por la búsqueda semántica local,
+                que se incluyen en el prompt como referencia
         """
         self.debug_log("🎯 Iniciando estimación inicial NCM con expertise de despachante", level="FLOW")
         
@@ -169,9 +248,8 @@ class DeepNCMClassifier:
             if image_url:
                 self.debug_log(f"📸 Procesando imagen: {image_url[:50]}...", level="INFO")
                 try:
-                    response = requests.get(image_url)
-                    response.raise_for_status()
-                    image_data = base64.b64encode(response.content).decode('utf-8')
+                    image_bytes = await fetch_url_bytes(image_url)
+                    image_data = base64.b64encode(image_bytes).decode('utf-8')
                     self.debug_log("✅ Imagen procesada correctamente", level="SUCCESS")
                 except Exception as e:
                     self.debug_log(f"⚠️ Error procesando imagen: {e}", level="WARNING")
@@ -184,7 +262,19 @@ class DeepNCMClassifier:
                 }
             ]
             
-            user_content = [{"type": "text", "text": f"Analiza y clasifica el siguiente producto para importación a Argentina:\n\n**Descripción del producto:**\n{description}"}]
+            user_text = f"Analiza y clasifica el siguiente producto para importación a Argentina:\n\n**Descripción del producto:**\n{description}"
+            if candidate_positions:
+                candidates_text = "\n".join(
+                    f"- {c['ncm_code']} {c['sim_code']}".rstrip() + f": {c['description']}"
+                    for c in candidate_positions
+                )
+                user_text += (
+                    "\n\n**Posiciones de la base oficial con descripción similar "
+                    "(búsqueda local, solo como referencia; no es obligatorio elegir una):**\n"
+                    f"{candidates_text}"
+                )
+            
+            user_content = [{"type": "text", "text": user_text}]
             
             if image_data:
                 user_content.append({
@@ -198,14 +288,13 @@ class DeepNCMClassifier:
             
             self.debug_log("🤖 Enviando consulta a LLM especializado en aduanas", level="INFO")
             
-            response = self.client.chat.completions.create(
+            response_text = await async_chat_completion(
+                self.client,
                 model="gpt-4o-mini",
                 messages=messages,
                 temperature=0,
                 response_format={"type": "json_object"}
             )
-            
-            response_text = response.choices[0].message.content
             self.debug_log("📄 Respuesta recibida del LLM", {"response_preview": response_text[:200] + "..."}, level="INFO")
             
             # Parsear respuesta
@@ -362,7 +451,24 @@ class DeepNCMClassifier:
         if hierarchical_matches:
             self.debug_log(f"🔍 Analizando {len(hierarchical_matches)} matches jerárquicos", level="INFO")
             
-            for i, match in enumerate(hierarchical_matches[:5]):  # Top 5 matches
+            top_matches = hierarchical_matches[:5]  # Top 5 matches
+            match_subcategories = [
+                self.ncm_integration.get_subcategories(match.get('ncm_code', ''))
+                if match.get('record_type') != 'terminal' else []
+                for match in top_matches
+            ]
+            
+            # Opcional: las subcategorías de cada match intermedio se analizan con el
+            # LLM en paralelo (limitado por LLM_MAX_CONCURRENCY)
+            llm_choices = [None] * len(top_matches)
+            if self.refine_hierarchical_matches:
+                llm_choices = await asyncio.gather(*(
+                    self._analyze_subcategories_with_llm(subcats, product_description, match)
+                    if len(subcats) > 1 else asyncio.sleep(0, result=None)
+                    for match, subcats in zip(top_matches, match_subcategories)
+                ))
+            
+            for i, match in enumerate(top_matches):
                 exploration_result["exploration_steps"].append({
                     "step": f"hierarchical_analysis_{i+1}",
                     "match_type": match.get('match_type'),
@@ -384,9 +490,12 @@ class DeepNCMClassifier:
                     })
                 else:
                     # Es intermedia, explorar subcategorías
-                    subcategories = self.ncm_integration.get_subcategories(match.get('ncm_code', ''))
+                    subcategories = match_subcategories[i]
                     if subcategories:
-                        # Seleccionar mejores subcategorías usando análisis rápido
+                        # La elegida por el LLM va primero: gana los empates de scoring
+                        chosen = llm_choices[i]
+                        if chosen is not None:
+                            subcategories = [chosen] + [s for s in subcategories if s is not chosen]
                         for subcat in subcategories[:3]:  # Top 3 subcategorías
                             exploration_result["final_candidates"].append({
                                 "ncm_code": subcat.get('ncm_code'),
@@ -470,7 +579,8 @@ RESPONDE EN JSON:
 Responde ÚNICAMENTE el JSON:"""
 
         try:
-            response = self.client.chat.completions.create(
+            llm_response = await async_chat_completion(
+                self.client,
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "Eres un despachante de aduanas especializado en clasificación NCM. Responde solo en JSON."},
@@ -479,8 +589,6 @@ Responde ÚNICAMENTE el JSON:"""
                 temperature=0,
                 response_format={"type": "json_object"}
             )
-            
-            llm_response = response.choices[0].message.content
             analysis_result = json.loads(llm_response)
             
             # Extraer opción elegida
@@ -579,6 +687,7 @@ Responde ÚNICAMENTE el JSON:"""
             "final_classification": None,
             "processing_time_seconds": 0,
             "debug_info": {
+                "semantic_shortlist": None,
                 "estimation_phase": None,
                 "exploration_phase": None,
                 "validation_phase": None
@@ -586,9 +695,17 @@ Responde ÚNICAMENTE el JSON:"""
         }
         
         try:
+            # Fase 0: Lista corta local por similitud semántica (sin red)
+            shortlist = self.semantic_shortlist(description)
+            result["debug_info"]["semantic_shortlist"] = shortlist
+            if shortlist:
+                self.debug_log(f"🧭 Lista corta semántica: {len(shortlist)} posiciones candidatas", {
+                    "top": [f"{c['ncm_code']} {c['sim_code']}".strip() for c in shortlist[:5]]
+                }, level="INFO")
+            
             # Fase 1: Estimación inicial con despachante de aduanas
             self.debug_log("📋 FASE 1: Estimación inicial NCM", level="FLOW")
-            initial_estimation = await self.initial_ncm_estimation(description, image_url)
+            initial_estimation = await self.initial_ncm_estimation(description, image_url, candidate_positions=shortlist)
             
             if "error" in initial_estimation:
                 result["error"] = initial_estimation["error"]
@@ -758,6 +875,75 @@ Responde ÚNICAMENTE el JSON:"""
         
         return result
     
+    async def classify_many(self, products: Iterable[Dict[str, Any]],
+                            concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Clasifica muchos productos en paralelo y entrega cada resultado apenas termina
+        
+        Args:
+            products: Iterable de dicts con 'description' y opcionalmente 'id' e 'image_url'
+                (se consume a medida que se libera capacidad, sirve un generador)
+            concurrency: Máximo de productos en proceso a la vez. Si None, usa la
+                variable de entorno NCM_BATCH_CONCURRENCY o DEFAULT_BATCH_CONCURRENCY
+        
+        Yields:
+            Dicts con 'id', 'description', 'image_url', 'deduplicated' y 'result'
+            (el resultado de classify_product_deep), en orden de finalización.
+            Las descripciones idénticas (misma imagen) se clasifican una sola vez.
+        """
+        if concurrency is None:
+            concurrency = int(os.getenv('NCM_BATCH_CONCURRENCY', DEFAULT_BATCH_CONCURRENCY))
+        concurrency = max(1, concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        shared: Dict[Tuple[str, str], asyncio.Future] = {}
+        
+        async def classify_limited(description: str, image_url: Optional[str]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.classify_product_deep(description, image_url)
+        
+        async def run_item(index: int, product: Dict[str, Any]) -> Dict[str, Any]:
+            description = str(product.get('description') or '').strip()
+            image_url = product.get('image_url') or None
+            item = {
+                "id": str(product.get('id', index)),
+                "description": description,
+                "image_url": image_url,
+                "deduplicated": False,
+            }
+            if not description:
+                item["result"] = {"error": "Descripción vacía"}
+                return item
+            
+            key = (' '.join(description.split()), image_url or '')
+            task = shared.get(key)
+            if task is None:
+                task = shared[key] = asyncio.ensure_future(classify_limited(description, image_url))
+            else:
+                item["deduplicated"] = True
+            try:
+                item["result"] = await asyncio.shield(task)
+            except Exception as e:
+                item["result"] = {"error": str(e)}
+            return item
+        
+        # Se mantienen acotadas las tareas pendientes para no materializar catálogos enteros
+        max_pending = concurrency * 4
+        pending = set()
+        try:
+            for index, product in enumerate(products):
+                pending.add(asyncio.ensure_future(run_item(index, product)))
+                if len(pending) >= max_pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for finished in done:
+                        yield finished.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    yield finished.result()
+        finally:
+            for task in list(pending) + list(shared.values()):
+                task.cancel()
+    
     def _build_complete_ncm_code(self, position: Dict) -> str:
         """Construye código NCM completo con SIM si existe"""
         base_code = position.get('ncm_code', '')
@@ -853,12 +1039,13 @@ Responde ÚNICAMENTE el JSON:"""
 
 
 # Función de conveniencia para uso directo
-async def classify_product_deep(description: str, image_url: str = None, api_key: str = None, debug_callback=None) -> Dict[str, Any]:
+async def classify_product_deep(description: str, image_url: str = None, api_key: str = None, debug_callback=None,
+                                ncm_backend=None) -> Dict[str, Any]:
     """
     Función de conveniencia para clasificación profunda
     """
     try:
-        classifier = DeepNCMClassifier(api_key=api_key, debug_callback=debug_callback)
+        classifier = DeepNCMClassifier(api_key=api_key, debug_callback=debug_callback, ncm_backend=ncm_backend)
         return await classifier.classify_product_deep(description, image_url)
     except Exception as e:
         return {"error": str(e)}
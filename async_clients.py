@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+⚡ Async Clients - Clientes asíncronos compartidos (OpenAI + HTTP)
+==================================================================
+
+Clientes asíncronos reutilizables para el pipeline de clasificación NCM, de
+modo que las llamadas al LLM y las descargas de imágenes no bloqueen el event
+loop y puedan solaparse.
+
+Funcionalidades:
+- AsyncOpenAI compartido por event loop y API key (conexiones reutilizadas)
+- Cliente HTTP asíncrono con pool de conexiones (httpx; hilo + requests si no está)
+- Límite de concurrencia de llamadas al LLM configurable (LLM_MAX_CONCURRENCY)
+- Chat completions asíncronas que pasan por la caché persistente de respuestas
+- run_with_async_clients: asyncio.run que cierra los clientes del loop al terminar
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import requests
+
+from llm_cache import acached_chat_completion
+
+logger = logging.getLogger(__name__)
+
+try:
+    from openai import AsyncOpenAI
+    ASYNC_OPENAI_AVAILABLE = True
+except ImportError:
+    ASYNC_OPENAI_AVAILABLE = False
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+DEFAULT_LLM_MAX_CONCURRENCY = 4
+DEFAULT_HTTP_TIMEOUT = 30.0
+
+# Los clientes asíncronos quedan ligados al event loop donde se crean
+# (Streamlit ejecuta cada clasificación con asyncio.run), así que se comparten por loop
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_loop_state_lock = threading.Lock()
+
+_requests_session: Optional[requests.Session] = None
+_requests_session_lock = threading.Lock()
+
+
+def _state() -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    with _loop_state_lock:
+        state = _loop_state.get(loop)
+        if state is None:
+            state = _loop_state[loop] = {'openai': {}}
+        return state
+
+
+def get_llm_max_concurrency() -> int:
+    """Máximo de llamadas simultáneas al LLM (variable de entorno LLM_MAX_CONCURRENCY)"""
+    try:
+        return max(1, int(os.getenv('LLM_MAX_CONCURRENCY', DEFAULT_LLM_MAX_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_LLM_MAX_CONCURRENCY
+
+
+def get_async_openai_client(api_key: str):
+    """AsyncOpenAI compartido dentro del event loop actual para esta API key"""
+    if not ASYNC_OPENAI_AVAILABLE:
+        raise ImportError("OpenAI library not installed. Install with: pip install openai")
+    clients = _state()['openai']
+    client = clients.get(api_key)
+    if client is None:
+        client = clients[api_key] = AsyncOpenAI(api_key=api_key)
+    return client
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Semáforo que limita las llamadas concurrentes al LLM en el event loop actual"""
+    state = _state()
+    semaphore = state.get('llm_semaphore')
+    if semaphore is None:
+        semaphore = state['llm_semaphore'] = asyncio.Semaphore(get_llm_max_concurrency())
+    return semaphore
+
+
+async def async_chat_completion(client, **request) -> str:
+    """
+    Chat completion asíncrona con caché persistente y límite de concurrencia
+
+    Args:
+        client: Cliente AsyncOpenAI
+        **request: Parámetros de la llamada (model, messages, temperature, ...)
+
+    Returns:
+        Contenido del primer mensaje de la respuesta
+    """
+    async with get_llm_semaphore():
+        return await acached_chat_completion(client, **request)
+
+
+def _get_requests_session() -> requests.Session:
+    global _requests_session
+    if _requests_session is None:
+        with _requests_session_lock:
+            if _requests_session is None:
+                _requests_session = requests.Session()
+    return _requests_session
+
+
+async def fetch_url_bytes(url: str, timeout: float = DEFAULT_HTTP_TIMEOUT) -> bytes:
+    """
+    Descarga una URL sin bloquear el event loop
+
+    Usa un httpx.AsyncClient con pool de conexiones por event loop; sin httpx,
+    delega en una sesión de requests compartida dentro de un hilo.
+
+    Raises:
+        Excepción HTTP si la respuesta no es 2xx
+    """
+    if HTTPX_AVAILABLE:
+        state = _state()
+        http_client = state.get('http')
+        if http_client is None:
+            http_client = state['http'] = httpx.AsyncClient(follow_redirects=True, timeout=timeout)
+        response = await http_client.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    def _fetch() -> bytes:
+        response = _get_requests_session().get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    return await asyncio.to_thread(_fetch)
+
+
+async def aclose_async_clients() -> None:
+    """Cierra los clientes asíncronos del event loop actual (al terminar un lote)"""
+    loop = asyncio.get_running_loop()
+    with _loop_state_lock:
+        state = _loop_state.pop(loop, None)
+    if not state:
+        return
+    for client in state['openai'].values():
+        await client.close()
+    if state.get('http') is not None:
+        await state['http'].aclose()
+
+
+def run_with_async_clients(coro):
+    """
+    Ejecuta la corrutina con asyncio.run y cierra los clientes asíncronos del loop
+
+    Para llamadas sueltas (p. ej. cada rerun de Streamlit): el loop se descarta al
+    terminar, así que sus conexiones HTTP se cierran antes de que asyncio.run vuelva.
+    """
+    async def _run():
+        try:
+            return await coro
+        finally:
+            await aclose_async_clients()
+
+    return asyncio.run(_run())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark NCM Lookups - Búsquedas exactas sobre la base oficial NCM
+======================================================================
+
+Compara búsquedas por segundo entre el recorrido lineal original
+(`for record in ncm_data`) y los índices hash de `NCMCodeIndex` sobre el
+dataset consolidado que se distribuye con el repositorio.
+
+Uso:
+    python benchmark_ncm_lookups.py [--samples 200] [--seed 42]
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import argparse
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ncm_official_integration import NCMOfficialIntegration
+
+
+def _linear_exact(ncm_data, code: str):
+    """Búsqueda exacta original: primer registro con el código"""
+    for record in ncm_data:
+        if record.get('code_searchable') == code:
+            return record
+    return None
+
+
+def _linear_code_sim(ncm_data, code: str, sim: str):
+    """Búsqueda código+SIM con recorrido lineal"""
+    for record in ncm_data:
+        if record.get('code_searchable') == code and (record.get('sim') or '').strip() == sim:
+            return record
+    return None
+
+
+def _linear_children(ncm_data, code: str) -> List:
+    """Expansión de subcategorías original: terminales con SIM del mismo código"""
+    children = [
+        record for record in ncm_data
+        if record.get('code_searchable', '') == code
+        and record.get('record_type', '') == 'terminal'
+        and (record.get('sim') or '').strip()
+    ]
+    children.sort(key=lambda r: r.get('sim', ''))
+    return children
+
+
+def _rate(fn: Callable, queries: List, min_seconds: float = 0.5) -> float:
+    """Ejecuta `fn` sobre las consultas hasta `min_seconds` y devuelve búsquedas/seg"""
+    done = 0
+    start = time.perf_counter()
+    while True:
+        for query in queries:
+            fn(*query)
+        done += len(queries)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return done / elapsed
+
+
+def run_benchmark(samples: int = 200, seed: int = 42) -> Dict[str, Tuple[float, float]]:
+    integration = NCMOfficialIntegration()
+    ncm_data = integration.ncm_data
+    index = integration.code_index
+    if not ncm_data:
+        raise SystemExit("❌ Dataset NCM no disponible")
+
+    rng = random.Random(seed)
+    rows = [ncm_data[i] for i in rng.sample(range(len(ncm_data)), samples)]
+    codes = [(r.get('code_searchable', ''),) for r in rows]
+    code_sims = [(r.get('code_searchable', ''), (r.get('sim') or '').strip()) for r in rows]
+    # El recorrido lineal es lento: medirlo sobre un subconjunto
+    linear_slice = max(1, samples // 10)
+
+    cases = {
+        'exact_code': (
+            lambda c: _linear_exact(ncm_data, c), index.first_position, codes),
+        'code_sim': (
+            lambda c, s: _linear_code_sim(ncm_data, c, s), index.position_for_code_sim, code_sims),
+        'subcategories': (
+            lambda c: _linear_children(ncm_data, c), index.terminal_children, codes),
+    }
+
+    results = {}
+    for name, (linear_fn, indexed_fn, queries) in cases.items():
+        before = _rate(linear_fn, queries[:linear_slice])
+        after = _rate(indexed_fn, queries)
+        results[name] = (before, after)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de búsquedas exactas NCM')
+    parser.add_argument('--samples', type=int, default=200, help='Cantidad de códigos a consultar')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla para el muestreo')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = run_benchmark(args.samples, args.seed)
+
+    print(f"{'Búsqueda':<16}{'lineal (ops/s)':>18}{'índice (ops/s)':>18}{'speedup':>12}")
+    for name, (before, after) in results.items():
+        print(f"{name:<16}{before:>18,.1f}{after:>18,.0f}{after / before:>11,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
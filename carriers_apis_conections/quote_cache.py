@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+💾 Shipping Quote Cache - Caché de cotizaciones de carriers
+===========================================================
+
+Caché en disco (SQLite) de las cotizaciones en vivo de FedEx/DHL. El mismo envío
+(ruta, escalón de peso facturable y medidas) no vuelve a consultar a los carriers
+mientras la cotización esté vigente, y las consultas idénticas simultáneas
+comparten una sola llamada.
+
+Funcionalidades:
+- Clave por envío normalizado: entorno del carrier (sandbox/producción), país/CP de
+  origen y destino, escalón de peso facturable, medidas redondeadas, moneda y criterio
+  de selección (precio o velocidad)
+- Se cotiza el escalón de peso completo: una entrada vale para cualquier peso del escalón
+- Expiración por TTL configurable (las tarifas de los carriers cambian)
+- Single-flight: pedidos concurrentes con la misma clave esperan la misma consulta
+- Persistente entre reinicios y seguro entre hilos/procesos (SQLite en modo WAL)
+- Configurable por variables de entorno (SHIPPING_QUOTE_CACHE_*)
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import math
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from carriers_apis_conections.rate_cards import billable_weight_kg
+
+logger = logging.getLogger(__name__)
+
+# Cambiar si se modifica la forma de construir claves o de serializar: invalida todo lo anterior
+QUOTE_CACHE_KEY_VERSION = 2
+
+DEFAULT_QUOTE_CACHE_PATH = Path.home() / '.cache' / 'comercio_exterior' / 'shipping_quotes.sqlite3'
+DEFAULT_QUOTE_TTL_SECONDS = 6 * 3600
+# Los carriers cobran por escalones de 0.5 kg: dentro del escalón el precio no cambia
+WEIGHT_BUCKET_KG = 0.5
+DIMENSION_BUCKET_CM = 5.0
+
+
+def _bucket(value: float, size: float) -> float:
+    """Redondeo hacia arriba al escalón (tolerante a errores de punto flotante)"""
+    return round(math.ceil(round(float(value) / size, 9)) * size, 6)
+
+
+def quote_weight_kg(weight_kg: float, dimensions_cm: Optional[Dict[str, float]] = None) -> float:
+    """Peso a cotizar: el peso facturable redondeado hacia arriba al escalón de la clave"""
+    return _bucket(billable_weight_kg(weight_kg, dimensions_cm), WEIGHT_BUCKET_KG)
+
+
+def make_quote_key(weight_kg: float, origin_country: str, origin_postal: str,
+                   dest_country: str, dest_postal: str, currency: str = "USD",
+                   dimensions_cm: Optional[Dict[str, float]] = None,
+                   service: str = "cheapest", test_mode: bool = True) -> str:
+    """
+    Clave determinista para una cotización de envío
+
+    Args:
+        weight_kg: Peso real en kg (la clave usa el escalón del peso facturable)
+        dimensions_cm: Medidas (length/width/height); se redondean y ordenan
+        service: Criterio de selección ("cheapest" / "fastest") o servicio pedido
+        test_mode: Entorno del carrier; sandbox y producción no comparten cotizaciones
+
+    Returns:
+        Hash SHA-256 hexadecimal
+    """
+    dims = None
+    if dimensions_cm:
+        dims = sorted(_bucket(dimensions_cm.get(side, 0), DIMENSION_BUCKET_CM)
+                      for side in ('length', 'width', 'height'))
+    payload = {
+        'v': QUOTE_CACHE_KEY_VERSION,
+        'env': 'test' if test_mode else 'production',
+        'origin': [str(origin_country).strip().upper(), ''.join(str(origin_postal or '').split()).upper()],
+        'dest': [str(dest_country).strip().upper(), ''.join(str(dest_postal or '').split()).upper()],
+        'weight': quote_weight_kg(weight_kg, dimensions_cm),
+        'dims': dims,
+        'currency': str(currency).upper(),
+        'service': service,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ShippingQuoteCache:
+    """Caché persistente clave -> resultado de cotización (JSON), con TTL y single-flight"""
+
+    def __init__(self, path: Union[str, Path, None] = None,
+                 ttl_seconds: float = DEFAULT_QUOTE_TTL_SECONDS):
+        self.path = Path(path) if path else DEFAULT_QUOTE_CACHE_PATH
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS quotes (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM quotes').fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Resultado guardado para la clave, o None si no existe o expiró"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT result, created_at FROM quotes WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            result, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM quotes WHERE key = ?', (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(result)
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Guarda un resultado (serializable a JSON) y descarta los expirados"""
+        now = time.time()
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO quotes (key, result, created_at) VALUES (?, ?, ?)',
+                               (key, payload, now))
+            if self.ttl_seconds is not None:
+                self._conn.execute('DELETE FROM quotes WHERE created_at < ?', (now - self.ttl_seconds,))
+            self._conn.commit()
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Dict[str, Any]],
+                     cacheable: Callable[[Dict[str, Any]], bool] = lambda result: True) -> Dict[str, Any]:
+        """
+        Resultado de la caché o de fetch(), con una sola consulta por clave en curso
+
+        Si otro hilo ya está consultando la misma clave, se espera su resultado en
+        lugar de repetir la llamada a los carriers. Solo se guardan los resultados
+        para los que cacheable(result) es verdadero (p. ej. cotizaciones exitosas).
+        """
+        try:
+            cached = self.get(key)
+        except (sqlite3.Error, ValueError) as e:
+            # Una caché bloqueada o dañada no debe impedir cotizar con los carriers
+            logger.warning(f"⚠️ No se pudo leer la caché de cotizaciones: {e}")
+            cached = None
+        if cached is not None:
+            logger.debug(f"💾 Caché cotizaciones: hit {key[:12]}")
+            return cached
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            logger.debug(f"⏳ Caché cotizaciones: esperando consulta en curso {key[:12]}")
+            return future.result()
+
+        try:
+            result = fetch()
+            if cacheable(result):
+                try:
+                    self.put(key, result)
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    logger.warning(f"⚠️ No se pudo guardar la cotización en caché: {e}")
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM quotes')
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_quote_cache: Optional[ShippingQuoteCache] = None
+_quote_cache_initialized = False
+_quote_cache_lock = threading.Lock()
+
+
+def get_quote_cache() -> Optional[ShippingQuoteCache]:
+    """
+    Caché global del proceso, configurada por variables de entorno:
+
+    - SHIPPING_QUOTE_CACHE_ENABLED: "0"/"false" desactiva la caché
+    - SHIPPING_QUOTE_CACHE_PATH: ruta del archivo SQLite
+    - SHIPPING_QUOTE_CACHE_TTL_SECONDS: vigencia de cada cotización
+
+    Returns:
+        La caché, o None si está desactivada o no se pudo abrir
+    """
+    global _quote_cache, _quote_cache_initialized
+    if not _quote_cache_initialized:
+        with _quote_cache_lock:
+            if not _quote_cache_initialized:
+                _quote_cache = _create_quote_cache_from_env()
+                _quote_cache_initialized = True
+    return _quote_cache
+
+
+def _create_quote_cache_from_env() -> Optional[ShippingQuoteCache]:
+    if os.getenv('SHIPPING_QUOTE_CACHE_ENABLED', '1').strip().lower() in ('0', 'false', 'no', 'off'):
+        logger.info("💾 Caché de cotizaciones desactivada por configuración")
+        return None
+    try:
+        cache = ShippingQuoteCache(
+            path=os.getenv('SHIPPING_QUOTE_CACHE_PATH') or None,
+            ttl_seconds=float(os.getenv('SHIPPING_QUOTE_CACHE_TTL_SECONDS', DEFAULT_QUOTE_TTL_SECONDS)),
+        )
+        logger.info(f"💾 Caché de cotizaciones en {cache.path}")
+        return cache
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.warning(f"⚠️ Caché de cotizaciones no disponible, se consulta siempre a los carriers: {e}")
+        return None
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+🗂️ Rate Cards - Tarifarios offline de carriers (DHL / FedEx)
+============================================================
+
+Guarda los tarifarios de los carriers en un almacén local normalizado y
+cotiza sin red: la mayoría de las cotizaciones courier salen del tarifario
+en microsegundos y la API en vivo queda solo para rutas sin tarifario o con
+el tarifario vencido.
+
+Funcionalidades:
+- Importa el tarifario PDF de DHL Express (tablas por zona + zonificación) con pdfplumber
+- Importa CSVs: ancho (KG, Zona 1..N, como extracted_tables.csv) o largo (zone, weight_kg, price)
+- Almacén normalizado en SQLite: (carrier, servicio, zona, escalón de peso, precio)
+- Zonificación (carrier, país origen, país destino) -> zona, con comodín "*"
+- Recargo por incremento de peso más allá de la última fila de la tabla
+- Peso facturable con el divisor volumétrico del tarifario (5000)
+- Vigencia por tarifario: vencido o ausente -> no cotiza (la API en vivo decide)
+
+Uso:
+    python -m carriers_apis_conections.rate_cards import-pdf tarifario_dhl.pdf
+    python -m carriers_apis_conections.rate_cards quote --weight 3.2 --from CN --to AR
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import re
+import math
+import time
+import bisect
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+try:
+    import pdfplumber
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_CARDS_PATH = Path(os.getenv(
+    "RATE_CARDS_PATH", Path(__file__).parent / "rate_cards.sqlite3"
+))
+DEFAULT_VALID_DAYS = 180
+ANY_COUNTRY = "*"
+# Servicios que solo aplican a documentos (no a mercadería)
+DOCUMENTS_SUFFIX = " DOCUMENTOS"
+
+# Divisor volumétrico de los tarifarios courier (cm³ por kg)
+VOLUMETRIC_DIVISOR = 5000
+
+# Tolerancia para comparar pesos con los escalones de la tabla
+_WEIGHT_EPS = 1e-9
+
+
+@dataclass
+class RateCardQuote:
+    """Cotización calculada con un tarifario local"""
+    carrier: str
+    service_name: str
+    zone: str
+    cost_usd: float
+    weight_kg: float
+    currency: str
+    expires_at: float
+
+
+def _zone_key(zone) -> str:
+    """"Zona 5" / 5 / "5" -> "5\""""
+    return re.sub(r'^\s*zona\s*', '', str(zone), flags=re.IGNORECASE).strip()
+
+
+def _number(text: str) -> float:
+    """Número de un tarifario con separador de miles ("1,261.58" -> 1261.58)"""
+    return float(text.replace(',', ''))
+
+
+def billable_weight_kg(weight_kg: float, dimensions_cm: Optional[Dict[str, float]] = None,
+                       divisor: float = VOLUMETRIC_DIVISOR) -> float:
+    """Peso facturable: el mayor entre el peso real y el volumétrico (L x A x H / divisor)"""
+    if not dimensions_cm:
+        return weight_kg
+    volume_cm3 = (float(dimensions_cm.get('length', 0)) * float(dimensions_cm.get('width', 0))
+                  * float(dimensions_cm.get('height', 0)))
+    return max(weight_kg, volume_cm3 / divisor)
+
+
+class RateCardStore:
+    """
+    Almacén de tarifarios con índice en memoria para cotizar sin red
+
+    Cada tarifario (carrier, servicio) tiene filas (zona, peso máximo del escalón,
+    precio), recargos opcionales por incremento de peso y una fecha de vencimiento.
+    Una cotización usa la primera fila cuyo peso cubre el peso facturable.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_RATE_CARDS_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cards (
+                    carrier TEXT NOT NULL,
+                    service TEXT NOT NULL,
+                    currency TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    imported_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (carrier, service)
+                );
+                CREATE TABLE IF NOT EXISTS rates (
+                    carrier TEXT NOT NULL,
+                    service TEXT NOT NULL,
+                    zone TEXT NOT NULL,
+                    max_weight_kg REAL NOT NULL,
+                    price REAL NOT NULL,
+                    PRIMARY KEY (carrier, service, zone, max_weight_kg)
+                );
+                CREATE TABLE IF NOT EXISTS increments (
+                    carrier TEXT NOT NULL,
+                    service TEXT NOT NULL,
+                    zone TEXT NOT NULL,
+                    from_kg REAL NOT NULL,
+                    to_kg REAL NOT NULL,
+                    step_kg REAL NOT NULL,
+                    price_per_step REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS zones (
+                    carrier TEXT NOT NULL,
+                    origin_country TEXT NOT NULL,
+                    dest_country TEXT NOT NULL,
+                    zone TEXT NOT NULL,
+                    PRIMARY KEY (carrier, origin_country, dest_country)
+                );
+            """)
+            self._conn.commit()
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # Índice en memoria
+    # ------------------------------------------------------------------
+
+    def _load_index(self) -> None:
+        """Arma las tablas de búsqueda en memoria desde SQLite"""
+        with self._lock:
+            cards = self._conn.execute(
+                'SELECT carrier, service, currency, expires_at FROM cards').fetchall()
+            rates = self._conn.execute(
+                'SELECT carrier, service, zone, max_weight_kg, price FROM rates '
+                'ORDER BY carrier, service, zone, max_weight_kg').fetchall()
+            increments = self._conn.execute(
+                'SELECT carrier, service, zone, from_kg, to_kg, step_kg, price_per_step FROM increments '
+                'ORDER BY from_kg').fetchall()
+            zones = self._conn.execute(
+                'SELECT carrier, origin_country, dest_country, zone FROM zones').fetchall()
+
+        self._cards = {(carrier, service): (currency, expires_at) for carrier, service, currency, expires_at in cards}
+        self._brackets: Dict[Tuple[str, str, str], Tuple[List[float], List[float]]] = {}
+        for carrier, service, zone, max_weight, price in rates:
+            weights, prices = self._brackets.setdefault((carrier, service, zone), ([], []))
+            weights.append(max_weight)
+            prices.append(price)
+        self._increments: Dict[Tuple[str, str, str], List[Tuple[float, float, float, float]]] = {}
+        for carrier, service, zone, from_kg, to_kg, step_kg, price_per_step in increments:
+            self._increments.setdefault((carrier, service, zone), []).append((from_kg, to_kg, step_kg, price_per_step))
+        self._zones = {(carrier, origin, dest): zone for carrier, origin, dest, zone in zones}
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def save_card(self, carrier: str, service: str, rows: Iterable[Tuple[str, float, float]],
+                  increments: Iterable[Tuple[str, float, float, float, float]] = (),
+                  valid_days: float = DEFAULT_VALID_DAYS, expires_at: Optional[float] = None,
+                  source: str = "", currency: str = "USD") -> int:
+        """
+        Guarda (reemplaza) un tarifario completo
+
+        Args:
+            rows: (zona, peso máximo del escalón en kg, precio)
+            increments: (zona, desde kg, hasta kg, incremento kg, precio por incremento)
+                        para pesos por encima de la última fila
+            valid_days: Días de vigencia desde ahora (si no se pasa expires_at)
+            expires_at: Vencimiento como timestamp
+
+        Returns:
+            int: Cantidad de filas de precio guardadas
+        """
+        now = time.time()
+        expires_at = expires_at if expires_at is not None else now + valid_days * 86400
+        rate_rows = [(carrier, service, _zone_key(zone), float(weight), float(price)) for zone, weight, price in rows]
+        increment_rows = [(carrier, service, _zone_key(zone), float(a), float(b), float(step), float(price))
+                          for zone, a, b, step, price in increments]
+        if not rate_rows:
+            raise ValueError(f"Tarifario {carrier} {service} sin filas de precio")
+
+        with self._lock:
+            with self._conn:
+                for table in ('rates', 'increments', 'cards'):
+                    self._conn.execute(f'DELETE FROM {table} WHERE carrier = ? AND service = ?', (carrier, service))
+                self._conn.execute(
+                    'INSERT INTO cards (carrier, service, currency, source, imported_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (carrier, service, currency, source, now, expires_at))
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO rates (carrier, service, zone, max_weight_kg, price) VALUES (?, ?, ?, ?, ?)',
+                    rate_rows)
+                self._conn.executemany(
+                    'INSERT INTO increments (carrier, service, zone, from_kg, to_kg, step_kg, price_per_step) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', increment_rows)
+        self._load_index()
+        logger.info(f"📥 Tarifario {carrier} {service}: {len(rate_rows)} precios, vence "
+                    f"{datetime.fromtimestamp(expires_at):%Y-%m-%d}")
+        return len(rate_rows)
+
+    def set_zones(self, carrier: str, mapping: Dict[Tuple[str, str], str]) -> None:
+        """Guarda la zonificación {(país origen, país destino): zona}; "*" es comodín"""
+        rows = [(carrier, origin.upper(), dest.upper(), _zone_key(zone)) for (origin, dest), zone in mapping.items()]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO zones (carrier, origin_country, dest_country, zone) VALUES (?, ?, ?, ?)', rows)
+        self._load_index()
+
+    def import_csv(self, csv_path: Union[str, Path], carrier: str, service: str, **card_options) -> int:
+        """
+        Importa un tarifario CSV
+
+        Formato ancho: columna KG y una columna por zona ("Zona 1", ...), como el CSV
+        que genera pdf_reader/dhl_carrier/extract_tables.py. Formato largo: columnas
+        zone, weight_kg y price.
+        """
+        df = pd.read_csv(csv_path, dtype=str)
+        df = df.replace(",", "", regex=True)
+        if 'KG' in df.columns:
+            df = df.apply(pd.to_numeric, errors='coerce').dropna()
+            rows = [(zone, weight, price) for zone in df.columns if zone != 'KG'
+                    for weight, price in zip(df['KG'], df[zone])]
+        elif {'zone', 'weight_kg', 'price'} <= set(df.columns):
+            df[['weight_kg', 'price']] = df[['weight_kg', 'price']].apply(pd.to_numeric, errors='coerce')
+            df = df.dropna(subset=['zone', 'weight_kg', 'price'])
+            rows = list(zip(df['zone'], df['weight_kg'], df['price']))
+        else:
+            raise ValueError(f"Formato de tarifario no reconocido: {list(df.columns)}")
+        card_options.setdefault('source', str(csv_path))
+        return self.save_card(carrier, service, rows, **card_options)
+
+    def import_dhl_pdf(self, pdf_path: Union[str, Path], dest_country: str = "AR",
+                       valid_days: float = DEFAULT_VALID_DAYS) -> Dict[str, int]:
+        """
+        Importa el tarifario PDF de DHL Express (servicio de importación)
+
+        Lee las tablas "KG Zona 1 ... Zona N" (documentos y paquetes), los recargos
+        "Tarifa adicional por incremento" y la página de zonificación, que asigna
+        una zona a cada país de origen hacia dest_country.
+
+        Returns:
+            Dict[str, int]: Filas de precio por servicio y países zonificados ("zonas")
+        """
+        if not PDFPLUMBER_AVAILABLE:
+            raise ImportError("pdfplumber no está instalado. Instalar con: pip install pdfplumber")
+
+        services: Dict[str, Dict] = {}
+        zones: Dict[str, str] = {}
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                text = page.extract_text() or ""
+                if "ZONIFICACI" in text:
+                    zones.update(_parse_zone_page(page))
+                elif re.search(r'^KG Zona', text, flags=re.MULTILINE):
+                    _parse_rate_page(text, services)
+                page.close()
+
+        counts = {}
+        for service, card in services.items():
+            counts[service] = self.save_card("DHL", service, card['rows'], card['increments'],
+                                             valid_days=valid_days, source=Path(pdf_path).name)
+        if zones:
+            self.set_zones("DHL", {(origin, dest_country): zone for origin, zone in zones.items()})
+        counts["zonas"] = len(zones)
+        return counts
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._conn:
+                for table in ('cards', 'rates', 'increments', 'zones'):
+                    self._conn.execute(f'DELETE FROM {table}')
+        self._load_index()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def cards(self) -> List[Dict]:
+        """Tarifarios guardados con su vencimiento"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT carrier, service, currency, source, imported_at, expires_at FROM cards ORDER BY carrier, service'
+            ).fetchall()
+        return [dict(zip(('carrier', 'service', 'currency', 'source', 'imported_at', 'expires_at'), row)) for row in rows]
+
+    def zone_for(self, carrier: str, origin_country: str, dest_country: str) -> Optional[str]:
+        """Zona del carrier para la ruta (exacta, luego con comodín)"""
+        origin, dest = origin_country.upper(), dest_country.upper()
+        for key in ((carrier, origin, dest), (carrier, origin, ANY_COUNTRY), (carrier, ANY_COUNTRY, dest)):
+            zone = self._zones.get(key)
+            if zone is not None:
+                return zone
+        return None
+
+    def _price(self, key: Tuple[str, str, str], weight_kg: float) -> Optional[float]:
+        """Precio del escalón que cubre el peso, o recargos por incremento más allá de la tabla"""
+        brackets = self._brackets.get(key)
+        if not brackets:
+            return None
+        weights, prices = brackets
+        idx = bisect.bisect_left(weights, weight_kg - _WEIGHT_EPS)
+        if idx < len(weights):
+            return prices[idx]
+
+        # Más allá de la última fila: precio de la última fila + incrementos
+        last_weight, price = weights[-1], prices[-1]
+        for from_kg, to_kg, step_kg, price_per_step in self._increments.get(key, []):
+            # Solo los tramos que empiezan después de la tabla y cubren el peso
+            if from_kg > last_weight - step_kg and weight_kg <= to_kg + _WEIGHT_EPS:
+                steps = math.ceil((weight_kg - last_weight) / step_kg - _WEIGHT_EPS)
+                return round(price + steps * price_per_step, 2)
+        return None
+
+    def quote(self, weight_kg: float, origin_country: str, dest_country: str,
+              carrier: Optional[str] = None, service: Optional[str] = None,
+              now: Optional[float] = None, documents: bool = False) -> List[RateCardQuote]:
+        """
+        Cotizaciones locales vigentes para la ruta, de la más barata a la más cara
+
+        Los servicios de documentos solo se cotizan con documents=True. Una lista
+        vacía significa que no hay tarifario vigente que cubra la ruta y el peso:
+        hay que consultar la API en vivo.
+        """
+        now = time.time() if now is None else now
+        quotes = []
+        for (card_carrier, card_service), (currency, expires_at) in self._cards.items():
+            if (carrier and card_carrier != carrier) or (service and card_service != service):
+                continue
+            if expires_at <= now or card_service.endswith(DOCUMENTS_SUFFIX) != documents:
+                continue
+            zone = self.zone_for(card_carrier, origin_country, dest_country)
+            if zone is None:
+                continue
+            price = self._price((card_carrier, card_service, zone), weight_kg)
+            if price is None:
+                continue
+            quotes.append(RateCardQuote(card_carrier, card_service, zone, price, weight_kg, currency, expires_at))
+        quotes.sort(key=lambda q: q.cost_usd)
+        return quotes
+
+
+def _parse_rate_page(text: str, services: Dict[str, Dict]) -> None:
+    """Agrega las filas de precio y de incrementos de una página de tarifas DHL"""
+    base_service = "EXPRESS WORLDWIDE"
+    service = base_service
+    zone_names: List[str] = []
+    mode = None
+    for line in text.split('\n'):
+        line = line.strip()
+        header = re.match(r'^DHL (EXPRESS .+)$', line)
+        if header:
+            base_service = header.group(1).strip()
+            service = base_service
+            continue
+        if line.startswith('Documentos hasta'):
+            service, mode = f"{base_service}{DOCUMENTS_SUFFIX}", None
+            continue
+        if line.startswith('Paquetes'):
+            service, mode = base_service, None
+            continue
+        increment = re.match(r'^Tarifa adicional por incremento ([\d.]+) KG', line)
+        if increment:
+            step_kg, mode = float(increment.group(1)), 'increment'
+            continue
+        if line.startswith('KG Zona') or line.startswith('Desde Hasta Zona'):
+            zone_names = [_zone_key(z) for z in re.findall(r'Zona \d+', line)]
+            mode = mode if line.startswith('Desde') else 'rates'
+            continue
+
+        numbers = re.findall(r'\d[\d,]*\.?\d*', line)
+        if not zone_names or not re.fullmatch(r'[\d.,\s]+', line):
+            continue
+        card = services.setdefault(service, {'rows': [], 'increments': []})
+        if mode == 'rates' and len(numbers) == len(zone_names) + 1:
+            weight = _number(numbers[0])
+            card['rows'].extend((zone, weight, _number(price)) for zone, price in zip(zone_names, numbers[1:]))
+        elif mode == 'increment' and len(numbers) == len(zone_names) + 2:
+            from_kg, to_kg = _number(numbers[0]), _number(numbers[1])
+            card['increments'].extend((zone, from_kg, to_kg, step_kg, _number(price))
+                                      for zone, price in zip(zone_names, numbers[2:]))
+
+
+def _parse_zone_page(page) -> Dict[str, str]:
+    """
+    País (código ISO) -> zona de la página de zonificación
+
+    Usa la posición de las palabras: la zona es el primer dígito a la derecha del
+    código "(XX)" en la misma línea (o centrado respecto de un nombre partido en
+    dos líneas). Un código seguido de otro código es parte del nombre ("Islas
+    Vírgenes (US) (VI)").
+    """
+    words = page.extract_words()
+    codes = [w for w in words if re.fullmatch(r'\([A-Z]{2}\)', w['text'])]
+    digits = [w for w in words if re.fullmatch(r'\d', w['text'])]
+
+    def center(word):
+        return (word['top'] + word['bottom']) / 2
+
+    zones = {}
+    for code in codes:
+        follows_code = any(0 <= other['x0'] - code['x1'] < 6 and abs(center(other) - center(code)) < 3
+                           for other in codes if other is not code)
+        if follows_code:
+            continue
+        candidates = [(d['x0'] - code['x1'], abs(center(d) - center(code)), d['text']) for d in digits
+                      if d['x0'] >= code['x1'] and abs(center(d) - center(code)) <= 12]
+        if candidates:
+            zones[code['text'][1:3]] = min(candidates)[2]
+    return zones
+
+
+_default_store: Optional[RateCardStore] = None
+_default_lock = threading.Lock()
+
+
+def get_default_rate_cards() -> Optional[RateCardStore]:
+    """Almacén de tarifarios por defecto (RATE_CARDS_PATH), o None si todavía no se importó ninguno"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None and DEFAULT_RATE_CARDS_PATH.exists():
+            _default_store = RateCardStore(DEFAULT_RATE_CARDS_PATH)
+        return _default_store
+
+
+def main():
+    """CLI para importar tarifarios y cotizar offline"""
+    parser = argparse.ArgumentParser(description="Tarifarios offline de carriers")
+    parser.add_argument('--db', default=str(DEFAULT_RATE_CARDS_PATH), help='Archivo SQLite de tarifarios')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    pdf_parser = sub.add_parser('import-pdf', help='Importar tarifario PDF de DHL Express')
+    pdf_parser.add_argument('pdf')
+    pdf_parser.add_argument('--dest', default='AR', help='País destino de la zonificación')
+    pdf_parser.add_argument('--valid-days', type=float, default=DEFAULT_VALID_DAYS)
+
+    csv_parser = sub.add_parser('import-csv', help='Importar tarifario CSV')
+    csv_parser.add_argument('csv')
+    csv_parser.add_argument('--carrier', required=True)
+    csv_parser.add_argument('--service', required=True)
+    csv_parser.add_argument('--valid-days', type=float, default=DEFAULT_VALID_DAYS)
+
+    quote_parser = sub.add_parser('quote', help='Cotizar con los tarifarios')
+    quote_parser.add_argument('--weight', type=float, required=True, help='Peso facturable en kg')
+    quote_parser.add_argument('--from', dest='origin', default='CN')
+    quote_parser.add_argument('--to', dest='dest', default='AR')
+
+    sub.add_parser('list', help='Listar tarifarios')
+    args = parser.parse_args()
+
+    store = RateCardStore(args.db)
+    if args.command == 'import-pdf':
+        for service, count in store.import_dhl_pdf(args.pdf, dest_country=args.dest, valid_days=args.valid_days).items():
+            print(f"✅ {service}: {count}")
+    elif args.command == 'import-csv':
+        count = store.import_csv(args.csv, args.carrier, args.service, valid_days=args.valid_days)
+        print(f"✅ {args.carrier} {args.service}: {count} precios")
+    elif args.command == 'quote':
+        quotes = store.quote(args.weight, args.origin, args.dest)
+        if not quotes:
+            print("❌ Sin tarifario vigente para la ruta (usar API en vivo)")
+        for q in quotes:
+            print(f"💰 {q.carrier} {q.service_name} (zona {q.zone}): ${q.cost_usd:,.2f} {q.currency}")
+    else:
+        for card in store.cards():
+            status = "✅" if card['expires_at'] > time.time() else "⌛ vencido"
+            print(f"{status} {card['carrier']} {card['service']} - vence "
+                  f"{datetime.fromtimestamp(card['expires_at']):%Y-%m-%d} ({card['source']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ Sistema inteligente que:
 3. Selecciona la opción más económica
 4. Maneja fallbacks y errores elegantemente
 5. Normaliza respuestas en formato estándar
+6. Cotiza con tarifarios offline y cachea las cotizaciones en vivo (TTL)
 
 Uso:
     api = UnifiedShippingAPI()
@@ -21,8 +22,9 @@ import sys
 import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, replace
 import asyncio
+import threading
 import concurrent.futures
 
 # Agregar path para imports
@@ -44,6 +46,22 @@ except ImportError as e:
     print(f"⚠️ DHL no disponible: {e}")
     DHL_AVAILABLE = False
 
+try:
+    from carriers_apis_conections.rate_cards import RateCardStore, billable_weight_kg, get_default_rate_cards
+    RATE_CARDS_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️ Tarifarios offline no disponibles: {e}")
+    RATE_CARDS_AVAILABLE = False
+
+try:
+    from carriers_apis_conections.quote_cache import (
+        ShippingQuoteCache, get_quote_cache, make_quote_key, quote_weight_kg
+    )
+    QUOTE_CACHE_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️ Caché de cotizaciones no disponible: {e}")
+    QUOTE_CACHE_AVAILABLE = False
+
 
 @dataclass
 class ShippingQuote:
@@ -56,7 +74,7 @@ class ShippingQuote:
     success: bool
     error_message: Optional[str] = None
     raw_response: Optional[Dict] = None
-    rate_type: str = "UNKNOWN"  # ACCOUNT, LIST, etc.
+    rate_type: str = "UNKNOWN"  # ACCOUNT, LIST, RATE_CARD, etc.
 
 
 @dataclass
@@ -74,16 +92,22 @@ class ShippingRequest:
 class UnifiedShippingAPI:
     """API unificada para consultas de envío multi-carrier"""
     
-    def __init__(self, test_mode: bool = True, debug: bool = False):
+    def __init__(self, test_mode: bool = True, debug: bool = False,
+                 rate_cards: Optional["RateCardStore"] = None,
+                 quote_cache: Optional["ShippingQuoteCache"] = None):
         """
         Inicializar API unificada
         
         Args:
             test_mode: Usar sandbox/test environments
             debug: Habilitar logs detallados
+            rate_cards: Tarifarios offline; si cubren la ruta se cotiza sin llamar a las APIs
+            quote_cache: Caché de cotizaciones en vivo (TTL + single-flight)
         """
         self.test_mode = test_mode
         self.debug = debug
+        self.rate_cards = rate_cards
+        self.quote_cache = quote_cache
         self.fedex_client = None
         self.dhl_client = None
         
@@ -396,18 +420,33 @@ class UnifiedShippingAPI:
         
         return quotes
     
-    def get_all_quotes(self, request: ShippingRequest) -> Dict[str, List[ShippingQuote]]:
-        """Obtener todas las cotizaciones de todos los carriers disponibles"""
+    def live_carriers(self) -> List[str]:
+        """Carriers con cliente disponible para cotizar en vivo"""
+        carriers = []
+        if self.fedex_client:
+            carriers.append("FedEx")
+        if self.dhl_client:
+            carriers.append("DHL")
+        return carriers
+    
+    def get_all_quotes(self, request: ShippingRequest,
+                       carriers: Optional[List[str]] = None) -> Dict[str, List[ShippingQuote]]:
+        """
+        Obtener todas las cotizaciones de los carriers disponibles
+        
+        Args:
+            carriers: Solo estos carriers ("FedEx", "DHL"); None = todos
+        """
         all_quotes = {}
         
         # Get quotes in parallel for better performance
         with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
             futures = {}
             
-            if self.fedex_client:
+            if self.fedex_client and (carriers is None or "FedEx" in carriers):
                 futures["FedEx"] = executor.submit(self.get_fedex_quotes, request)
             
-            if self.dhl_client:
+            if self.dhl_client and (carriers is None or "DHL" in carriers):
                 futures["DHL"] = executor.submit(self.get_dhl_quotes, request)
             
             # Collect results
@@ -482,9 +521,70 @@ class UnifiedShippingAPI:
         
         self._debug_log(f"🔍 Finding best rate for {weight_kg}kg from {origin_country} to {dest_country}")
         
-        # Get all quotes
-        all_quotes = self.get_all_quotes(request)
+        # Los carriers con tarifario offline vigente se cotizan sin red; el resto se
+        # consulta en vivo y se elige el mejor entre ambos. Los tarifarios no traen
+        # tiempo de tránsito, así que con prefer_speed se consulta todo en vivo.
+        card_quotes: Dict[str, List[ShippingQuote]] = {}
+        if self.rate_cards is not None and not prefer_speed:
+            card_quotes = self._get_rate_card_quotes(request)
+        if not card_quotes:
+            return self._get_cached_live_rate(request, prefer_speed)
         
+        card_carriers = {carrier.upper() for carrier in card_quotes}
+        live_carriers = [c for c in self.live_carriers() if c.upper() not in card_carriers]
+        all_quotes = dict(card_quotes)
+        cached = False
+        if live_carriers:
+            live_result = self._get_cached_live_rate(request, prefer_speed, carriers=live_carriers)
+            all_quotes.update(live_result["all_quotes"])
+            cached = live_result["cached"]
+        
+        result = self._best_rate_result(all_quotes, request, prefer_speed)
+        result["source"] = "rate_card" if result.get("rate_type") == "RATE_CARD" else "live"
+        result["cached"] = cached
+        return result
+    
+    def _get_cached_live_rate(self, request: ShippingRequest, prefer_speed: bool = False,
+                              carriers: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Mejor tarifa en vivo, pasando por la caché de cotizaciones si hay una"""
+        if self.quote_cache is None:
+            return self._get_live_best_rate(request, prefer_speed, carriers)
+        
+        # Envíos equivalentes (mismo escalón de peso facturable y medidas) comparten cotización
+        service = "fastest" if prefer_speed else "cheapest"
+        if carriers is not None:
+            service = f"{service}:{','.join(sorted(carriers))}"
+        key = make_quote_key(request.weight_kg, request.origin_country, request.origin_postal,
+                             request.dest_country, request.dest_postal,
+                             currency=request.currency, dimensions_cm=request.dimensions_cm,
+                             service=service, test_mode=self.test_mode)
+        # Se cotiza el escalón completo para que la entrada valga para todo peso del escalón
+        live_request = replace(request, weight_kg=quote_weight_kg(request.weight_kg, request.dimensions_cm))
+        fetched = []
+        
+        def fetch() -> Dict[str, Any]:
+            fetched.append(True)
+            return _result_to_cache(self._get_live_best_rate(live_request, prefer_speed, carriers))
+        
+        cached = self.quote_cache.get_or_fetch(key, fetch, cacheable=lambda result: result["success"])
+        result = _result_from_cache(cached)
+        result["request"] = request
+        result["cached"] = not fetched
+        if not fetched:
+            self._debug_log(f"💾 Cached rate: {result.get('carrier')} - ${result.get('cost_usd', 0):.2f}")
+        return result
+    
+    def _get_live_best_rate(self, request: ShippingRequest, prefer_speed: bool = False,
+                            carriers: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Mejor tarifa consultando a los carriers en vivo"""
+        result = self._best_rate_result(self.get_all_quotes(request, carriers), request, prefer_speed)
+        result["source"] = "live"
+        result["cached"] = False
+        return result
+    
+    def _best_rate_result(self, all_quotes: Dict[str, List[ShippingQuote]], request: ShippingRequest,
+                          prefer_speed: bool = False) -> Dict[str, Any]:
+        """Elige la mejor cotización entre todas las de all_quotes"""
         # Flatten and filter successful quotes
         valid_quotes = []
         for carrier, quotes in all_quotes.items():
@@ -518,7 +618,7 @@ class UnifiedShippingAPI:
         
         best_quote = valid_quotes[0]
         
-        self._debug_log(f"💰 Best rate: {best_quote.carrier} - ${best_quote.cost_usd:.2f}")
+        self._debug_log(f"💰 Best rate: {best_quote.carrier} - ${best_quote.cost_usd:.2f} ({best_quote.rate_type})")
         
         return {
             "success": True,
@@ -533,6 +633,73 @@ class UnifiedShippingAPI:
             "alternatives": valid_quotes[1:5],  # Top 4 alternatives
             "request": request
         }
+    
+    def _get_rate_card_quotes(self, request: ShippingRequest) -> Dict[str, List[ShippingQuote]]:
+        """Cotizaciones de los tarifarios offline vigentes para la ruta, por carrier"""
+        weight_kg = billable_weight_kg(request.weight_kg, request.dimensions_cm)
+        all_quotes: Dict[str, List[ShippingQuote]] = {}
+        for q in self.rate_cards.quote(weight_kg, request.origin_country, request.dest_country):
+            if q.currency != request.currency:
+                continue
+            all_quotes.setdefault(q.carrier, []).append(ShippingQuote(
+                carrier=q.carrier,
+                service_name=q.service_name,
+                cost_usd=q.cost_usd,
+                currency=q.currency,
+                transit_days=None,
+                success=True,
+                rate_type="RATE_CARD"
+            ))
+            self._debug_log(f"🗂️ Rate card: {q.carrier} {q.service_name} zona {q.zone} - ${q.cost_usd:.2f}")
+        if not all_quotes:
+            self._debug_log("📭 Sin tarifario vigente, consultando APIs en vivo")
+        return all_quotes
+
+
+def _result_to_cache(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultado de get_best_rate como JSON (las cotizaciones como dicts)"""
+    data = dict(result)
+    data.pop("request", None)
+    if data.get("best_quote") is not None:
+        data["best_quote"] = asdict(data["best_quote"])
+    data["alternatives"] = [asdict(q) for q in data.get("alternatives", [])]
+    data["all_quotes"] = {carrier: [asdict(q) for q in quotes]
+                          for carrier, quotes in data.get("all_quotes", {}).items()}
+    return data
+
+
+def _result_from_cache(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverso de _result_to_cache"""
+    result = dict(data)
+    if result.get("best_quote") is not None:
+        result["best_quote"] = ShippingQuote(**result["best_quote"])
+    result["alternatives"] = [ShippingQuote(**q) for q in result.get("alternatives", [])]
+    result["all_quotes"] = {carrier: [ShippingQuote(**q) for q in quotes]
+                            for carrier, quotes in result.get("all_quotes", {}).items()}
+    return result
+
+
+_shared_apis: Dict[Tuple, UnifiedShippingAPI] = {}
+_shared_apis_lock = threading.Lock()
+
+
+def get_shared_shipping_api(test_mode: bool = True, debug: bool = False,
+                            rate_cards: Optional["RateCardStore"] = None) -> UnifiedShippingAPI:
+    """
+    Instancia compartida del proceso por configuración
+    
+    Reutiliza los clientes de FedEx/DHL (y el token OAuth de FedEx) entre llamadas
+    y usa la caché global de cotizaciones (SHIPPING_QUOTE_CACHE_*).
+    """
+    key = (test_mode, debug, id(rate_cards))
+    with _shared_apis_lock:
+        api = _shared_apis.get(key)
+        if api is None or api.rate_cards is not rate_cards:
+            quote_cache = get_quote_cache() if QUOTE_CACHE_AVAILABLE else None
+            api = UnifiedShippingAPI(test_mode=test_mode, debug=debug,
+                                     rate_cards=rate_cards, quote_cache=quote_cache)
+            _shared_apis[key] = api
+        return api
 
 
 # Convenience functions for easy integration
@@ -542,14 +709,21 @@ def get_cheapest_shipping_rate(weight_kg: float,
                               dest_country: str = "AR",
                               dest_postal: str = "C1000",
                               test_mode: bool = True,
-                              debug: bool = False) -> Dict[str, Any]:
+                              debug: bool = False,
+                              rate_cards: Optional["RateCardStore"] = None) -> Dict[str, Any]:
     """
     Función conveniente para obtener la tarifa más barata
     
+    Usa los tarifarios offline (por defecto los de RATE_CARDS_PATH, si existen)
+    y solo consulta las APIs cuando no hay tarifario vigente para la ruta, con
+    la instancia compartida y la caché de cotizaciones.
+    
     Returns:
         Dict con resultado del mejor carrier
     """
-    api = UnifiedShippingAPI(test_mode=test_mode, debug=debug)
+    if rate_cards is None and RATE_CARDS_AVAILABLE:
+        rate_cards = get_default_rate_cards()
+    api = get_shared_shipping_api(test_mode=test_mode, debug=debug, rate_cards=rate_cards)
     return api.get_best_rate(
         weight=weight_kg,
         weight_unit="KG",
@@ -573,7 +747,7 @@ def compare_all_carriers(weight_kg: float,
     Returns:
         Dict con todas las cotizaciones organizadas por carrier
     """
-    api = UnifiedShippingAPI(test_mode=test_mode, debug=debug)
+    api = get_shared_shipping_api(test_mode=test_mode, debug=debug)
     
     request = ShippingRequest(
         weight_kg=weight_kg,
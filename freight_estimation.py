@@ -2,35 +2,128 @@ import pandas as pd
 import numpy as np
 import os
 
+DEFAULT_ZONE = "Zona 5"
+DEFAULT_BRACKET_KG = 0.5
+
+
+class RateTable:
+    """
+    Tarifas de flete aéreo por peso y zona, listas para consultar.
+
+    Los pesos se ordenan una sola vez al cargar y cada zona queda como un array
+    de NumPy alineado con ellos. Admite consultas de un peso o de un array de
+    pesos, con precio interpolado (como np.interp) o por escalón: el peso se
+    redondea hacia arriba al escalón (0.5 kg) y se cobra la primera fila de la
+    tabla que lo cubre. Fuera del rango de la tabla se usan la primera/última fila.
+    """
+
+    def __init__(self, weights, zones, bracket_kg: float = DEFAULT_BRACKET_KG):
+        """
+        Args:
+            weights: Pesos (KG) de cada fila de la tabla
+            zones: Dict nombre de zona -> precios de cada fila
+            bracket_kg: Escalón de peso para el precio por escalón
+        """
+        weights = np.asarray(weights, dtype=float)
+        order = np.argsort(weights, kind="stable")
+        self.weights = weights[order]
+        self.zones = {name: np.asarray(prices, dtype=float)[order] for name, prices in zones.items()}
+        self.bracket_kg = bracket_kg
+
+    @classmethod
+    def from_dataframe(cls, df, weight_column: str = "KG", bracket_kg: float = DEFAULT_BRACKET_KG):
+        """Tabla desde un DataFrame con la columna de pesos y una columna por zona"""
+        zones = {col: df[col].to_numpy() for col in df.columns if col != weight_column}
+        return cls(df[weight_column].to_numpy(), zones, bracket_kg=bracket_kg)
+
+    @classmethod
+    def from_csv(cls, file_path, bracket_kg: float = DEFAULT_BRACKET_KG):
+        """Tabla desde el CSV de tarifas (KG, Zona 1, ..., Zona N)"""
+        df = pd.read_csv(file_path, dtype=str)
+        # Quitar separadores de miles y convertir todo a numérico; las filas no numéricas se descartan
+        df = df.replace(",", "", regex=True).apply(pd.to_numeric, errors="coerce").dropna()
+        return cls.from_dataframe(df, bracket_kg=bracket_kg)
+
+    def __len__(self):
+        return len(self.weights)
+
+    @property
+    def zone_names(self):
+        return list(self.zones)
+
+    def has_zone(self, zone) -> bool:
+        return self._zone_name(zone) in self.zones
+
+    @staticmethod
+    def _zone_name(zone) -> str:
+        # Permite price(w, zone=5) además de "Zona 5"
+        return f"Zona {zone}" if isinstance(zone, (int, np.integer)) else zone
+
+    def price(self, weight, zone=DEFAULT_ZONE, pricing: str = "interpolated"):
+        """
+        Precio para uno o varios pesos en una zona.
+
+        Args:
+            weight: Peso en kg (número o array de pesos)
+            zone: Nombre de la zona ("Zona 5") o su número (5)
+            pricing: "interpolated" (lineal entre filas) o "step" (por escalón)
+
+        Returns:
+            float para un peso, np.ndarray para un array de pesos
+        """
+        name = self._zone_name(zone)
+        if name not in self.zones:
+            raise ValueError(f"Zona desconocida: {zone}. Disponibles: {self.zone_names}")
+        prices = self.zones[name]
+        weights = np.asarray(weight, dtype=float)
+
+        if pricing == "interpolated":
+            result = np.interp(weights, self.weights, prices)
+        elif pricing == "step":
+            steps = np.round(weights / self.bracket_kg, 9)
+            brackets = np.ceil(steps) * self.bracket_kg
+            idx = np.searchsorted(self.weights, np.round(brackets, 9), side="left")
+            result = prices[np.minimum(idx, len(prices) - 1)]
+        else:
+            raise ValueError(f"Tipo de precio desconocido: {pricing} (usar 'interpolated' o 'step')")
+
+        return float(result) if np.ndim(result) == 0 else result
+
+    def to_dataframe(self):
+        df = pd.DataFrame({"KG": self.weights})
+        for name, prices in self.zones.items():
+            df[name] = prices
+        return df
+
+
 def load_freight_rates(file_path):
-    """Carga las tarifas de flete desde un archivo CSV."""
+    """Carga las tarifas de flete desde un archivo CSV como RateTable (None si no existe)."""
     try:
-        df = pd.read_csv(file_path)
-        # Convertir todas las columnas a numérico, forzando errores a NaN
-        for col in df.columns:
-            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', ''), errors='coerce')
-        # Eliminar filas con valores NaN que podrían haber sido creados por la coerción
-        df = df.dropna()
-        return df
+        return RateTable.from_csv(file_path)
     except FileNotFoundError:
         return None
 
-def calculate_air_freight(weight, rates_df):
+def calculate_air_freight(weight, rates, zone=DEFAULT_ZONE, pricing="interpolated"):
     """
-    Calcula el costo del flete aéreo para la Zona 5 basado en el peso,
-    utilizando interpolación lineal.
+    Calcula el costo del flete aéreo (por defecto Zona 5) basado en el peso,
+    utilizando interpolación lineal o precio por escalón.
+
+    Args:
+        weight: Peso en kg (número o array de pesos)
+        rates: RateTable (o DataFrame de tarifas con columna KG)
+        zone: Zona de la tabla
+        pricing: "interpolated" o "step"
     """
-    if rates_df is None or 'KG' not in rates_df.columns or 'Zona 5' not in rates_df.columns:
+    if rates is None:
+        return 0.0
+    if isinstance(rates, pd.DataFrame):
+        if 'KG' not in rates.columns:
+            return 0.0
+        rates = RateTable.from_dataframe(rates)
+    if not rates.has_zone(zone):
         return 0.0
 
-    # Asegurarse que los datos están ordenados por KG
-    rates_df = rates_df.sort_values(by='KG').reset_index(drop=True)
-
-    # Usar np.interp para la interpolación lineal
-    # Asume que rates_df['KG'] y rates_df['Zona 5'] son los puntos conocidos
-    cost = np.interp(weight, rates_df['KG'], rates_df['Zona 5'])
-    
-    return cost
+    return rates.price(weight, zone=zone, pricing=pricing)
 
 def calculate_sea_freight(volume_m3):
     """
@@ -47,8 +140,8 @@ if __name__ == '__main__':
     rates = load_freight_rates(csv_path)
 
     if rates is not None:
-        print("Tarifas cargadas exitosamente:")
-        print(rates.head())
+        print(f"Tarifas cargadas exitosamente: {len(rates)} pesos, zonas {rates.zone_names}")
+        print(rates.to_dataframe().head())
 
         # Test de flete aéreo
         test_weight = 220.5
@@ -13,15 +13,37 @@ Fecha: 2025
 
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Sequence, Union
 import json
 import logging
 from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Impuestos del cálculo en lote, en el mismo orden que ImportTaxCalculation.impuestos
+BATCH_TAX_KEYS = [
+    "derechos_importacion",
+    "tasa_estadistica",
+    "iva_importacion",
+    "percepcion_iva",
+    "percepcion_ganancias",
+    "iibb",
+]
+
+# Alícuotas incorporadas y formato del archivo de alícuotas (load_rates_config)
+DEFAULT_RATES_VERSION = "incorporadas"
+RATES_CONFIG_SCHEMA = 1
+
+# Límites para operar con enteros de 64 bits / convertir a float sin redondeo intermedio
+_INT64_SAFE = 2 ** 62
+_FLOAT_EXACT = 2 ** 53
+
 
 class TipoImportador(Enum):
     """Tipos de importador según AFIP"""
@@ -67,6 +89,23 @@ class TaxResult:
     observaciones: str = ""
 
 
+@dataclass(frozen=True)
+class RateProfile:
+    """
+    Alícuotas de una combinación (tipo de importador, destino, origen, provincia)
+
+    None indica que el impuesto no aplica. Los derechos dependen del NCM y no
+    forman parte del perfil; iva_bien_capital se usa cuando la mercadería se
+    declara bien de capital con otro destino.
+    """
+    tasa_estadistica: Optional[Decimal]
+    iva: Decimal
+    iva_bien_capital: Decimal
+    percepcion_iva: Optional[Decimal]
+    percepcion_ganancias: Optional[Decimal]
+    iibb: Optional[Decimal]
+
+
 @dataclass
 class ImportTaxCalculation:
     """Resultado completo del cálculo de impuestos"""
@@ -85,8 +124,15 @@ class ImportTaxCalculator:
     considerando el tipo de importador, destino de la mercancía y otras condiciones.
     """
     
-    def __init__(self):
-        """Inicializa la calculadora con las alícuotas vigentes"""
+    def __init__(self, rates_config: Optional[Union[str, Path]] = None):
+        """
+        Inicializa la calculadora con las alícuotas vigentes
+
+        Args:
+            rates_config: Archivo JSON de alícuotas versionado (ver load_rates_config).
+                          Sin archivo se usan las alícuotas incorporadas.
+        """
+        self.rates_version = DEFAULT_RATES_VERSION
         self.tax_rates = {
             "tasa_estadistica": Decimal("0.03"),
             "iva_general": Decimal("0.21"),
@@ -107,6 +153,98 @@ class ImportTaxCalculator:
             "SANTA_FE": Decimal("0.025"),
             # Agregar más provincias según necesidad
         }
+
+        if rates_config is not None:
+            self.load_rates_config(rates_config)
+        else:
+            self.build_rate_profiles()
+
+    def build_rate_profiles(self) -> None:
+        """
+        Compila la tabla de perfiles de alícuotas desde tax_rates e iibb_rates
+
+        Una entrada por (tipo de importador, destino, origen, provincia); la provincia
+        None corresponde a las provincias sin alícuota de IIBB propia. Volver a llamarla
+        después de modificar tax_rates o iibb_rates a mano.
+        """
+        rates = self.tax_rates
+        profiles = {}
+        for tipo in TipoImportador:
+            for destino in DestinoImportacion:
+                for origen in OrigenMercancia:
+                    for provincia in list(self.iibb_rates) + [None]:
+                        if tipo == TipoImportador.MONOTRIBUTISTA:
+                            ganancias = None
+                        elif tipo == TipoImportador.NO_INSCRIPTO:
+                            ganancias = rates["percepcion_ganancias"]["no_inscripto"]
+                        else:
+                            ganancias = rates["percepcion_ganancias"]["inscripto"]
+
+                        profiles[(tipo, destino, origen, provincia)] = RateProfile(
+                            tasa_estadistica=rates["tasa_estadistica"] if origen != OrigenMercancia.MERCOSUR else None,
+                            iva=rates["iva_reducido"] if destino == DestinoImportacion.BIEN_CAPITAL else rates["iva_general"],
+                            iva_bien_capital=rates["iva_reducido"],
+                            percepcion_iva=rates["percepcion_iva"] if (
+                                tipo == TipoImportador.RESPONSABLE_INSCRIPTO and destino == DestinoImportacion.REVENTA
+                            ) else None,
+                            percepcion_ganancias=ganancias,
+                            iibb=None if destino == DestinoImportacion.USO_PROPIO else self.iibb_rates.get(provincia, rates["iibb"])
+                        )
+        self.rate_profiles = profiles
+
+    def rate_profile(self, tipo_importador: TipoImportador, destino: DestinoImportacion,
+                     origen: OrigenMercancia, provincia: Optional[str]) -> RateProfile:
+        """Perfil de alícuotas de la combinación (provincias sin alícuota propia usan la general)"""
+        profile = self.rate_profiles.get((tipo_importador, destino, origen, provincia))
+        if profile is None:
+            profile = self.rate_profiles[(tipo_importador, destino, origen, None)]
+        return profile
+
+    def load_rates_config(self, path: Union[str, Path]) -> None:
+        """
+        Carga las alícuotas desde un archivo JSON versionado y recompila los perfiles
+
+        Formato (las alícuotas como texto para conservar los decimales exactos):
+            {"schema_version": 1, "version": "2025-08",
+             "tax_rates": {"tasa_estadistica": "0.03", ..., "percepcion_ganancias": {...}},
+             "iibb_rates": {"CABA": "0.025", ...}}
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        if config.get("schema_version") != RATES_CONFIG_SCHEMA:
+            raise ValueError(f"Versión de esquema de alícuotas no soportada: {config.get('schema_version')}")
+        try:
+            raw_rates = config["tax_rates"]
+            tax_rates = {key: Decimal(str(raw_rates[key])) for key in
+                         ("tasa_estadistica", "iva_general", "iva_reducido", "percepcion_iva", "iibb")}
+            tax_rates["percepcion_ganancias"] = {
+                key: Decimal(str(raw_rates["percepcion_ganancias"][key])) for key in ("inscripto", "no_inscripto")
+            }
+            iibb_rates = {provincia: Decimal(str(rate)) for provincia, rate in config.get("iibb_rates", {}).items()}
+            version = str(config["version"])
+        except (KeyError, TypeError, ArithmeticError) as e:
+            raise ValueError(f"Archivo de alícuotas inválido ({path}): {e}") from e
+
+        self.tax_rates = tax_rates
+        self.iibb_rates = iibb_rates
+        self.rates_version = version
+        self.build_rate_profiles()
+        logger.info(f"Alícuotas cargadas: versión {version} ({len(self.rate_profiles)} perfiles)")
+
+    def save_rates_config(self, path: Union[str, Path]) -> None:
+        """Guarda las alícuotas actuales con el formato de load_rates_config"""
+        config = {
+            "schema_version": RATES_CONFIG_SCHEMA,
+            "version": self.rates_version,
+            "tax_rates": {
+                key: ({k: str(v) for k, v in value.items()} if isinstance(value, dict) else str(value))
+                for key, value in self.tax_rates.items()
+            },
+            "iibb_rates": {provincia: str(rate) for provincia, rate in self.iibb_rates.items()}
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
     
     def calculate_all_taxes(self, import_data: ImportData) -> ImportTaxCalculation:
         """
@@ -123,6 +261,10 @@ class ImportTaxCalculator:
             
             # Validar datos de entrada
             self._validate_import_data(import_data)
+
+            # Alícuotas de la combinación, precompiladas en la tabla de perfiles
+            profile = self.rate_profile(import_data.tipo_importador, import_data.destino,
+                                        import_data.origen, import_data.provincia)
             
             impuestos = []
             
@@ -131,26 +273,26 @@ class ImportTaxCalculator:
             impuestos.append(derechos_importacion)
 
             # 1. Tasa Estadística
-            tasa_estadistica = self._calculate_tasa_estadistica(import_data)
+            tasa_estadistica = self._calculate_tasa_estadistica(import_data, profile)
             impuestos.append(tasa_estadistica)
             
             # Base imponible para IVA y percepciones: CIF + Derechos + Tasa
             base_imponible_iva = import_data.cif_value + derechos_importacion.monto + tasa_estadistica.monto
             
             # 2. IVA Importación
-            iva_importacion = self._calculate_iva_importacion(import_data, base_imponible_iva)
+            iva_importacion = self._calculate_iva_importacion(import_data, base_imponible_iva, profile)
             impuestos.append(iva_importacion)
             
             # 3. Percepción IVA Adicional
-            percepcion_iva = self._calculate_percepcion_iva(import_data, base_imponible_iva)
+            percepcion_iva = self._calculate_percepcion_iva(import_data, base_imponible_iva, profile)
             impuestos.append(percepcion_iva)
             
             # 4. Percepción Ganancias
-            percepcion_ganancias = self._calculate_percepcion_ganancias(import_data, base_imponible_iva)
+            percepcion_ganancias = self._calculate_percepcion_ganancias(import_data, base_imponible_iva, profile)
             impuestos.append(percepcion_ganancias)
             
             # 5. Ingresos Brutos
-            iibb = self._calculate_iibb(import_data, base_imponible_iva)
+            iibb = self._calculate_iibb(import_data, base_imponible_iva, profile)
             impuestos.append(iibb)
             
             # Calcular totales
@@ -212,15 +354,15 @@ class ImportTaxCalculator:
             observaciones=observaciones
         )
 
-    def _calculate_tasa_estadistica(self, data: ImportData) -> TaxResult:
+    def _calculate_tasa_estadistica(self, data: ImportData, profile: RateProfile) -> TaxResult:
         """
         Calcula la Tasa Estadística (3%)
         
         Aplica: Siempre para importaciones de bienes, excepto origen Mercosur (exento)
         Base: Valor CIF
         """
-        aplica = data.origen != OrigenMercancia.MERCOSUR
-        alicuota = self.tax_rates["tasa_estadistica"] if aplica else Decimal("0")
+        aplica = profile.tasa_estadistica is not None
+        alicuota = profile.tasa_estadistica if aplica else Decimal("0")
         base_imponible = data.cif_value if aplica else Decimal("0")
         monto = self._round_currency(base_imponible * alicuota)
         
@@ -237,7 +379,8 @@ class ImportTaxCalculator:
             observaciones=observaciones
         )
     
-    def _calculate_iva_importacion(self, data: ImportData, base_imponible: Decimal) -> TaxResult:
+    def _calculate_iva_importacion(self, data: ImportData, base_imponible: Decimal,
+                                   profile: RateProfile) -> TaxResult:
         """
         Calcula el IVA de Importación
         
@@ -247,10 +390,10 @@ class ImportTaxCalculator:
         """
         # Determinar alícuota
         if data.es_bien_capital or data.destino == DestinoImportacion.BIEN_CAPITAL:
-            alicuota = self.tax_rates["iva_reducido"]
+            alicuota = profile.iva_bien_capital
             observaciones = "Alícuota reducida para bien de capital"
         else:
-            alicuota = self.tax_rates["iva_general"]
+            alicuota = profile.iva
             observaciones = "Alícuota general"
         
         # Verificar exenciones
@@ -271,17 +414,17 @@ class ImportTaxCalculator:
             observaciones=observaciones
         )
     
-    def _calculate_percepcion_iva(self, data: ImportData, base_imponible_iva: Decimal) -> TaxResult:
+    def _calculate_percepcion_iva(self, data: ImportData, base_imponible_iva: Decimal,
+                                  profile: RateProfile) -> TaxResult:
         """
         Calcula la Percepción de IVA Adicional (20%)
         
         Aplica: A responsables inscriptos en IVA para reventa.
         Base: La misma que para el IVA
         """
-        aplica = data.tipo_importador == TipoImportador.RESPONSABLE_INSCRIPTO and \
-                 data.destino == DestinoImportacion.REVENTA
+        aplica = profile.percepcion_iva is not None
         
-        alicuota = self.tax_rates["percepcion_iva"] if aplica else Decimal("0")
+        alicuota = profile.percepcion_iva if aplica else Decimal("0")
         monto = self._round_currency(base_imponible_iva * alicuota) if aplica else Decimal("0")
         
         observaciones = ""
@@ -297,24 +440,21 @@ class ImportTaxCalculator:
             observaciones=observaciones
         )
     
-    def _calculate_percepcion_ganancias(self, data: ImportData, base_imponible_iva: Decimal) -> TaxResult:
+    def _calculate_percepcion_ganancias(self, data: ImportData, base_imponible_iva: Decimal,
+                                        profile: RateProfile) -> TaxResult:
         """
         Calcula la Percepción de Impuesto a las Ganancias (6% o 11%)
         
         Aplica: Siempre, excepto para monotributistas.
         Base: La misma que para el IVA
         """
+        aplica = profile.percepcion_ganancias is not None
+        alicuota = profile.percepcion_ganancias if aplica else Decimal("0")
         if data.tipo_importador == TipoImportador.MONOTRIBUTISTA:
-            aplica = False
-            alicuota = Decimal("0")
             observaciones = "No aplica a monotributistas"
         elif data.tipo_importador == TipoImportador.NO_INSCRIPTO:
-            aplica = True
-            alicuota = self.tax_rates["percepcion_ganancias"]["no_inscripto"]
             observaciones = "Alícuota para no inscriptos"
         else: # Responsable inscripto
-            aplica = True
-            alicuota = self.tax_rates["percepcion_ganancias"]["inscripto"]
             observaciones = "Alícuota para responsables inscriptos"
         
         monto = self._round_currency(base_imponible_iva * alicuota) if aplica else Decimal("0")
@@ -328,16 +468,16 @@ class ImportTaxCalculator:
             observaciones=observaciones
         )
     
-    def _calculate_iibb(self, data: ImportData, base_imponible_iva: Decimal) -> TaxResult:
+    def _calculate_iibb(self, data: ImportData, base_imponible_iva: Decimal, profile: RateProfile) -> TaxResult:
         """
         Calcula la percepción de Ingresos Brutos (2.5% general)
         
         Aplica: A responsables inscriptos y monotributistas, no a consumidores finales.
         Base: La misma que para el IVA
         """
-        aplica = data.destino != DestinoImportacion.USO_PROPIO
+        aplica = profile.iibb is not None
         
-        alicuota = self.iibb_rates.get(data.provincia, self.tax_rates["iibb"]) if aplica else Decimal("0")
+        alicuota = profile.iibb if aplica else Decimal("0")
         
         monto = self._round_currency(base_imponible_iva * alicuota) if aplica else Decimal("0")
         
@@ -357,7 +497,202 @@ class ImportTaxCalculator:
     def _round_currency(self, amount: Decimal) -> Decimal:
         """Redondea un monto a 2 decimales"""
         return amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    
+
+    def calculate_batch(
+        self,
+        cif_values: Union[Sequence, np.ndarray, pd.Series],
+        tipo_importador: Union[TipoImportador, str, Sequence] = TipoImportador.RESPONSABLE_INSCRIPTO,
+        destino: Union[DestinoImportacion, str, Sequence] = DestinoImportacion.REVENTA,
+        origen: Union[OrigenMercancia, str, Sequence] = OrigenMercancia.EXTRAZONA,
+        derechos_importacion_pct=None,
+        es_bien_capital=False,
+        tiene_exencion_iva=False,
+        provincia: Union[str, Sequence] = "CABA"
+    ) -> pd.DataFrame:
+        """
+        Calcula los impuestos de muchas importaciones a la vez (grillas de precios, catálogos)
+
+        Cada argumento es un valor único o una secuencia del largo de cif_values.
+        Los enums aceptan el miembro o su valor ("reventa"); derechos_importacion_pct
+        acepta None/NaN como "sin derechos".
+
+        Los montos se calculan con enteros (centavos) en NumPy, con el mismo redondeo
+        ROUND_HALF_UP de _round_currency: cada monto, base y total es idéntico bit a bit
+        al float() del Decimal que devuelve calculate_all_taxes. La incidencia porcentual
+        es el cociente exacto redondeado a float. Las alícuotas salen de la misma tabla
+        de perfiles (rate_profile) que usa calculate_all_taxes.
+
+        Args:
+            cif_values: Valores CIF en USD
+            tipo_importador, destino, origen, derechos_importacion_pct,
+            es_bien_capital, tiene_exencion_iva, provincia: Igual que en ImportData
+
+        Returns:
+            pd.DataFrame: Una fila por importación con los datos de entrada y, por cada
+            impuesto de BATCH_TAX_KEYS, las columnas <impuesto>_aplica, <impuesto>_alicuota
+            y <impuesto>_monto; más base_imponible_iva, total_impuestos, costo_total e
+            incidencia_porcentual
+        """
+        cif_col = np.asarray(cif_values, dtype=object).ravel()
+        n = len(cif_col)
+        tipo_col = self._batch_enum_column(TipoImportador, tipo_importador, n)
+        destino_col = self._batch_enum_column(DestinoImportacion, destino, n)
+        origen_col = self._batch_enum_column(OrigenMercancia, origen, n)
+        provincia_col = self._batch_column(provincia, n)
+        bien_capital = self._batch_column(es_bien_capital, n).astype(bool)
+        exencion_iva = self._batch_column(tiene_exencion_iva, n).astype(bool)
+
+        # CIF como Decimal (igual que calcular_impuestos_importacion) sobre los valores únicos
+        cif_codes, cif_uniques = pd.factorize(cif_col)
+        if (cif_codes < 0).any():
+            raise ValueError("El valor CIF debe ser mayor a 0")
+        cif_dec = [self._to_decimal(v) for v in cif_uniques]
+        if any(v <= 0 for v in cif_dec):
+            raise ValueError("El valor CIF debe ser mayor a 0")
+
+        # Alícuota de derechos: pct / 100, solo si pct > 0
+        pct_codes, pct_uniques = pd.factorize(self._batch_column(derechos_importacion_pct, n))
+        pct_dec = [self._to_decimal(v) for v in pct_uniques]
+        der_aplica_u = np.array([v > 0 for v in pct_dec] + [False], dtype=bool)
+        der_rates_u = [v / Decimal("100") if v > 0 else Decimal("0") for v in pct_dec] + [Decimal("0")]
+
+        # Perfil de alícuotas de cada combinación (tipo, destino, origen, provincia) única
+        keys = np.empty(n, dtype=object)
+        keys[:] = list(zip(tipo_col, destino_col, origen_col, provincia_col))
+        profile_codes, profile_keys = pd.factorize(keys)
+        profiles = [self.rate_profile(TipoImportador(t), DestinoImportacion(d), OrigenMercancia(o), p)
+                    for t, d, o, p in profile_keys]
+        profile_fields = ["tasa_estadistica", "iva", "iva_bien_capital", "percepcion_iva",
+                          "percepcion_ganancias", "iibb"]
+        all_rates = der_rates_u + [getattr(profile, field) or Decimal("0")
+                                   for profile in profiles for field in profile_fields]
+
+        # Escalas: CIF en unidades de 10^-s USD (s >= 2), alícuotas en unidades de 10^-r
+        s = max([2] + [self._decimal_places(v) for v in cif_dec])
+        r = max(self._decimal_places(v) for v in all_rates)
+        cif_units_u = [int(v.scaleb(s)) for v in cif_dec]
+        max_cif = max(cif_units_u, default=0)
+        max_rate = max(int(v.scaleb(r)) for v in all_rates) or 1
+        unit = 10 ** (s - 2)        # centavos -> unidades de CIF
+        divisor = 10 ** (s + r - 2)  # CIF x alícuota -> centavos
+
+        # Cota de las bases y productos: int64 si entra, si no enteros de Python (object)
+        max_base = max_cif * (10 ** r + 2 * max_rate) // 10 ** r + 2 * unit + 1
+        max_total = 6 * max_base * max_rate // (10 ** r * unit) + 6
+        fits = max(max_base * max_rate, max_total * 10 ** s, max_total * unit + max_cif) < _INT64_SAFE
+        dtype = np.int64 if fits else object
+
+        def units(values, scale):
+            return np.array([int(v.scaleb(scale)) for v in values], dtype=dtype)
+
+        cif_u = units(cif_dec, s)[cif_codes]
+        der_rate = units(der_rates_u, r)[pct_codes]
+        der_aplica = der_aplica_u[pct_codes]
+
+        zero = np.zeros(n, dtype=dtype)
+
+        def profile_rates(field):
+            """(aplica, alícuota en unidades) por fila para un campo del perfil"""
+            values = [getattr(profile, field) for profile in profiles]
+            aplica_u = np.array([v is not None for v in values], dtype=bool)
+            return aplica_u[profile_codes], units([v or Decimal("0") for v in values], r)[profile_codes]
+
+        def monto(base_u, rate_u):
+            # ROUND_HALF_UP sobre valores no negativos: (x + d/2) // d
+            product = base_u * rate_u
+            if divisor == 1:
+                return product
+            return (product + divisor // 2) // divisor
+
+        # 0. Derechos y 1. Tasa estadística (base: CIF)
+        tasa_aplica, tasa_rate = profile_rates("tasa_estadistica")
+        der_monto = monto(cif_u, der_rate)
+        tasa_monto = monto(cif_u, tasa_rate)
+
+        # Base imponible para IVA y percepciones: CIF + Derechos + Tasa
+        base_iva_u = cif_u + (der_monto + tasa_monto) * unit
+
+        # 2. IVA (reducido para bienes de capital, 0 si exento)
+        _, iva_general = profile_rates("iva")
+        _, iva_reducido = profile_rates("iva_bien_capital")
+        es_capital = bien_capital | (destino_col == DestinoImportacion.BIEN_CAPITAL.value)
+        iva_aplica = ~exencion_iva
+        iva_rate = np.where(iva_aplica, np.where(es_capital, iva_reducido, iva_general), zero).astype(dtype)
+        # 3. Percepción IVA, 4. Percepción Ganancias y 5. Ingresos Brutos
+        perc_iva_aplica, perc_iva_rate = profile_rates("percepcion_iva")
+        gan_aplica, gan_rate = profile_rates("percepcion_ganancias")
+        iibb_aplica, iibb_rate = profile_rates("iibb")
+
+        rates_u = [der_rate, tasa_rate, iva_rate, perc_iva_rate, gan_rate, iibb_rate]
+        aplica = [der_aplica, tasa_aplica, iva_aplica, perc_iva_aplica, gan_aplica, iibb_aplica]
+        montos = [der_monto, tasa_monto] + [monto(base_iva_u, rate) for rate in rates_u[2:]]
+
+        total = zero
+        for key_aplica, key_monto in zip(aplica, montos):
+            total = total + np.where(key_aplica, key_monto, zero).astype(dtype)
+
+        pct_float = np.array([float(v) for v in pct_dec] + [np.nan])[pct_codes]
+        columns = {
+            "cif_value": self._exact_ratio(cif_u, 10 ** s),
+            "tipo_importador": tipo_col,
+            "destino": destino_col,
+            "origen": origen_col,
+            "provincia": provincia_col,
+            "derechos_importacion_pct": pct_float,
+            "es_bien_capital": bien_capital,
+            "tiene_exencion_iva": exencion_iva,
+        }
+        for key, key_aplica, rate_u, key_monto in zip(BATCH_TAX_KEYS, aplica, rates_u, montos):
+            columns[f"{key}_aplica"] = key_aplica
+            columns[f"{key}_alicuota"] = self._exact_ratio(rate_u, 10 ** r)
+            columns[f"{key}_monto"] = self._exact_ratio(key_monto, 100)
+        columns["base_imponible_iva"] = self._exact_ratio(base_iva_u, 10 ** s)
+        columns["total_impuestos"] = self._exact_ratio(total, 100)
+        columns["costo_total"] = self._exact_ratio(cif_u + total * unit, 10 ** s)
+        columns["incidencia_porcentual"] = self._exact_ratio(total * 10 ** s, cif_u)
+
+        logger.info(f"Cálculo en lote completado: {n} importaciones")
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def _batch_column(value, n: int) -> np.ndarray:
+        """Valor único o secuencia -> array object de largo n"""
+        if isinstance(value, (str, Enum, Decimal)) or np.ndim(value) == 0:
+            return np.full(n, value, dtype=object)
+        column = np.asarray(value, dtype=object).ravel()
+        if len(column) != n:
+            raise ValueError(f"Se esperaban {n} valores y se recibieron {len(column)}")
+        return column
+
+    @classmethod
+    def _batch_enum_column(cls, enum_cls, value, n: int) -> np.ndarray:
+        """Columna de valores del enum (acepta miembros o sus valores)"""
+        if isinstance(value, (str, Enum)):
+            return np.full(n, enum_cls(value).value, dtype=object)
+        codes, uniques = pd.factorize(cls._batch_column(value, n))
+        if (codes < 0).any():
+            raise ValueError(f"{enum_cls.__name__} inválido")
+        values = np.array([enum_cls(v).value for v in uniques], dtype=object)
+        return values[codes]
+
+    @staticmethod
+    def _to_decimal(value) -> Decimal:
+        return value if isinstance(value, Decimal) else Decimal(str(value))
+
+    @staticmethod
+    def _decimal_places(value: Decimal) -> int:
+        return max(0, -value.normalize().as_tuple().exponent)
+
+    @staticmethod
+    def _exact_ratio(numerator: np.ndarray, denominator) -> np.ndarray:
+        """numerator / denominator con un único redondeo a float (igual que float(Decimal))"""
+        numerator = np.asarray(numerator)
+        denominator = np.broadcast_to(np.asarray(denominator), numerator.shape)
+        if (numerator.dtype != object and denominator.dtype != object and numerator.size
+                and np.abs(numerator).max() < _FLOAT_EXACT and np.abs(denominator).max() < _FLOAT_EXACT):
+            return numerator / denominator
+        return np.array([int(a) / int(b) for a, b in zip(numerator.tolist(), denominator.tolist())], dtype=float)
+
     def generate_report(self, calculation: ImportTaxCalculation) -> str:
         """
         Genera un reporte detallado del cálculo de impuestos
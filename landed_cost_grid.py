@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+📊 Landed Cost Grid - Sensibilidad del costo puesto en destino
+==============================================================
+
+Calcula en una sola llamada, sin Streamlit, el landed cost de un producto
+para todas las combinaciones de precio, cantidad, cotización del dólar y
+tipo de flete: la interfaz puede mostrar tablas y gráficos de sensibilidad
+sin volver a correr impuestos y flete por cada edición.
+
+Funcionalidades:
+- Derechos del NCM leídos una sola vez del resultado de clasificación
+- Impuestos de todos los precios en un único calculate_batch
+- Métricas de envío (peso facturable, volumen) una vez por cantidad
+- Cotización courier una vez por escalón de peso facturable (los carriers cobran por escalón)
+- Fallback a la tabla de tarifas (freight_estimation) si la cotización courier falla
+- Resultado como DataFrame con índice (precio, cantidad, cotizacion, tipo_flete)
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import re
+import math
+import logging
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from import_tax_calculator import ImportTaxCalculator
+from freight_estimation import RateTable, calculate_air_freight, calculate_sea_freight
+
+logger = logging.getLogger(__name__)
+
+FLETE_COURIER = "Courier (Aéreo)"
+FLETE_MARITIMO = "Marítimo (Contenedor)"
+FREIGHT_MODES = [FLETE_COURIER, FLETE_MARITIMO]
+
+HONORARIOS_DESPACHANTE_PCT = 0.02
+VOLUMETRIC_FACTOR_KG_PER_CBM = 167
+DEFAULT_WEIGHT_BRACKET_KG = 0.5
+
+# Cotizador courier: peso facturable (kg) -> (costo total USD, descripción del método)
+QuoteFunction = Callable[[float], Tuple[float, str]]
+
+
+def calculate_shipping_metrics(editable_data: Dict, import_quantity: int) -> Dict:
+    """
+    Calcula métricas de envío (peso, volumen, peso facturable) según el tipo de embalaje.
+
+    Args:
+        editable_data: Datos del producto que incluyen peso, dimensiones y tipo de embalaje
+        import_quantity: Cantidad de unidades a importar
+
+    Returns:
+        Dict con todas las métricas de envío calculadas
+    """
+    packaging_type = editable_data.get('packaging_type', 'individual')
+
+    if packaging_type == "individual":
+        # EMBALAJE INDIVIDUAL: cada unidad en su propia caja
+        peso_unitario_kg = float(editable_data.get('weight_kg', 0.0))
+        dims = editable_data.get('dimensions_cm', {"length": 0.0, "width": 0.0, "height": 0.0})
+
+        peso_total_kg = peso_unitario_kg * import_quantity
+
+        if all(d > 0 for d in dims.values()):
+            volumen_unitario_cbm = (dims['length'] * dims['width'] * dims['height']) / 1_000_000
+            volumen_total_cbm = volumen_unitario_cbm * import_quantity
+            peso_volumetrico_kg = volumen_total_cbm * VOLUMETRIC_FACTOR_KG_PER_CBM
+        else:
+            volumen_total_cbm = 0
+            peso_volumetrico_kg = 0
+
+    else:  # multiple
+        # EMBALAJE MÚLTIPLE: usar peso total de la caja y calcular número de cajas necesarias
+        units_per_box = editable_data.get('units_per_box', 1)
+        box_dims = editable_data.get('box_dimensions_cm', {"length": 0.0, "width": 0.0, "height": 0.0})
+        box_total_weight_kg = float(editable_data.get('box_total_weight_kg', 0.0))
+
+        # Calcular número de cajas necesarias
+        num_boxes = math.ceil(import_quantity / units_per_box)
+
+        # Peso total = peso total de cada caja × número de cajas
+        peso_total_kg = box_total_weight_kg * num_boxes
+
+        # Volumen basado en las dimensiones de las cajas
+        if all(d > 0 for d in box_dims.values()):
+            volumen_caja_cbm = (box_dims['length'] * box_dims['width'] * box_dims['height']) / 1_000_000
+            volumen_total_cbm = volumen_caja_cbm * num_boxes
+            peso_volumetrico_kg = volumen_total_cbm * VOLUMETRIC_FACTOR_KG_PER_CBM
+        else:
+            volumen_total_cbm = 0
+            peso_volumetrico_kg = 0
+
+    # Calcular peso facturable (el mayor entre peso físico y volumétrico)
+    peso_facturable_kg = max(peso_total_kg, peso_volumetrico_kg) if peso_volumetrico_kg > 0 else peso_total_kg
+
+    return {
+        "peso_total_kg": peso_total_kg,
+        "volumen_total_cbm": volumen_total_cbm,
+        "peso_volumetrico_kg": peso_volumetrico_kg,
+        "peso_facturable_kg": peso_facturable_kg,
+        "packaging_type": packaging_type,
+        "num_boxes": math.ceil(import_quantity / editable_data.get('units_per_box', 1)) if packaging_type == "multiple" else import_quantity
+    }
+
+
+def derechos_from_ncm_result(ncm_result: Optional[Dict]) -> float:
+    """Derechos de importación (%) del tratamiento arancelario del resultado NCM ("20.0%" -> 20.0)"""
+    if not ncm_result:
+        return 0.0
+    derechos_str = ncm_result.get('tratamiento_arancelario', {}).get('derechos_importacion', '0.0%')
+    cleaned_str = re.sub(r'[^\d.]', '', str(derechos_str))
+    try:
+        return float(cleaned_str) if cleaned_str else 0.0
+    except ValueError:
+        logger.warning(f"No se pudo parsear derechos de importación: '{derechos_str}'. Usando 0.0%.")
+        return 0.0
+
+
+def unified_courier_quote(origin_details: Optional[Dict] = None,
+                          destination_details: Optional[Dict] = None,
+                          test_mode: bool = True) -> QuoteFunction:
+    """
+    Cotizador courier con la API unificada de carriers (la tarifa más barata)
+
+    Args:
+        origin_details / destination_details: Direcciones con countryCode y postalCode
+        test_mode: Usar los entornos de prueba de los carriers
+    """
+    from carriers_apis_conections.unified_shipping_api import get_cheapest_shipping_rate
+
+    origin_details = origin_details or {}
+    destination_details = destination_details or {}
+
+    def quote(weight_kg: float) -> Tuple[float, str]:
+        result = get_cheapest_shipping_rate(
+            weight_kg=weight_kg,
+            origin_country=origin_details.get('countryCode', 'CN'),
+            origin_postal=origin_details.get('postalCode', '518000'),
+            dest_country=destination_details.get('countryCode', 'AR'),
+            dest_postal=destination_details.get('postalCode', 'C1000'),
+            test_mode=test_mode,
+            debug=False
+        )
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Sin cotizaciones disponibles"))
+        best_quote = result["best_quote"]
+        return best_quote.cost_usd, f"{best_quote.carrier} - {best_quote.service_name}"
+
+    return quote
+
+
+def _weight_bracket(weight_kg: float, bracket_kg: Optional[float]) -> float:
+    """Escalón de peso facturable que cobra el carrier (redondeo hacia arriba)"""
+    if not bracket_kg:
+        return weight_kg
+    return round(math.ceil(round(weight_kg / bracket_kg, 9)) * bracket_kg, 6)
+
+
+def landed_cost_grid(
+    product: Dict,
+    prices: Sequence[float],
+    quantities: Sequence[int],
+    fx_rates: Sequence[float],
+    freight_modes: Sequence[str] = FREIGHT_MODES,
+    ncm_result: Optional[Dict] = None,
+    configuracion: Optional[Dict] = None,
+    quote_fn: Optional[QuoteFunction] = None,
+    freight_rates: Optional[RateTable] = None,
+    weight_bracket_kg: Optional[float] = DEFAULT_WEIGHT_BRACKET_KG,
+    calculator: Optional[ImportTaxCalculator] = None
+) -> pd.DataFrame:
+    """
+    Landed cost para todas las combinaciones precio x cantidad x cotización x flete
+
+    Mismo cálculo que recalculate_and_update_session en la app: impuestos sobre el
+    precio unitario como CIF, flete total del envío repartido por unidad y 2% de
+    honorarios del despachante.
+
+    Args:
+        product: Datos de envío del producto (shipping_details de la app: weight_kg,
+                 dimensions_cm, packaging_type, units_per_box, box_*)
+        prices: Precios unitarios en USD
+        quantities: Cantidades a importar
+        fx_rates: Cotizaciones USD/ARS
+        freight_modes: Tipos de flete (FLETE_COURIER, FLETE_MARITIMO)
+        ncm_result: Resultado de la clasificación NCM (derechos de importación)
+        configuracion: tipo_importador, destino_importacion y provincia de la app
+        quote_fn: Cotizador courier (default: unified_courier_quote()); se llama una vez
+                  por escalón de peso
+        freight_rates: Tarifas de freight_estimation (load_freight_rates) para el fallback courier
+        weight_bracket_kg: Escalón de peso de los carriers (None: peso exacto)
+        calculator: Calculadora de impuestos (default: una nueva)
+
+    Returns:
+        pd.DataFrame: Índice (precio, cantidad, cotizacion, tipo_flete) con impuestos,
+        flete, honorarios y landed cost unitario/total en USD y ARS. df.attrs incluye
+        la cantidad de cotizaciones courier realizadas.
+    """
+    prices = [float(p) for p in prices]
+    quantities = [int(q) for q in quantities]
+    fx_rates = [float(fx) for fx in fx_rates]
+    freight_modes = list(freight_modes)
+    unknown = [mode for mode in freight_modes if mode not in FREIGHT_MODES]
+    if unknown:
+        raise ValueError(f"Tipo de flete no soportado: {unknown}")
+
+    configuracion = configuracion or {}
+    calculator = calculator or ImportTaxCalculator()
+
+    # 1. Impuestos: dependen solo del precio (derechos del NCM leídos una vez)
+    taxes = calculator.calculate_batch(
+        prices,
+        tipo_importador=configuracion.get('tipo_importador', 'responsable_inscripto'),
+        destino=configuracion.get('destino_importacion', 'reventa'),
+        origen="extrazona",
+        provincia=configuracion.get('provincia', 'CABA'),
+        derechos_importacion_pct=derechos_from_ncm_result(ncm_result)
+    )
+    impuestos = taxes["total_impuestos"].to_numpy()
+
+    # 2. Flete: depende de la cantidad y del tipo de flete; courier cotizado por escalón
+    quotes: Dict[float, Tuple[float, str]] = {}
+
+    def courier_cost(weight_kg: float) -> Tuple[float, str]:
+        bracket = _weight_bracket(weight_kg, weight_bracket_kg)
+        if bracket not in quotes:
+            nonlocal quote_fn
+            try:
+                if quote_fn is None:
+                    quote_fn = unified_courier_quote()
+                quotes[bracket] = quote_fn(bracket)
+            except Exception as e:
+                logger.warning(f"⚠️ Cotización courier falló para {bracket} kg: {e}. Usando tarifas.")
+                if freight_rates is not None:
+                    quotes[bracket] = (float(calculate_air_freight(bracket, freight_rates)), "Fallback DHL Zona 5")
+                else:
+                    quotes[bracket] = (0.0, "Sin tarifas disponibles")
+        return quotes[bracket]
+
+    shape = (len(quantities), len(freight_modes))
+    flete_total = np.zeros(shape)
+    peso_facturable = np.zeros(shape)
+    metodos = np.empty(shape, dtype=object)
+    for i, quantity in enumerate(quantities):
+        metrics = calculate_shipping_metrics(product, quantity)
+        for j, mode in enumerate(freight_modes):
+            peso_facturable[i, j] = metrics["peso_facturable_kg"]
+            if mode == FLETE_COURIER:
+                flete_total[i, j], metodos[i, j] = courier_cost(metrics["peso_facturable_kg"])
+            elif metrics["volumen_total_cbm"] > 0:
+                flete_total[i, j], metodos[i, j] = calculate_sea_freight(metrics["volumen_total_cbm"]), "90 USD/m³"
+            else:
+                flete_total[i, j], metodos[i, j] = 0.0, "Sin dimensiones válidas"
+    qty = np.array(quantities, dtype=float)[:, None]
+    flete_unitario = np.divide(flete_total, qty, out=np.zeros(shape), where=qty > 0)
+
+    # 3. Cubo precio x cantidad x cotización x flete (mismo orden de sumas que la app)
+    price = np.array(prices)[:, None, None, None]
+    honorarios = price * HONORARIOS_DESPACHANTE_PCT
+    landed = price + impuestos[:, None, None, None] + flete_unitario[None, :, None, :] + honorarios
+    fx = np.array(fx_rates)[None, None, :, None]
+    cube_shape = (len(prices), len(quantities), len(fx_rates), len(freight_modes))
+
+    def cube(values):
+        return np.broadcast_to(values, cube_shape).ravel()
+
+    landed_total = landed * qty[None, :, :, None]
+    index = pd.MultiIndex.from_product([prices, quantities, fx_rates, freight_modes],
+                                       names=["precio", "cantidad", "cotizacion", "tipo_flete"])
+    grid = pd.DataFrame({
+        "impuestos_usd": cube(impuestos[:, None, None, None]),
+        "flete_total_usd": cube(flete_total[None, :, None, :]),
+        "flete_unitario_usd": cube(flete_unitario[None, :, None, :]),
+        "honorarios_despachante_usd": cube(honorarios),
+        "landed_cost_usd": cube(landed),
+        "landed_cost_total_usd": cube(landed_total),
+        "landed_cost_ars": cube(landed * fx),
+        "landed_cost_total_ars": cube(landed_total * fx),
+        "peso_facturable_kg": cube(peso_facturable[None, :, None, :]),
+        "metodo_flete": cube(metodos[None, :, None, :]),
+    }, index=index)
+    grid.attrs["cotizaciones_courier"] = len(quotes)
+    return grid
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+💾 LLM Response Cache - Caché persistente de respuestas del LLM
+================================================================
+
+Caché en disco (SQLite) para las consultas de clasificación NCM, que se hacen
+con parámetros deterministas (temperature 0 / 0.1): el mismo producto con la
+misma imagen no vuelve a pagar latencia ni tokens.
+
+Funcionalidades:
+- Clave por contenido: modelo + mensajes normalizados + parámetros + hash de imagen
+- Las imágenes embebidas (data:...;base64) se reemplazan por su SHA-256 en la clave
+- Expiración por TTL y desalojo LRU acotado por cantidad de entradas y tamaño
+- Seguro entre hilos y entre procesos (SQLite en modo WAL)
+- Configurable por variables de entorno (LLM_CACHE_*)
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import json
+import asyncio
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Cambiar si se modifica la forma de construir claves: invalida todo lo anterior
+CACHE_KEY_VERSION = 1
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'comercio_exterior' / 'llm_responses.sqlite3'
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 20_000
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# Parámetros de la llamada que no cambian la respuesta y no forman parte de la clave
+_NON_KEY_PARAMS = frozenset({'timeout', 'extra_headers', 'stream', 'user'})
+
+
+def _normalize_text(text: str) -> str:
+    """Unicode NFC y espacios colapsados por línea (el prompt es lo que cambia la respuesta)"""
+    text = unicodedata.normalize('NFC', text)
+    lines = [' '.join(line.split()) for line in text.strip().splitlines()]
+    return '\n'.join(lines)
+
+
+def _normalize_image_url(url: str) -> str:
+    """Las imágenes embebidas se identifican por el hash de su contenido"""
+    if url.startswith('data:'):
+        header, _, payload = url.partition(',')
+        digest = hashlib.sha256(payload.encode('ascii', 'ignore')).hexdigest()
+        return f"{header.split(';')[0]};sha256={digest}"
+    return url
+
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return _normalize_text(content)
+    if isinstance(content, list):
+        return [_normalize_content(part) for part in content]
+    if isinstance(content, dict):
+        normalized = {}
+        for key, value in content.items():
+            if key == 'url' and isinstance(value, str):
+                normalized[key] = _normalize_image_url(value)
+            else:
+                normalized[key] = _normalize_content(value)
+        return normalized
+    return content
+
+
+def make_cache_key(model: str, messages: List[Dict], **params) -> str:
+    """
+    Clave determinista para una llamada de chat completion
+
+    Args:
+        model: Modelo solicitado
+        messages: Mensajes tal como se envían a la API
+        **params: Resto de parámetros (temperature, response_format, max_tokens...)
+
+    Returns:
+        Hash SHA-256 hexadecimal
+    """
+    payload = {
+        'v': CACHE_KEY_VERSION,
+        'model': model,
+        'messages': _normalize_content(messages),
+        'params': {k: v for k, v in params.items() if k not in _NON_KEY_PARAMS and v is not None},
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """Caché persistente clave -> texto de respuesta, con TTL y desalojo LRU"""
+
+    def __init__(self, path: Union[str, Path, None] = None,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else DEFAULT_CACHE_PATH
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)')
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Respuesta guardada para la clave, o None si no existe o expiró"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str, model: str = '') -> None:
+        """Guarda una respuesta y desaloja las menos usadas si se superan los límites"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, response, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Expirados primero; luego LRU hasta respetar max_entries y max_bytes"""
+        if self.ttl_seconds is not None:
+            self._conn.execute('DELETE FROM responses WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+
+        count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        excess_entries = max(0, count - self.max_entries)
+        excess_bytes = max(0, total - self.max_bytes)
+        evict_keys = []
+        freed = 0
+        for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_access ASC'):
+            if len(evict_keys) >= excess_entries and freed >= excess_bytes:
+                break
+            evict_keys.append((key,))
+            freed += size
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', evict_keys)
+        logger.debug(f"💾 Caché LLM: {len(evict_keys)} entradas desalojadas (LRU)")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _is_cacheable(response_text: Optional[str], params: Dict[str, Any]) -> bool:
+    """No se guardan respuestas vacías ni JSON inválido cuando se pidió JSON"""
+    if not response_text or not response_text.strip():
+        return False
+    response_format = params.get('response_format') or {}
+    if isinstance(response_format, dict) and response_format.get('type') == 'json_object':
+        try:
+            json.loads(response_text)
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+async def acached_chat_completion(client, cache: Optional[LLMResponseCache] = None, **request) -> str:
+    """
+    Ejecuta await client.chat.completions.create(**request) pasando por la caché
+
+    Las operaciones sobre SQLite se ejecutan en un hilo para no bloquear el event loop.
+
+    Args:
+        client: Cliente AsyncOpenAI
+        cache: Caché a usar; por defecto la caché global del proceso
+        **request: Parámetros de la llamada (model, messages, temperature, ...)
+
+    Returns:
+        Contenido del primer mensaje de la respuesta
+    """
+    if cache is None:
+        cache = get_llm_cache()
+
+    key = None
+    if cache is not None:
+        params = {k: v for k, v in request.items() if k not in ('model', 'messages')}
+        key = make_cache_key(request.get('model', ''), request.get('messages', []), **params)
+        try:
+            cached = await asyncio.to_thread(cache.get, key)
+        except sqlite3.Error as e:
+            # Caché bloqueada o dañada: se trata como miss y se consulta a la API
+            logger.warning(f"⚠️ No se pudo leer la caché LLM: {e}")
+            cached = None
+        if cached is not None:
+            logger.debug(f"💾 Caché LLM: hit {key[:12]}")
+            return cached
+
+    response = await client.chat.completions.create(**request)
+    response_text = response.choices[0].message.content
+
+    if key is not None and _is_cacheable(response_text, request):
+        try:
+            await asyncio.to_thread(cache.put, key, response_text, request.get('model', ''))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ No se pudo guardar en caché LLM: {e}")
+    return response_text
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_initialized = False
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Caché global del proceso, configurada por variables de entorno:
+
+    - LLM_CACHE_ENABLED: "0"/"false" desactiva la caché
+    - LLM_CACHE_PATH: ruta del archivo SQLite
+    - LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES
+
+    Returns:
+        La caché, o None si está desactivada o no se pudo abrir
+    """
+    global _llm_cache, _llm_cache_initialized
+    if not _llm_cache_initialized:
+        with _llm_cache_lock:
+            if not _llm_cache_initialized:
+                _llm_cache = _create_cache_from_env()
+                _llm_cache_initialized = True
+    return _llm_cache
+
+
+def _create_cache_from_env() -> Optional[LLMResponseCache]:
+    if os.getenv('LLM_CACHE_ENABLED', '1').strip().lower() in ('0', 'false', 'no', 'off'):
+        logger.info("💾 Caché LLM desactivada por configuración")
+        return None
+    try:
+        cache = LLMResponseCache(
+            path=os.getenv('LLM_CACHE_PATH') or None,
+            ttl_seconds=float(os.getenv('LLM_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)),
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(os.getenv('LLM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+        )
+        logger.info(f"💾 Caché LLM en {cache.path}")
+        return cache
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.warning(f"⚠️ Caché LLM no disponible, se consulta siempre a la API: {e}")
+        return None
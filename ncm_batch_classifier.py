@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+📦 NCM Batch Classifier - Clasificación NCM de catálogos completos
+==================================================================
+
+Clasifica catálogos de proveedores (cientos de SKUs) con el clasificador
+profundo, procesando varios productos a la vez y escribiendo cada resultado
+apenas está listo.
+
+Funcionalidades:
+- Entrada JSONL o CSV (columnas description/descripcion, id/sku, image_url)
+- Salida JSONL en streaming (una línea por producto, en orden de finalización)
+- Concurrencia acotada y deduplicación de descripciones idénticas
+- Reanudación tras una caída: el archivo de salida es el checkpoint
+- CLI para uso directo
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import sys
+import csv
+import json
+import time
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Union
+
+from ai_ncm_deep_classifier import DeepNCMClassifier
+from async_clients import aclose_async_clients
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_FIELDS = ('description', 'descripcion', 'product_description')
+ID_FIELDS = ('id', 'sku', 'product_id')
+IMAGE_FIELDS = ('image_url', 'imagen', 'image')
+
+
+def _first_field(row: Dict[str, Any], fields) -> Any:
+    for field in fields:
+        value = row.get(field)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def read_products(input_path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """
+    Lee productos de un JSONL o CSV sin cargar el archivo completo
+
+    Los productos sin id reciben el número de línea/fila (desde 1), estable
+    mientras no cambie el archivo de entrada.
+    """
+    input_path = Path(input_path)
+    with open(input_path, 'r', encoding='utf-8-sig', newline='') as f:
+        if input_path.suffix.lower() == '.csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows, 1):
+            if isinstance(row, str):
+                row = {'description': row}
+            product_id = _first_field(row, ID_FIELDS)
+            yield {
+                'id': str(product_id if product_id is not None else number),
+                'description': _first_field(row, DESCRIPTION_FIELDS) or '',
+                'image_url': _first_field(row, IMAGE_FIELDS),
+            }
+
+
+def load_checkpoint(output_path: Union[str, Path]) -> Set[str]:
+    """
+    Ids ya clasificados con éxito según el JSONL de salida
+
+    Si la última línea quedó incompleta por una caída, se descarta del archivo.
+    Los productos cuyo último resultado fue un error se vuelven a procesar.
+    """
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return set()
+
+    with open(output_path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+            data = data[:data.rfind(b'\n') + 1]
+
+    status: Dict[str, bool] = {}
+    for line in data.decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        status[str(record.get('id'))] = 'error' not in (record.get('result') or {})
+    return {product_id for product_id, ok in status.items() if ok}
+
+
+async def classify_file(input_path: Union[str, Path], output_path: Union[str, Path],
+                        classifier: Optional[DeepNCMClassifier] = None,
+                        concurrency: Optional[int] = None,
+                        resume: bool = True) -> Dict[str, Any]:
+    """
+    Clasifica todos los productos de input_path y agrega los resultados a output_path
+
+    Args:
+        input_path: JSONL o CSV de productos
+        output_path: JSONL de resultados (también funciona como checkpoint)
+        classifier: Clasificador a usar; por defecto uno nuevo con la API key del entorno
+        concurrency: Productos en proceso a la vez (ver DeepNCMClassifier.classify_many)
+        resume: Si True, saltea los productos ya clasificados en output_path
+
+    Returns:
+        Estadísticas del lote
+    """
+    output_path = Path(output_path)
+    done_ids = load_checkpoint(output_path) if resume else set()
+    if classifier is None:
+        classifier = DeepNCMClassifier(debug_callback=_quiet_debug_log)
+
+    stats = {'total': 0, 'skipped': 0, 'classified': 0, 'deduplicated': 0, 'errors': 0}
+
+    def pending_products():
+        for product in read_products(input_path):
+            stats['total'] += 1
+            if product['id'] in done_ids:
+                stats['skipped'] += 1
+                continue
+            yield product
+
+    start = time.perf_counter()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'a' if resume else 'w', encoding='utf-8') as out:
+        async for item in classifier.classify_many(pending_products(), concurrency=concurrency):
+            out.write(json.dumps(item, ensure_ascii=False, default=str) + '\n')
+            out.flush()
+            stats['classified'] += 1
+            stats['deduplicated'] += item['deduplicated']
+            if 'error' in item['result']:
+                stats['errors'] += 1
+            final = item['result'].get('final_classification') or {}
+            logger.info(f"✅ [{stats['classified']}] {item['id']}: {final.get('ncm_completo', 'sin clasificación')}")
+
+    stats['elapsed_seconds'] = round(time.perf_counter() - start, 2)
+    return stats
+
+
+def _quiet_debug_log(message, data=None, level="INFO"):
+    """En lote, el detalle paso a paso de cada producto va a nivel DEBUG"""
+    if level == "ERROR":
+        logger.warning(message)
+    else:
+        logger.debug(message)
+
+
+async def main() -> int:
+    """Función principal CLI"""
+    parser = argparse.ArgumentParser(
+        description="NCM Batch Classifier - Clasificación NCM de catálogos",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos de uso:
+  python ncm_batch_classifier.py catalogo.jsonl
+  python ncm_batch_classifier.py catalogo.csv --output clasificados.jsonl --concurrency 16
+  python ncm_batch_classifier.py catalogo.csv --no-resume
+        """
+    )
+    parser.add_argument('input', type=str, help='Archivo JSONL o CSV con productos')
+    parser.add_argument('--output', '-o', type=str, help='JSONL de resultados (default: <input>_ncm.jsonl)')
+    parser.add_argument('--concurrency', '-c', type=int, default=None, help='Productos en proceso a la vez')
+    parser.add_argument('--no-resume', action='store_true', help='Reprocesar todo, sobrescribiendo la salida')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Logging detallado')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"❌ Error: Archivo de entrada no encontrado: {input_path}")
+        return 1
+    output_path = Path(args.output) if args.output else input_path.with_name(f"{input_path.stem}_ncm.jsonl")
+
+    try:
+        stats = await classify_file(input_path, output_path, concurrency=args.concurrency,
+                                    resume=not args.no_resume)
+    finally:
+        await aclose_async_clients()
+
+    print(f"\n📊 RESUMEN DEL LOTE")
+    print(f"{'='*50}")
+    print(f"📋 Productos en entrada: {stats['total']:,}")
+    print(f"⏭️ Ya clasificados (checkpoint): {stats['skipped']:,}")
+    print(f"✅ Clasificados ahora: {stats['classified']:,} ({stats['deduplicated']:,} duplicados)")
+    print(f"❌ Con error: {stats['errors']:,}")
+    print(f"⏱️ Tiempo: {stats['elapsed_seconds']:.1f}s")
+    print(f"💾 Resultados en: {output_path}")
+    return 0 if stats['errors'] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+⚡ NCM Batch Matcher - Motor de lotes para el validador de posiciones NCM
+=========================================================================
+
+Procesa archivos grandes de consultas (códigos o descripciones) contra la base
+oficial NCM con los mismos resultados que NCMPositionMatcher.match_position.
+
+Funcionalidades:
+- Coincidencias exactas resueltas en una sola pasada vectorizada
+- Consultas aproximadas repartidas en un pool de procesos (el scoring es CPU)
+- Selección IA concurrente en el proceso principal (si está habilitada)
+- Resultados en JSONL a medida que se completan, con progreso y throughput
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from ncm_position_matcher import NCMDataLoader, NCMPositionMatcher, NCMSearchEngine
+
+logger = logging.getLogger(__name__)
+
+# Consultas aproximadas por tarea enviada al pool (balance entre overhead y reparto)
+DEFAULT_CHUNK_SIZE = 64
+QUERY_FIELDS = ('query', 'input', 'description', 'code')
+
+# Motor de búsqueda de cada proceso del pool (se carga una vez por proceso)
+_worker_engine: Optional[NCMSearchEngine] = None
+
+
+def _init_worker(data_file: str) -> None:
+    global _worker_engine
+    logging.getLogger('ncm_position_matcher').setLevel(logging.WARNING)
+    _worker_engine = NCMSearchEngine(NCMDataLoader(data_file))
+
+
+def _approximate_chunk(items: List[Tuple[int, str]],
+                       engine: Optional[NCMSearchEngine] = None) -> List[Tuple[int, str, list, float, Optional[str]]]:
+    """Búsqueda aproximada de un bloque de consultas: (índice, consulta, candidatos, ms, error)"""
+    engine = engine or _worker_engine
+    results = []
+    for index, query in items:
+        start = time.perf_counter()
+        try:
+            candidates, error = engine.approximate_search(query), None
+        except Exception as e:
+            candidates, error = [], str(e)
+        results.append((index, query, candidates, (time.perf_counter() - start) * 1000, error))
+    return results
+
+
+def load_batch_queries(batch_path: Union[str, Path]) -> List[str]:
+    """
+    Lee consultas de un lote
+
+    Formatos: .json (lista, formato histórico del CLI), .jsonl (una consulta o
+    un objeto con 'query'/'input'/'description'/'code' por línea) o texto plano
+    (una consulta por línea).
+    """
+    batch_path = Path(batch_path)
+
+    def as_query(item: Any) -> str:
+        if isinstance(item, dict):
+            return str(next((item[f] for f in QUERY_FIELDS if item.get(f) not in (None, '')), ''))
+        return str(item)
+
+    with open(batch_path, 'r', encoding='utf-8-sig') as f:
+        if batch_path.suffix.lower() == '.json':
+            data = json.load(f)
+            if not isinstance(data, list):
+                raise ValueError("El archivo de lotes debe contener una lista de consultas")
+            return [as_query(item) for item in data]
+        if batch_path.suffix.lower() == '.jsonl':
+            return [as_query(json.loads(line)) for line in f if line.strip()]
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+class NCMBatchMatcher:
+    """Procesa lotes de consultas con el validador de posiciones NCM"""
+
+    def __init__(self, data_file: str, ai_api_key: str = None, workers: Optional[int] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, matcher: Optional[NCMPositionMatcher] = None):
+        """
+        Args:
+            data_file: Dataset NCM (CSV o JSON consolidado)
+            ai_api_key: API key de OpenAI para la selección IA (None = selección por puntaje)
+            workers: Procesos para la búsqueda aproximada (default: CPUs disponibles;
+                1 = en el proceso principal)
+            chunk_size: Consultas aproximadas por tarea del pool
+            matcher: Matcher ya cargado con data_file para reutilizar en el proceso principal
+        """
+        self.data_file = str(data_file)
+        self.matcher = matcher or NCMPositionMatcher(self.data_file, ai_api_key)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+
+    async def iter_matches(self, queries: List[str]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Resultados (índice, resultado) a medida que se completan
+
+        Cada resultado es igual al de match_position para esa consulta.
+        """
+        start_time = datetime.now()
+        pending: List[Tuple[int, str]] = []
+        exact_indices = [i for i, q in enumerate(queries) if q and q.strip()]
+
+        for index, query in enumerate(queries):
+            if not query or not query.strip():
+                yield index, {
+                    "input": query,
+                    "match_type": "error",
+                    "error": "Consulta vacía",
+                    "processing_time_ms": 0
+                }
+
+        # Paso 1: búsqueda exacta de todas las consultas en una pasada
+        exact_results = self.matcher.search_engine.exact_search_many([queries[i] for i in exact_indices])
+        exact_ms = (datetime.now() - start_time).total_seconds() * 1000 / max(len(exact_indices), 1)
+        for index, result in zip(exact_indices, exact_results):
+            if result is None:
+                pending.append((index, queries[index]))
+                continue
+            result["processing_time_ms"] = round(exact_ms, 2)
+            yield index, result
+
+        if not pending:
+            return
+        logger.info(f"⚡ {len(exact_indices) - len(pending):,} coincidencias exactas; "
+                    f"{len(pending):,} consultas a búsqueda aproximada")
+
+        # Paso 2: búsqueda aproximada en bloques (pool de procesos si hay más de un worker)
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        if self.workers <= 1 or len(chunks) == 1:
+            for chunk in chunks:
+                for item in await self._select_chunk(_approximate_chunk(chunk, self.matcher.search_engine)):
+                    yield item
+            return
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks)),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(self.data_file,)) as pool:
+            futures = [loop.run_in_executor(pool, _approximate_chunk, chunk) for chunk in chunks]
+            for future in asyncio.as_completed(futures):
+                for item in await self._select_chunk(await future):
+                    yield item
+
+    async def _select_chunk(self, chunk_results: list) -> List[Tuple[int, Dict[str, Any]]]:
+        """Paso 3: selección (IA concurrente o por puntaje) de cada consulta del bloque"""
+        async def select(index, query, candidates, search_ms, error):
+            start_time = datetime.now() - timedelta(milliseconds=search_ms)
+            if error is not None:
+                return index, {
+                    "input": query,
+                    "match_type": "error",
+                    "error": error,
+                    "processing_time_ms": round(search_ms, 2),
+                    "metadata": {"classification_method": "error"}
+                }
+            try:
+                return index, await self.matcher.select_from_candidates(query, candidates, start_time)
+            except Exception as e:
+                return index, {
+                    "input": query,
+                    "match_type": "error",
+                    "error": str(e),
+                    "processing_time_ms": round(search_ms, 2),
+                    "metadata": {"classification_method": "error"}
+                }
+
+        return await asyncio.gather(*(select(*item) for item in chunk_results))
+
+    async def run(self, queries: List[str], output_path: Union[str, Path],
+                  progress_every: int = 1000) -> Dict[str, Any]:
+        """
+        Procesa el lote y escribe cada resultado como una línea JSONL apenas está listo
+
+        Cada línea incluye 'batch_index' (posición de la consulta en la entrada),
+        ya que el orden de salida es el de finalización.
+
+        Returns:
+            Estadísticas del lote (conteos por tipo de resultado y throughput)
+        """
+        stats = {'total': len(queries), 'exacto': 0, 'aproximado': 0, 'sin_resultados': 0, 'error': 0}
+        matcher_logger = logging.getLogger(type(self.matcher).__module__)
+        previous_level = matcher_logger.level
+        matcher_logger.setLevel(logging.WARNING)  # El detalle por consulta no escala a miles
+
+        start = time.perf_counter()
+        done = 0
+        try:
+            with open(output_path, 'w', encoding='utf-8') as out:
+                async for index, result in self.iter_matches(queries):
+                    out.write(json.dumps({"batch_index": index, **result}, ensure_ascii=False, default=str) + '\n')
+                    done += 1
+                    match_type = result.get('match_type')
+                    stats[match_type if match_type in stats else 'error'] += 1
+                    if progress_every and done % progress_every == 0:
+                        elapsed = time.perf_counter() - start
+                        logger.info(f"📈 {done:,}/{len(queries):,} consultas ({done / elapsed:,.0f}/s)")
+        finally:
+            matcher_logger.setLevel(previous_level)
+
+        elapsed = time.perf_counter() - start
+        stats['elapsed_seconds'] = round(elapsed, 2)
+        stats['queries_per_second'] = round(len(queries) / elapsed, 1) if elapsed > 0 else None
+        return stats
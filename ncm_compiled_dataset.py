@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+🗜️ NCM Compiled Dataset - Formato binario columnar para la base NCM
+====================================================================
+
+Compila el dataset consolidado `dataset_ncm_HYBRID_FIXED_*.json` a un archivo
+binario columnar (`.ncmb`) que se abre con mmap, sin parsear JSON ni crear
+49k diccionarios por proceso.
+
+Formato del archivo:
+- Cabecera: MAGIC (8 bytes) + longitud (uint32) + JSON con el esquema
+- Columnas numéricas de ancho fijo (aec, die, te, de, re, chapter, hierarchy_level)
+- Columnas de texto como índices uint32 a una tabla de strings internados
+- Tabla de strings: offsets uint32 + bytes UTF-8 concatenados
+
+Uso:
+    python ncm_compiled_dataset.py build [ruta_dataset.json]
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import logging
+import argparse
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterator, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NCMBIN01'
+FORMAT_VERSION = 1
+COMPILED_SUFFIX = '.ncmb'
+
+# Índice reservado para valores None en columnas de texto
+NULL_STRING = 0xFFFFFFFF
+
+# Columnas numéricas de ancho fijo (float64 conserva exactamente los valores del JSON)
+NUMERIC_COLUMNS = {
+    'chapter': '<u1',
+    'aec': '<f8',
+    'die': '<f8',
+    'te': '<f8',
+    'de': '<f8',
+    're': '<f8',
+    'hierarchy_level': '<u1',
+}
+
+STRING_COLUMNS = [
+    'file', 'code', 'sim', 'description', 'in',
+    'code_searchable', 'parent', 'parent_searchable', 'record_type'
+]
+
+# Orden de campos idéntico al de los registros del JSON consolidado
+FIELD_ORDER = [
+    'file', 'chapter', 'code', 'sim', 'description', 'aec', 'die', 'te', 'in',
+    'de', 're', 'code_searchable', 'parent', 'parent_searchable',
+    'hierarchy_level', 'record_type'
+]
+
+_HEADER_PREFIX = struct.Struct('<8sI')
+_ALIGNMENT = 8
+
+
+def compiled_path_for(json_path: Union[str, Path]) -> Path:
+    """Ruta del artefacto compilado correspondiente a un dataset JSON"""
+    return Path(json_path).with_suffix(COMPILED_SUFFIX)
+
+
+def _source_fingerprint(json_path: Path) -> Dict[str, Any]:
+    """Huella del JSON fuente usada para detectar artefactos desactualizados"""
+    stat = json_path.stat()
+    return {
+        'name': json_path.name,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def compile_ncm_dataset(json_path: Union[str, Path],
+                        output_path: Optional[Union[str, Path]] = None,
+                        data: Optional[Dict[str, Any]] = None) -> Path:
+    """
+    Compila el dataset JSON consolidado al formato binario columnar
+
+    Args:
+        json_path: Ruta al dataset consolidado JSON
+        output_path: Ruta de salida. Si None, usa la misma ruta con extensión .ncmb
+        data: Contenido ya parseado del JSON (evita leerlo de nuevo)
+
+    Returns:
+        Path: Ruta del archivo compilado
+    """
+    json_path = Path(json_path)
+    output_path = Path(output_path) if output_path else compiled_path_for(json_path)
+
+    if data is None:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+    records = data.get('records', [])
+    n_records = len(records)
+
+    # Tabla de strings internados
+    string_ids: Dict[str, int] = {}
+    string_values: List[str] = []
+
+    def intern(value: Any) -> int:
+        if value is None:
+            return NULL_STRING
+        value = str(value)
+        idx = string_ids.get(value)
+        if idx is None:
+            idx = len(string_values)
+            string_ids[value] = idx
+            string_values.append(value)
+        return idx
+
+    numeric_arrays = {
+        name: np.array([record.get(name) or 0 for record in records], dtype=dtype)
+        for name, dtype in NUMERIC_COLUMNS.items()
+    }
+    string_arrays = {
+        name: np.array([intern(record.get(name, '')) for record in records], dtype='<u4')
+        for name in STRING_COLUMNS
+    }
+
+    encoded = [value.encode('utf-8') for value in string_values]
+    string_offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(b) for b in encoded], out=string_offsets[1:])
+    string_blob = b''.join(encoded)
+
+    # Bloques a escribir, en orden
+    blocks = [(name, arr.tobytes()) for name, arr in numeric_arrays.items()]
+    blocks += [(name, arr.tobytes()) for name, arr in string_arrays.items()]
+    blocks.append(('__string_offsets__', string_offsets.tobytes()))
+    blocks.append(('__string_data__', string_blob))
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'n_records': n_records,
+        'n_strings': len(string_values),
+        'source': _source_fingerprint(json_path),
+        'metadata': data.get('metadata', {}),
+        'columns': {},
+    }
+
+    # La cabecera incluye los offsets de los bloques, que dependen de su propio
+    # tamaño: se calcula dos veces hasta que el tamaño se estabiliza
+    header_size = 0
+    while True:
+        offset = _align(_HEADER_PREFIX.size + header_size)
+        columns = {}
+        for name, payload in blocks:
+            dtype = NUMERIC_COLUMNS.get(name, '<u4' if name != '__string_data__' else '|u1')
+            columns[name] = {'dtype': dtype, 'offset': offset, 'nbytes': len(payload)}
+            offset = _align(offset + len(payload))
+        header['columns'] = columns
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        if len(header_bytes) == header_size:
+            break
+        header_size = len(header_bytes)
+
+    # Escritura atómica: varios workers pueden compilar a la vez
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER_PREFIX.pack(MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            for name, payload in blocks:
+                f.seek(columns[name]['offset'])
+                f.write(payload)
+            f.truncate(offset)
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    logger.info(f"Dataset NCM compilado: {output_path} ({n_records:,} registros, "
+                f"{len(string_values):,} strings únicos)")
+    return output_path
+
+
+class NCMRecordView(Mapping):
+    """Vista de solo lectura de un registro del dataset compilado (sin copiar columnas)"""
+
+    __slots__ = ('_dataset', '_row')
+
+    def __init__(self, dataset: 'CompiledNCMDataset', row: int):
+        self._dataset = dataset
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        return self._dataset.value(self._row, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELD_ORDER)
+
+    def __len__(self) -> int:
+        return len(FIELD_ORDER)
+
+    @property
+    def row(self) -> int:
+        """Posición del registro dentro del dataset"""
+        return self._row
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Materializa el registro como diccionario"""
+        return {key: self[key] for key in FIELD_ORDER}
+
+    def __repr__(self) -> str:
+        return f"NCMRecordView({self.to_dict()!r})"
+
+
+class CompiledNCMDataset(Sequence):
+    """Dataset NCM compilado, mapeado en memoria y accesible como secuencia de registros"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        magic, header_len = _HEADER_PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Archivo NCM compilado inválido: {self.path}")
+
+        start = _HEADER_PREFIX.size
+        self.header = json.loads(self._mm[start:start + header_len].decode('utf-8'))
+        if self.header.get('format_version') != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Versión de formato no soportada: {self.header.get('format_version')}")
+
+        self._n_records = int(self.header['n_records'])
+        self._columns = {
+            name: self._column_array(name)
+            for name in list(NUMERIC_COLUMNS) + STRING_COLUMNS
+        }
+        self._string_offsets = self._column_array('__string_offsets__')
+        self._string_data_offset = self.header['columns']['__string_data__']['offset']
+        self._decoded_strings: Optional[List[str]] = None
+
+    def _column_array(self, name: str) -> np.ndarray:
+        spec = self.header['columns'][name]
+        dtype = np.dtype(spec['dtype'])
+        count = spec['nbytes'] // dtype.itemsize
+        return np.frombuffer(self._mm, dtype=dtype, count=count, offset=spec['offset'])
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.header.get('metadata', {})
+
+    @property
+    def source(self) -> Dict[str, Any]:
+        return self.header.get('source', {})
+
+    def string(self, idx: int) -> Optional[str]:
+        """Decodifica un string de la tabla internada"""
+        if idx == NULL_STRING:
+            return None
+        if self._decoded_strings is not None:
+            return self._decoded_strings[idx]
+        start = self._string_data_offset + int(self._string_offsets[idx])
+        end = self._string_data_offset + int(self._string_offsets[idx + 1])
+        return self._mm[start:end].decode('utf-8')
+
+    def value(self, row: int, key: str) -> Any:
+        """Valor de un campo para un registro"""
+        column = self._columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        if key in NUMERIC_COLUMNS:
+            value = column[row]
+            return float(value) if column.dtype.kind == 'f' else int(value)
+        return self.string(int(column[row]))
+
+    def column(self, name: str) -> Union[np.ndarray, List[Optional[str]]]:
+        """
+        Columna completa: array numpy (vista sobre el mmap) para campos numéricos,
+        lista de strings para campos de texto
+        """
+        if name in NUMERIC_COLUMNS:
+            return self._columns[name]
+        if name not in self._columns:
+            raise KeyError(name)
+        if self._decoded_strings is None:
+            self._decoded_strings = [self.string(i) for i in range(int(self.header['n_strings']))]
+        strings = self._decoded_strings
+        return [None if idx == NULL_STRING else strings[idx] for idx in self._columns[name].tolist()]
+
+    def __len__(self) -> int:
+        return self._n_records
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [NCMRecordView(self, i) for i in range(*index.indices(self._n_records))]
+        if index < 0:
+            index += self._n_records
+        if not 0 <= index < self._n_records:
+            raise IndexError(index)
+        return NCMRecordView(self, index)
+
+    def __iter__(self) -> Iterator[NCMRecordView]:
+        for i in range(self._n_records):
+            yield NCMRecordView(self, i)
+
+    def close(self) -> None:
+        # Las vistas numpy mantienen referencias al buffer; se liberan primero
+        self._columns = {}
+        self._string_offsets = None
+        try:
+            self._mm.close()
+        except (BufferError, ValueError):
+            pass
+        self._file.close()
+
+
+def is_compiled_dataset_fresh(json_path: Union[str, Path],
+                              compiled_path: Optional[Union[str, Path]] = None) -> bool:
+    """Verifica que el artefacto compilado exista y corresponda al JSON fuente actual"""
+    json_path = Path(json_path)
+    compiled_path = Path(compiled_path) if compiled_path else compiled_path_for(json_path)
+    if not compiled_path.exists():
+        return False
+    if not json_path.exists():
+        # Sin JSON fuente, el artefacto compilado es la única referencia disponible
+        return True
+
+    try:
+        with open(compiled_path, 'rb') as f:
+            magic, header_len = _HEADER_PREFIX.unpack(f.read(_HEADER_PREFIX.size))
+            if magic != MAGIC:
+                return False
+            header = json.loads(f.read(header_len).decode('utf-8'))
+    except (OSError, ValueError, struct.error):
+        return False
+
+    source = header.get('source', {})
+    current = _source_fingerprint(json_path)
+    return (header.get('format_version') == FORMAT_VERSION
+            and source.get('size') == current['size']
+            and source.get('mtime_ns') == current['mtime_ns'])
+
+
+def load_compiled_dataset(json_path: Union[str, Path]) -> Optional[CompiledNCMDataset]:
+    """Abre el dataset compilado si existe y está actualizado; None en caso contrario"""
+    compiled_path = compiled_path_for(json_path)
+    if not is_compiled_dataset_fresh(json_path, compiled_path):
+        return None
+    try:
+        return CompiledNCMDataset(compiled_path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"No se pudo abrir dataset compilado {compiled_path}: {e}")
+        return None
+
+
+def main() -> int:
+    """CLI para compilar el dataset NCM"""
+    parser = argparse.ArgumentParser(description="Compilador del dataset NCM a formato binario columnar")
+    subparsers = parser.add_subparsers(dest='command')
+
+    build_parser = subparsers.add_parser('build', help='Compilar dataset JSON consolidado')
+    build_parser.add_argument('dataset', nargs='?', default=None,
+                              help='Dataset JSON (usa el más reciente si no se especifica)')
+    build_parser.add_argument('--output', '-o', default=None, help='Ruta del archivo .ncmb')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    if args.command != 'build':
+        parser.print_help()
+        return 1
+
+    dataset = args.dataset
+    if not dataset:
+        results_dir = Path("pdf_reader/ncm/resultados_ncm_hybrid")
+        dataset_files = list(results_dir.glob("dataset_ncm_HYBRID_FIXED_*.json"))
+        if not dataset_files:
+            print(f"❌ No se encontraron datasets en {results_dir}")
+            return 1
+        dataset = max(dataset_files, key=lambda f: f.stat().st_mtime)
+
+    output = compile_ncm_dataset(dataset, args.output)
+    print(f"✅ Dataset compilado: {output} ({output.stat().st_size / 1024 / 1024:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
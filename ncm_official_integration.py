@@ -24,15 +24,119 @@ import json
 import re
 import logging
 import sys
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
 from typing import Dict, List, Optional, Union, Any, Tuple
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
 
+from ncm_compiled_dataset import compile_ncm_dataset, load_compiled_dataset
+from async_clients import async_chat_completion, get_async_openai_client
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+
+class NCMCodeIndex:
+    """
+    Índice jerárquico sobre `code_searchable` construido una sola vez al cargar.
+
+    Mantiene un array ordenado de códigos (con su posición original en el dataset)
+    para resolver consultas por prefijo con bisect en O(log n + k), un índice
+    por capítulo y tablas hash para búsquedas exactas por código, por código+SIM
+    y para los hijos terminales de cada código. Los resultados se devuelven
+    siempre en el orden original del dataset para conservar la semántica de los
+    recorridos lineales previos.
+    """
+
+    def __init__(self, records):
+        if hasattr(records, 'column'):
+            # Dataset compilado: leer columnas sin materializar registros
+            codes = records.column('code_searchable')
+            chapters = records.column('chapter').tolist()
+            sims = records.column('sim')
+            record_types = records.column('record_type')
+        else:
+            codes = [r.get('code_searchable', '') or '' for r in records]
+            chapters = [r.get('chapter') for r in records]
+            sims = [r.get('sim', '') for r in records]
+            record_types = [r.get('record_type', '') for r in records]
+
+        # sorted() es estable: a igual código se preserva el orden del dataset
+        self._order: List[int] = sorted(range(len(codes)), key=codes.__getitem__)
+        self._sorted_codes: List[str] = [codes[i] for i in self._order]
+
+        self._chapters: Dict[Any, List[int]] = {}
+        for position, chapter in enumerate(chapters):
+            self._chapters.setdefault(chapter, []).append(position)
+
+        # Hash exacto: primera aparición de cada código y de cada par (código, SIM)
+        self._first_by_code: Dict[str, int] = {}
+        self._by_code_sim: Dict[Tuple[str, str], int] = {}
+        # Hijos terminales con SIM de cada código, ya ordenados por SIM
+        self._terminal_children: Dict[str, List[int]] = {}
+        for position, (code, sim, record_type) in enumerate(zip(codes, sims, record_types)):
+            sim = sim or ''
+            self._first_by_code.setdefault(code, position)
+            self._by_code_sim.setdefault((code, sim.strip()), position)
+            if record_type == 'terminal' and sim.strip():
+                self._terminal_children.setdefault(code, []).append(position)
+        for children in self._terminal_children.values():
+            children.sort(key=lambda position: sims[position])
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Rango [lo, hi) del array ordenado cuyos códigos empiezan con `prefix`"""
+        lo = bisect_left(self._sorted_codes, prefix)
+        hi = bisect_left(self._sorted_codes, prefix + '\U0010ffff', lo)
+        return lo, hi
+
+    def count_prefix(self, prefix: str) -> int:
+        """Cantidad de registros cuyo código empieza con `prefix`"""
+        lo, hi = self.prefix_range(prefix)
+        return hi - lo
+
+    def positions_with_prefix(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        """Posiciones (en orden del dataset) de los registros con el prefijo dado"""
+        lo, hi = self.prefix_range(prefix)
+        return self._first_in_dataset_order(lo, hi, limit)
+
+    def positions_for_code(self, code: str) -> List[int]:
+        """Posiciones (en orden del dataset) de los registros con código exacto"""
+        lo = bisect_left(self._sorted_codes, code)
+        hi = bisect_right(self._sorted_codes, code, lo)
+        return self._order[lo:hi]
+
+    def first_position(self, code: str) -> Optional[int]:
+        """Posición del primer registro con código exacto, o None"""
+        return self._first_by_code.get(code)
+
+    def position_for_code_sim(self, code: str, sim: str) -> Optional[int]:
+        """Posición del registro con código y SIM exactos, o None"""
+        return self._by_code_sim.get((code, (sim or '').strip()))
+
+    def terminal_children(self, code: str) -> List[int]:
+        """Posiciones de los registros terminales con SIM del código, ordenadas por SIM"""
+        return self._terminal_children.get(code, [])
+
+    def chapter_positions(self, chapter: int) -> List[int]:
+        """Posiciones de los registros de un capítulo"""
+        return self._chapters.get(chapter, [])
+
+    def _first_in_dataset_order(self, lo: int, hi: int, limit: Optional[int]) -> List[int]:
+        if limit is not None and limit <= 0:
+            return []
+        positions = self._order[lo:hi]
+        if limit is not None and limit < len(positions):
+            return heapq.nsmallest(limit, positions)
+        return sorted(positions)
+
+
 class NCMOfficialIntegration:
     """Integración con la base de datos oficial NCM procesada localmente"""
     
@@ -45,6 +149,7 @@ class NCMOfficialIntegration:
         """
         self.dataset_path = self._find_latest_dataset(dataset_path)
         self.ncm_data = None
+        self.code_index: Optional[NCMCodeIndex] = None
         self.load_dataset()
         
     def _find_latest_dataset(self, custom_path: Optional[str] = None) -> Optional[Path]:
@@ -94,37 +199,29 @@ class NCMOfficialIntegration:
             
             # Importar y ejecutar el extractor
             try:
-                # Añadir el directorio al path para importar el módulo
+                # Añadir el directorio (absoluto) al path: los workers del pool (spawn)
+                # heredan sys.path e importan el extractor por su nombre de módulo
                 ncm_extractor_path = Path("pdf_reader/ncm")
-                if str(ncm_extractor_path) not in sys.path:
-                    sys.path.insert(0, str(ncm_extractor_path))
+                ncm_extractor_import_path = str(ncm_extractor_path.resolve())
+                if ncm_extractor_import_path not in sys.path:
+                    sys.path.insert(0, ncm_extractor_import_path)
                 
-                # Importar dinámicamente el extractor
-                import importlib.util
-                spec = importlib.util.spec_from_file_location(
-                    "ncm_extractor_hybrid_fix", 
-                    ncm_extractor_path / "ncm_extractor_hybrid_fix.py"
-                )
-                ncm_module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(ncm_module)
-                NCMExtractorHybridFix = ncm_module.NCMExtractorHybridFix
+                from ncm_extractor_hybrid_fix import NCMExtractorHybridFix
                 
                 logger.info("🏭 Ejecutando extractor NCM híbrido...")
-                extractor = NCMExtractorHybridFix()
+                extractor = NCMExtractorHybridFix(
+                    pdf_dir=ncm_pdf_dir,
+                    results_dir=ncm_extractor_path / "resultados_ncm_hybrid",
+                    workers=os.cpu_count() or 1
+                )
                 
-                # Procesar todos los capítulos (esto puede tomar tiempo)
-                all_results = extractor.process_all_chapters(start_chapter=1, end_chapter=97)
+                # Solo se extraen los capítulos cuyo PDF cambió desde la última
+                # extracción (manifiesto de hashes); el resto se reutiliza
+                json_file, csv_file = extractor.build_dataset(start_chapter=1, end_chapter=97)
                 
-                if all_results:
-                    # Crear dataset consolidado
-                    json_file, csv_file = extractor.create_consolidated_dataset(all_results)
-                    
-                    if json_file:
-                        logger.info(f"✅ Dataset generado exitosamente: {json_file}")
-                        return Path(json_file)
-                    else:
-                        logger.error("Error al crear dataset consolidado")
-                        return None
+                if json_file:
+                    logger.info(f"✅ Dataset generado exitosamente: {json_file}")
+                    return Path(json_file)
                 else:
                     logger.error("No se pudieron extraer datos de los PDFs")
                     return None
@@ -141,19 +238,47 @@ class NCMOfficialIntegration:
             return None
         
     def load_dataset(self) -> bool:
-        """Carga el dataset de NCM en memoria"""
-        if not self.dataset_path or not self.dataset_path.exists():
+        """
+        Carga el dataset de NCM.
+
+        Usa el artefacto binario compilado (.ncmb, mapeado en memoria) cuando existe
+        y está actualizado; si no, parsea el JSON y deja compilado el binario para
+        los próximos procesos.
+        """
+        if not self.dataset_path:
             logger.error(f"Dataset no encontrado: {self.dataset_path}")
             return False
-            
+
+        compiled = load_compiled_dataset(self.dataset_path)
+        if compiled is not None:
+            self.ncm_data = compiled
+            self._build_indexes()
+            metadata = compiled.metadata
+            logger.info(f"Dataset compilado cargado (mmap): {compiled.path}")
+            logger.info(f"  - Total registros: {len(self.ncm_data):,}")
+            logger.info(f"  - Versión: {metadata.get('version', 'N/A')}")
+            logger.info(f"  - Capítulos: {metadata.get('total_chapters', 'N/A')}")
+            return True
+
+        if not self.dataset_path.exists():
+            logger.error(f"Dataset no encontrado: {self.dataset_path}")
+            return False
+
         try:
             with open(self.dataset_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                
+
             # Extraer registros
             self.ncm_data = data.get('records', [])
             metadata = data.get('metadata', {})
-            
+            self._build_indexes()
+
+            # Compilar binario para próximas cargas (no crítico si falla)
+            try:
+                compile_ncm_dataset(self.dataset_path, data=data)
+            except Exception as e:
+                logger.debug(f"No se pudo compilar dataset NCM binario: {e}")
+
             logger.info(f"Dataset cargado exitosamente:")
             logger.info(f"  - Total registros: {len(self.ncm_data):,}")
             logger.info(f"  - Versión: {metadata.get('version', 'N/A')}")
@@ -165,25 +290,37 @@ class NCMOfficialIntegration:
             logger.error(f"Error cargando dataset: {e}")
             return False
             
+    def _build_indexes(self):
+        """Construye los índices de búsqueda sobre los registros cargados"""
+        self.code_index = NCMCodeIndex(self.ncm_data)
+        logger.debug(f"Índice jerárquico NCM construido: {len(self.code_index):,} códigos")
+
     def normalize_ncm_code(self, ncm_code: str) -> str:
         """Normaliza código NCM eliminando puntos, espacios y guiones"""
         if not ncm_code:
             return ""
         return re.sub(r'[.\s-]', '', str(ncm_code).strip())
         
-    def search_exact_ncm(self, ncm_code: str) -> Optional[Dict[str, Any]]:
-        """Búsqueda exacta de código NCM"""
+    def search_exact_ncm(self, ncm_code: str, sim_code: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Búsqueda exacta de código NCM
+
+        Args:
+            ncm_code: Código NCM (con o sin puntos)
+            sim_code: Sufijo SIM opcional (ej. "100W") para ubicar la posición terminal exacta
+        """
         if not self.ncm_data:
             return None
             
         normalized_code = self.normalize_ncm_code(ncm_code)
         
-        # Buscar por código exacto
-        for record in self.ncm_data:
-            if record.get('code_searchable') == normalized_code:
-                return self._enrich_ncm_record(record)
-                
-        return None
+        if sim_code is not None:
+            position = self.code_index.position_for_code_sim(normalized_code, sim_code)
+        else:
+            position = self.code_index.first_position(normalized_code)
+        if position is None:
+            return None
+        return self._enrich_ncm_record(self.ncm_data[position])
         
     def search_hierarchical_ncm(self, ncm_code: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """Búsqueda jerárquica de códigos NCM similares con múltiples estrategias"""
@@ -202,15 +339,16 @@ class NCMOfficialIntegration:
             prefix = normalized_code[:length]
             if len(prefix) >= 2:  # Mínimo un capítulo
                 found_in_level = 0
-                for record in self.ncm_data:
+                # Permitir más matches para luego filtrar
+                remaining = max_results * 2 - len(matches)
+                for position in self.code_index.positions_with_prefix(prefix, limit=remaining):
+                    record = self.ncm_data[position]
                     record_code = record.get('code_searchable', '')
-                    if record_code.startswith(prefix):
-                        if len(matches) < max_results * 2:  # Permitir más matches para luego filtrar
-                            enriched_record = self._enrich_ncm_record(record)
-                            enriched_record['match_type'] = f'hierarchical_{length}digits'
-                            enriched_record['match_score'] = self._calculate_match_score(normalized_code, record_code)
-                            matches.append(enriched_record)
-                            found_in_level += 1
+                    enriched_record = self._enrich_ncm_record(record)
+                    enriched_record['match_type'] = f'hierarchical_{length}digits'
+                    enriched_record['match_score'] = self._calculate_match_score(normalized_code, record_code)
+                    matches.append(enriched_record)
+                    found_in_level += 1
                 
                 search_attempts.append(f"Nivel {length} dígitos: {found_in_level} encontrados")
                         
@@ -223,14 +361,13 @@ class NCMOfficialIntegration:
             shorter_code = normalized_code[:-2]
             logger.info(f"Intentando búsqueda sin últimos ceros: {shorter_code}")
             
-            for record in self.ncm_data:
+            for position in self.code_index.positions_with_prefix(shorter_code, limit=max_results):
+                record = self.ncm_data[position]
                 record_code = record.get('code_searchable', '')
-                if record_code.startswith(shorter_code):
-                    if len(matches) < max_results:
-                        enriched_record = self._enrich_ncm_record(record)
-                        enriched_record['match_type'] = 'hierarchical_trimmed'
-                        enriched_record['match_score'] = self._calculate_match_score(shorter_code, record_code)
-                        matches.append(enriched_record)
+                enriched_record = self._enrich_ncm_record(record)
+                enriched_record['match_type'] = 'hierarchical_trimmed'
+                enriched_record['match_score'] = self._calculate_match_score(shorter_code, record_code)
+                matches.append(enriched_record)
             
             search_attempts.append(f"Código sin ceros: {len(matches)} encontrados")
         
@@ -239,16 +376,14 @@ class NCMOfficialIntegration:
             chapter = normalized_code[:2]
             logger.info(f"Búsqueda por capítulo: {chapter}")
             
-            chapter_matches = 0
-            for record in self.ncm_data:
+            chapter_matches = self.code_index.count_prefix(chapter)
+            for position in self.code_index.positions_with_prefix(chapter, limit=max_results):
+                record = self.ncm_data[position]
                 record_code = record.get('code_searchable', '')
-                if record_code.startswith(chapter):
-                    chapter_matches += 1
-                    if len(matches) < max_results:
-                        enriched_record = self._enrich_ncm_record(record)
-                        enriched_record['match_type'] = 'chapter_fallback'
-                        enriched_record['match_score'] = self._calculate_match_score(chapter, record_code[:2])
-                        matches.append(enriched_record)
+                enriched_record = self._enrich_ncm_record(record)
+                enriched_record['match_type'] = 'chapter_fallback'
+                enriched_record['match_score'] = self._calculate_match_score(chapter, record_code[:2])
+                matches.append(enriched_record)
             
             search_attempts.append(f"Capítulo {chapter}: {chapter_matches} total, {len(matches)} retornados")
         
@@ -432,25 +567,16 @@ class NCMOfficialIntegration:
         
         logger.info(f"🔍 Buscando subcategorías para código padre: {parent_code} (normalizado: {normalized_parent})")
         
-        for record in self.ncm_data:
-            record_code = record.get('code_searchable', '')
-            record_type = record.get('record_type', '')
-            sim_code = record.get('sim', '')
-            
-            # Buscar registros terminales que tengan el mismo código base pero con SIM diferente
-            # Ejemplo: padre "61159500" (subcategory) -> hijos "61159500" con SIM "100P", "200V", etc. (terminal)
-            if (record_code == normalized_parent and 
-                record_type == 'terminal' and 
-                sim_code and sim_code.strip()):
-                
-                enriched = self._enrich_ncm_record(record)
-                subcategories.append(enriched)
-                logger.debug(f"   Encontrada subcategoría: {record.get('code', 'N/A')} SIM:{sim_code} - {record.get('description', 'N/A')[:50]}...")
+        # Hijos precomputados: registros terminales con el mismo código base pero con SIM
+        # Ejemplo: padre "61159500" (subcategory) -> hijos "61159500" con SIM "100P", "200V", etc. (terminal)
+        # (ya vienen ordenados por SIM para mantener orden lógico)
+        for position in self.code_index.terminal_children(normalized_parent):
+            record = self.ncm_data[position]
+            enriched = self._enrich_ncm_record(record)
+            subcategories.append(enriched)
+            logger.debug(f"   Encontrada subcategoría: {record.get('code', 'N/A')} SIM:{record.get('sim', '')} - {record.get('description', 'N/A')[:50]}...")
                 
         logger.info(f"📊 Total subcategorías encontradas: {len(subcategories)}")
-        
-        # Ordenar por SIM code para mantener orden lógico
-        subcategories.sort(key=lambda x: x.get('sim_code', ''))
         return subcategories
         
     async def refine_ncm_with_llm(self, initial_position: Dict[str, Any], 
@@ -505,10 +631,6 @@ INSTRUCCIONES:
 Tu respuesta debe ser solo el número:"""
 
         try:
-            # Importar OpenAI para el refinamiento
-            from openai import OpenAI
-            import os
-            
             # Obtener API key
             api_key = os.getenv('OPENAI_API_KEY')
             if not api_key:
@@ -522,9 +644,8 @@ Tu respuesta debe ser solo el número:"""
                 logger.error("No se encontró API key de OpenAI para refinamiento")
                 return initial_position
                 
-            client = OpenAI(api_key=api_key)
-            
-            response = client.chat.completions.create(
+            llm_response = (await async_chat_completion(
+                get_async_openai_client(api_key),
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "Eres un especialista en clasificación arancelaria. Responde solo con números."},
@@ -532,9 +653,7 @@ Tu respuesta debe ser solo el número:"""
                 ],
                 temperature=0,
                 max_tokens=10
-            )
-            
-            llm_response = response.choices[0].message.content.strip()
+            )).strip()
             logger.info(f"LLM de refinamiento respondió: '{llm_response}'")
             
             # Extraer número de la respuesta
@@ -708,7 +827,7 @@ Tu respuesta debe ser solo el número:"""
         if not self.ncm_data:
             return {}
             
-        chapter_records = [r for r in self.ncm_data if r.get('chapter') == chapter]
+        chapter_records = [self.ncm_data[i] for i in self.code_index.chapter_positions(chapter)]
         
         if not chapter_records:
             return {'error': f'No se encontraron datos para el capítulo {chapter}'}
@@ -758,12 +877,26 @@ Tu respuesta debe ser solo el número:"""
 
 # Instancia global para uso fácil
 _ncm_integration_instance = None
+_ncm_integration_lock = threading.Lock()
 
 def get_ncm_integration() -> NCMOfficialIntegration:
-    """Obtiene instancia singleton de la integración NCM"""
+    """
+    Obtiene instancia singleton de la integración NCM
+
+    El dataset y sus índices son de solo lectura, así que una única instancia
+    por proceso se comparte entre sesiones e hilos. El lock evita que dos hilos
+    carguen el dataset en paralelo la primera vez. Solo se guarda una instancia
+    con el dataset cargado: si la carga falla, la próxima llamada lo reintenta.
+    """
     global _ncm_integration_instance
     if _ncm_integration_instance is None:
-        _ncm_integration_instance = NCMOfficialIntegration()
+        with _ncm_integration_lock:
+            if _ncm_integration_instance is None:
+                integration = NCMOfficialIntegration()
+                if not integration.ncm_data:
+                    logger.warning("⚠️ Dataset NCM no disponible, se reintentará la carga en la próxima consulta")
+                    return integration
+                _ncm_integration_instance = integration
     return _ncm_integration_instance
 
 # Función de compatibilidad para reemplazar VUCE
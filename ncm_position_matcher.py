@@ -26,9 +26,10 @@ import logging
 from pathlib import Path
 from typing import Dict, List, Optional, Union, Tuple, Any
 from datetime import datetime
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
 from dataclasses import dataclass
-from difflib import SequenceMatcher
 import asyncio
 
 # Configurar logging
@@ -41,7 +42,7 @@ logger = logging.getLogger(__name__)
 
 # Intentar importar OpenAI para selección IA
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
@@ -54,6 +55,14 @@ try:
 except ImportError:
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', "")
 
+from ncm_compiled_dataset import FIELD_ORDER, load_compiled_dataset
+from ncm_text_index import BM25Index, TrigramIndex, fold_accents, words
+from async_clients import async_chat_completion, get_async_openai_client
+
+# Columnas de texto: se leen como string para conservar ceros iniciales en códigos
+TEXT_COLUMNS = ['file', 'code', 'sim', 'description', 'in',
+                'code_searchable', 'parent', 'parent_searchable', 'record_type']
+
 @dataclass
 class NCMPosition:
     """Estructura de datos para una posición NCM"""
@@ -150,24 +159,92 @@ class NCMPosition:
             "restrictions": ["max_value_usd_3000", "max_weight_50kg"]
         }
 
+@dataclass
+class NCMCandidates:
+    """
+    Candidatos de una búsqueda aproximada como arreglos paralelos
+
+    Cada entrada es una fila del dataset; los `NCMPosition` solo se materializan
+    para los candidatos que sobreviven al puntaje.
+    """
+    rows: np.ndarray
+    similarity: np.ndarray   # Similitud de descripción (NaN si no aplica)
+    fuzzy: np.ndarray        # Similitud por trigramas (NaN si no aplica)
+    match_level: np.ndarray  # Nivel de match jerárquico (0 si no aplica)
+    
+    @classmethod
+    def build(cls, rows, similarity=None, fuzzy=None, match_level=None) -> 'NCMCandidates':
+        """Arma los arreglos; las columnas no indicadas quedan sin valor"""
+        rows = np.asarray(rows, dtype=np.intp)
+        
+        def column(values, missing, dtype) -> np.ndarray:
+            if values is None:
+                return np.full(len(rows), missing, dtype=dtype)
+            return np.asarray(values, dtype=dtype)
+        
+        return cls(rows, column(similarity, np.nan, np.float64), column(fuzzy, np.nan, np.float64),
+                   column(match_level, 0, np.int64))
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def take(self, index) -> 'NCMCandidates':
+        """Subconjunto (o reordenamiento) de los candidatos"""
+        return NCMCandidates(self.rows[index], self.similarity[index], self.fuzzy[index], self.match_level[index])
+
+class LazyPositionIndex(Mapping):
+    """
+    Índice código normalizado -> posiciones NCM
+
+    Guarda solo las filas de cada código; los `NCMPosition` se materializan
+    bajo demanda al acceder a un código.
+    """
+
+    def __init__(self, data_loader: 'NCMDataLoader', groups: Dict[str, np.ndarray]):
+        self._data_loader = data_loader
+        self._groups = groups
+
+    def __getitem__(self, code: str) -> List[NCMPosition]:
+        return [self._data_loader.position_at(row) for row in self._groups[code]]
+
+    def __contains__(self, code) -> bool:
+        return code in self._groups
+
+    def __iter__(self):
+        return iter(self._groups)
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def rows(self, code: str) -> np.ndarray:
+        """Filas del DataFrame asociadas a un código normalizado"""
+        return self._groups.get(code, np.empty(0, dtype=np.intp))
+
 class NCMDataLoader:
     """Cargador y preprocesador de datos NCM"""
     
     def __init__(self, data_file: str):
         self.data_file = Path(data_file)
         self.data: Optional[pd.DataFrame] = None
-        self.positions: Dict[str, List[NCMPosition]] = {}
+        self.positions: Mapping = {}
+        self.code_searchable: Optional[pd.Series] = None
+        self._columns: Dict[str, list] = {}
+        self._code_order: np.ndarray = np.empty(0, dtype=np.intp)
+        self._sorted_codes: np.ndarray = np.empty(0, dtype=str)
+        self._code_sim_keys: np.ndarray = np.empty(0, dtype=np.intp)
+        self._is_terminal: np.ndarray = np.empty(0, dtype=bool)
+        self._hierarchy_levels: np.ndarray = np.empty(0, dtype=np.int64)
         self.load_data()
     
     def load_data(self) -> None:
-        """Carga y preprocesa los datos NCM"""
+        """Carga y preprocesa los datos NCM (CSV o JSON consolidado)"""
         if not self.data_file.exists():
             raise FileNotFoundError(f"Archivo de datos no encontrado: {self.data_file}")
         
         logger.info(f"Cargando datos desde {self.data_file}")
         
         try:
-            self.data = pd.read_csv(self.data_file)
+            self.data = self._read_data_file()
             logger.info(f"Datos cargados: {len(self.data)} registros")
             
             # Validar estructura
@@ -185,6 +262,27 @@ class NCMDataLoader:
             logger.error(f"Error cargando datos: {e}")
             raise
     
+    def _read_data_file(self) -> pd.DataFrame:
+        """Lee el archivo de datos como DataFrame"""
+        if self.data_file.suffix.lower() == '.json':
+            # Preferir el binario compilado (columnas listas, sin parsear JSON)
+            compiled = load_compiled_dataset(self.data_file)
+            if compiled is not None:
+                try:
+                    return pd.DataFrame({
+                        name: np.array(column) if isinstance(column, np.ndarray) else column
+                        for name, column in ((name, compiled.column(name)) for name in FIELD_ORDER)
+                    })
+                finally:
+                    compiled.close()
+            
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            records = data.get('records', []) if isinstance(data, dict) else data
+            return pd.DataFrame(records)
+        
+        return pd.read_csv(self.data_file, dtype={col: str for col in TEXT_COLUMNS})
+    
     def _preprocess_data(self) -> None:
         """Preprocesa y limpia los datos"""
         # Limpiar valores nulos
@@ -201,8 +299,11 @@ class NCMDataLoader:
             'parent_searchable': ''
         })
         
-        # Normalizar códigos
-        self.data['code_normalized'] = self.data['code'].apply(self._normalize_code)
+        # Normalizar códigos (operaciones vectorizadas de pandas)
+        self.data['code_normalized'] = (
+            self.data['code'].fillna('').astype(str).str.strip()
+            .str.replace(r'[.\s-]', '', regex=True)
+        )
         
         logger.info(f"Datos preprocesados. Tipos de registro: {self.data['record_type'].value_counts().to_dict()}")
     
@@ -213,42 +314,120 @@ class NCMDataLoader:
         return re.sub(r'[.\s-]', '', str(code).strip())
     
     def _index_positions(self) -> None:
-        """Indexa posiciones para búsqueda rápida"""
-        for _, row in self.data.iterrows():
-            position = NCMPosition(
-                file=row.get('file', ''),
-                chapter=int(row.get('chapter', 0)),
-                code=row.get('code', ''),
-                sim=row.get('sim', ''),
-                description=row.get('description', ''),
-                aec=float(row.get('aec', 0)),
-                die=float(row.get('die', 0)),
-                te=float(row.get('te', 0)),
-                in_field=row.get('in', ''),
-                de=float(row.get('de', 0)),
-                re=float(row.get('re', 0)),
-                code_searchable=row.get('code_searchable', ''),
-                parent=row.get('parent') if pd.notna(row.get('parent')) else None,
-                parent_searchable=row.get('parent_searchable') if pd.notna(row.get('parent_searchable')) else None,
-                hierarchy_level=int(row.get('hierarchy_level', 0)),
-                record_type=row.get('record_type', 'unknown')
-            )
-            
-            # Indexar por código normalizado
-            normalized_code = self._normalize_code(position.code)
-            if normalized_code not in self.positions:
-                self.positions[normalized_code] = []
-            self.positions[normalized_code].append(position)
+        """Indexa posiciones para búsqueda rápida, agrupando filas por código normalizado"""
+        self._columns = self._extract_columns()
+        self.code_searchable = self.data['code_searchable'].astype(str) \
+            if 'code_searchable' in self.data.columns else pd.Series([''] * len(self.data))
+        
+        groups = self.data.groupby('code_normalized', sort=False).indices
+        self.positions = LazyPositionIndex(self, groups)
+        
+        # Códigos ordenados para búsquedas por prefijo con searchsorted
+        codes = self.code_searchable.to_numpy(dtype=str)
+        self._code_order = np.argsort(codes, kind='stable')
+        self._sorted_codes = codes[self._code_order]
+        
+        # Columnas usadas para deduplicar y puntuar candidatos sin materializar posiciones
+        columns = self._columns
+        self._code_sim_keys = pd.factorize(
+            pd.Series(columns['code'], dtype=object).astype(str) + '_' + pd.Series(columns['sim'], dtype=object).astype(str)
+        )[0]
+        self._is_terminal = np.asarray(columns['record_type'], dtype=object) == 'terminal'
+        self._hierarchy_levels = np.asarray(columns['hierarchy_level'], dtype=np.int64)
         
         logger.info(f"Indexados {len(self.positions)} códigos únicos")
+    
+    def _extract_columns(self) -> Dict[str, list]:
+        """Convierte las columnas usadas por NCMPosition a listas nativas de Python"""
+        data = self.data
+        n_rows = len(data)
+        
+        def column(name: str, default: Any, dtype=None) -> list:
+            if name not in data.columns:
+                return [default] * n_rows
+            series = data[name]
+            return (series.astype(dtype) if dtype else series).tolist()
+        
+        def nullable(name: str) -> list:
+            if name not in data.columns:
+                return [None] * n_rows
+            series = data[name]
+            return series.astype(object).where(series.notna(), None).tolist()
+        
+        return {
+            'file': column('file', ''),
+            'chapter': column('chapter', 0, int),
+            'code': column('code', ''),
+            'sim': column('sim', ''),
+            'description': column('description', ''),
+            'aec': column('aec', 0.0, float),
+            'die': column('die', 0.0, float),
+            'te': column('te', 0.0, float),
+            'in_field': column('in', ''),
+            'de': column('de', 0.0, float),
+            're': column('re', 0.0, float),
+            'code_searchable': column('code_searchable', ''),
+            'parent': nullable('parent'),
+            'parent_searchable': nullable('parent_searchable'),
+            'hierarchy_level': column('hierarchy_level', 0, int),
+            'record_type': column('record_type', 'unknown'),
+        }
+    
+    def rows_with_prefix(self, prefix: str) -> np.ndarray:
+        """Filas (en orden del dataset) cuyo code_searchable empieza con el prefijo"""
+        if not prefix:
+            return np.arange(len(self._sorted_codes))
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        start, end = np.searchsorted(self._sorted_codes, [prefix, upper])
+        return np.sort(self._code_order[start:end])
+    
+    def position_at(self, row: int) -> NCMPosition:
+        """Materializa el NCMPosition de una fila del DataFrame"""
+        columns = self._columns
+        return NCMPosition(**{field: values[row] for field, values in columns.items()})
 
 class NCMSearchEngine:
     """Motor de búsqueda para códigos NCM"""
     
+    # Máximo de documentos BM25 (ya filtrados por categoría) a puntuar por consulta
+    DESCRIPTION_CANDIDATES = 200
+    # Similitud mínima de trigramas y cantidad de coincidencias difusas por consulta
+    FUZZY_THRESHOLD = 0.3
+    FUZZY_CANDIDATES = 20
+    
+    # Palabras clave importantes para diferentes categorías
+    CATEGORY_KEYWORDS = {
+        'electronics': ['televisor', 'tv', 'lcd', 'led', 'monitor', 'pantalla', 'telefono', 'celular', 'smartphone'],
+        'animals': ['caballo', 'animal', 'vivo', 'ganado', 'equino'],
+        'food': ['alimento', 'comida', 'bebida'],
+        'chemicals': ['quimico', 'farmaco', 'medicamento'],
+        'textiles': ['ropa', 'textil', 'tela', 'vestimenta']
+    }
+    
     def __init__(self, data_loader: NCMDataLoader):
         self.data_loader = data_loader
         self.data = data_loader.data
         self.positions = data_loader.positions
+        self._text_index: Optional[BM25Index] = None
+        self._trigram_index: Optional[TrigramIndex] = None
+        self._exact_tables: Optional[Dict[str, Any]] = None
+        self._description_terms_cache: Dict[str, Tuple[str, frozenset]] = {}
+    
+    @property
+    def text_index(self) -> BM25Index:
+        """Índice BM25 de descripciones (se construye en la primera búsqueda por texto)"""
+        if self._text_index is None:
+            self._text_index = BM25Index(self.data_loader._columns['description'])
+            logger.info(f"Índice de texto construido: {len(self._text_index.postings):,} términos")
+        return self._text_index
+    
+    @property
+    def trigram_index(self) -> TrigramIndex:
+        """Índice de trigramas de descripciones (se construye en la primera búsqueda difusa)"""
+        if self._trigram_index is None:
+            self._trigram_index = TrigramIndex(self.data_loader._columns['description'])
+            logger.info(f"Índice de trigramas construido: {len(self._trigram_index.postings):,} trigramas")
+        return self._trigram_index
     
     def exact_search(self, query: str) -> Optional[Dict[str, Any]]:
         """Búsqueda exacta con múltiples estrategias"""
@@ -282,6 +461,75 @@ class NCMSearchEngine:
         logger.info("No se encontró coincidencia exacta")
         return None
     
+    def exact_search_many(self, queries: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Búsqueda exacta de muchas consultas en una sola pasada vectorizada
+        
+        Aplica las mismas tres estrategias que exact_search (código+SIM, código
+        base terminal, código normalizado) con extracciones de pandas sobre todas
+        las consultas y búsquedas en tablas precalculadas.
+        
+        Returns:
+            Un resultado (o None) por consulta, en el mismo orden
+        """
+        if not queries:
+            return []
+        tables = self._exact_lookup_tables()
+        stripped = pd.Series(queries, dtype=object).fillna('').astype(str).str.strip()
+        
+        # Estrategia 1: "8528.72.00 100W" o "8528.72.00.100"
+        with_sim = stripped.str.extract(r'^(\d{4}\.\d{2}\.\d{2})(?:\s+|\.)([A-Z0-9]+)$')
+        sim_rows = (with_sim[0] + '|' + with_sim[1]).map(tables['code_sim'])
+        
+        # Estrategia 2: primer patrón de código base que coincide, en el orden de _extract_base_code
+        base_groups = stripped.str.extract(
+            r'^(?:(\d{4}\.\d{2}\.\d{2})|(\d{8})|(\d{2}\.\d{2}\.\d{2}\.\d{2})|(\d{4})|(\d{2}))'
+        )
+        base_codes = base_groups.bfill(axis=1)[0]
+        base_rows = base_codes.map(tables['terminal_code'])
+        
+        # Estrategia 3: código normalizado, prefiriendo terminales con SIM
+        normalized = stripped.str.replace(r'[.\s-]', '', regex=True)
+        normalized_rows = normalized.map(tables['normalized'])
+        
+        results: List[Optional[Dict[str, Any]]] = []
+        for query, sim_row, base_row, normalized_row in zip(queries, sim_rows, base_rows, normalized_rows):
+            if not pd.isna(sim_row):
+                row, method = sim_row, "exact_with_sim"
+            elif not pd.isna(base_row):
+                row, method = base_row, "exact_base_code"
+            elif not pd.isna(normalized_row):
+                row, method = normalized_row, "exact_normalized"
+            else:
+                results.append(None)
+                continue
+            results.append(self._format_exact_result(query, self.data_loader.position_at(int(row)), method))
+        return results
+    
+    def _exact_lookup_tables(self) -> Dict[str, Any]:
+        """Tablas (se calculan una vez) con la fila ganadora de cada estrategia exacta"""
+        if self._exact_tables is None:
+            data = self.data
+            rows = pd.Series(np.arange(len(data)), index=data.index)
+            is_terminal = (data['record_type'] == 'terminal').to_numpy()
+            has_sim = data['sim'].astype(str).ne('').to_numpy()
+            
+            code_sim = data['code'] + '|' + data['sim'].astype(str)
+            first_code_sim = pd.DataFrame({'key': code_sim, 'row': rows}).dropna().drop_duplicates('key')
+            terminal_code = pd.DataFrame({'code': data['code'][is_terminal], 'row': rows[is_terminal]}) \
+                .dropna().drop_duplicates('code')
+            # Misma preferencia que _select_best_terminal: terminal con SIM, terminal, cualquiera
+            preference = np.where(is_terminal & has_sim, 0, np.where(is_terminal, 1, 2))
+            best_normalized = pd.DataFrame({'code': data['code_normalized'], 'rank': preference, 'row': rows}) \
+                .sort_values(['rank', 'row'], kind='stable').drop_duplicates('code')
+            
+            self._exact_tables = {
+                'code_sim': pd.Series(first_code_sim['row'].to_numpy(), index=first_code_sim['key'].to_numpy()),
+                'terminal_code': pd.Series(terminal_code['row'].to_numpy(), index=terminal_code['code'].to_numpy()),
+                'normalized': pd.Series(best_normalized['row'].to_numpy(), index=best_normalized['code'].to_numpy()),
+            }
+        return self._exact_tables
+    
     def _search_with_sim(self, query: str) -> Optional[NCMPosition]:
         """Busca código específico con SIM"""
         # Patrón: "8528.72.00 100W" o "8528.72.00.100"
@@ -299,11 +547,10 @@ class NCMSearchEngine:
         
         # Buscar en dataframe
         mask = (self.data['code'] == base_code) & (self.data['sim'] == sim_code)
-        matches = self.data[mask]
+        rows = np.flatnonzero(mask.to_numpy())
         
-        if not matches.empty:
-            row = matches.iloc[0]
-            return self._row_to_position(row)
+        if rows.size:
+            return self.data_loader.position_at(rows[0])
         
         return None
     
@@ -328,12 +575,11 @@ class NCMSearchEngine:
     def _search_base_code(self, base_code: str) -> Optional[NCMPosition]:
         """Busca por código base sin SIM"""
         mask = (self.data['code'] == base_code) & (self.data['record_type'] == 'terminal')
-        matches = self.data[mask]
+        rows = np.flatnonzero(mask.to_numpy())
         
-        if not matches.empty:
+        if rows.size:
             # Preferir registro con SIM más específico
-            best_match = matches.iloc[0]
-            return self._row_to_position(best_match)
+            return self.data_loader.position_at(rows[0])
         
         return None
     
@@ -356,97 +602,161 @@ class NCMSearchEngine:
         """Búsqueda aproximada jerárquica"""
         logger.info(f"Búsqueda aproximada para: '{query}'")
         
-        candidates = []
-        
-        # Estrategia 1: Búsqueda por descripción
+        # Estrategia 1: Búsqueda por descripción (palabras + trigramas tolerantes a errores)
         if not re.match(r'^\d', query.strip()):
-            candidates.extend(self._search_by_description(query))
+            candidates = self._merge_description_candidates(
+                self._search_by_description(query),
+                self._fuzzy_search_by_description(query)
+            )
         
         # Estrategia 2: Búsqueda jerárquica por código parcial
         else:
-            candidates.extend(self._hierarchical_search(query))
+            candidates = self._hierarchical_search(query)
         
         # Eliminar duplicados y ordenar por relevancia
         unique_candidates = self._deduplicate_candidates(candidates)
-        scored_candidates = self._score_candidates(unique_candidates, query)
-        
-        return scored_candidates[:15]  # Top 15 candidatos
+        return self._score_candidates(unique_candidates, query, top_k=15)  # Top 15 candidatos
     
-    def _search_by_description(self, query: str) -> List[NCMPosition]:
-        """Búsqueda por similitud de descripción mejorada"""
+    def _search_by_description(self, query: str) -> NCMCandidates:
+        """Búsqueda por descripción sobre el índice invertido (BM25)"""
         candidates = []
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
-        
-        # Palabras clave importantes para diferentes categorías
-        category_keywords = {
-            'electronics': ['televisor', 'tv', 'lcd', 'led', 'monitor', 'pantalla', 'telefono', 'celular', 'smartphone'],
-            'animals': ['caballo', 'animal', 'vivo', 'ganado', 'equino'],
-            'food': ['alimento', 'comida', 'bebida'],
-            'chemicals': ['quimico', 'farmaco', 'medicamento'],
-            'textiles': ['ropa', 'textil', 'tela', 'vestimenta']
-        }
-        
-        # Determinar categoría probable del query
-        query_category = None
-        for category, keywords in category_keywords.items():
-            if any(word in query_lower for word in keywords):
-                query_category = category
-                break
-        
-        for _, row in self.data.iterrows():
-            description = str(row.get('description', '')).lower()
+        query_words = set(words(query))
+        query_category = self._detect_query_category(query)
+        
+        # Solo se evalúan documentos que comparten términos con la consulta
+        columns = self.data_loader._columns
+        best_bm25 = None
+        evaluated = 0
+        for row, bm25_score in self.text_index.iter_search(query):
+            description = str(columns['description'][row]).lower()
             if not description or len(description) < 3:
                 continue
             
-            # Filtro por categoría para evitar falsos positivos
-            chapter = int(row.get('chapter', 0))
-            if query_category == 'electronics' and chapter not in [84, 85]:
-                continue
-            elif query_category == 'animals' and chapter not in range(1, 25):
-                continue
-            elif query_category == 'chemicals' and chapter not in range(28, 40):
+            # Post-filtro por categoría para evitar falsos positivos
+            if not self._chapter_matches_category(columns['chapter'][row], query_category):
                 continue
             
-            # Similitud básica
-            similarity = SequenceMatcher(None, query_lower, description).ratio()
+            evaluated += 1
+            if evaluated > self.DESCRIPTION_CANDIDATES:
+                break
+            
+            # Relevancia BM25 normalizada respecto del mejor documento
+            if best_bm25 is None:
+                best_bm25 = bm25_score
+            similarity = bm25_score / best_bm25 if best_bm25 > 0 else 0.0
             
             # Bonus por palabras clave coincidentes
-            desc_words = set(description.split())
+            folded_description, desc_words = self._description_terms(description)
             word_overlap = len(query_words & desc_words) / max(len(query_words), 1)
             
             # Bonus por coincidencia exacta de palabras importantes
             exact_matches = 0
             for word in query_words:
-                if word in description:
+                if word in folded_description:
                     exact_matches += 1
             exact_match_bonus = exact_matches / len(query_words) if query_words else 0
             
             # Penalización por descripciones genéricas
-            generic_penalty = 0
-            if any(generic in description for generic in ['los demás', 'otros', 'las demás']):
-                generic_penalty = 0.2
+            generic_penalty = self._generic_penalty(description)
             
             combined_score = (similarity * 0.4) + (word_overlap * 0.3) + (exact_match_bonus * 0.3) - generic_penalty
             
             if combined_score > 0.4:  # Umbral más alto para mayor precisión
-                position = self._row_to_position(row)
-                position.similarity_score = combined_score
-                candidates.append(position)
+                candidates.append((row, combined_score))
+        
+        # Top 20 por puntaje combinado
+        top = sorted(candidates, key=lambda x: x[1], reverse=True)[:20]
+        return NCMCandidates.build([row for row, _ in top], similarity=[score for _, score in top])
+    
+    def _description_terms(self, description: str) -> Tuple[str, frozenset]:
+        """Descripción sin acentos y su conjunto de palabras (memorizado: se repiten entre consultas)"""
+        terms = self._description_terms_cache.get(description)
+        if terms is None:
+            terms = self._description_terms_cache[description] = (fold_accents(description), frozenset(words(description)))
+        return terms
+    
+    def _fuzzy_search_by_description(self, query: str) -> NCMCandidates:
+        """Búsqueda difusa por trigramas: tolera errores de tipeo y variantes de escritura"""
+        rows, similarity, fuzzy = [], [], []
+        query_category = self._detect_query_category(query)
+        columns = self.data_loader._columns
+        
+        # Pedir de más para compensar los filtros por categoría
+        hits = self.trigram_index.search(query, top_k=self.FUZZY_CANDIDATES * 5, threshold=self.FUZZY_THRESHOLD)
+        for row, trigram_similarity in hits:
+            description = str(columns['description'][row]).lower()
+            if not description or len(description) < 3:
+                continue
+            if not self._chapter_matches_category(columns['chapter'][row], query_category):
+                continue
+            
+            rows.append(row)
+            fuzzy.append(trigram_similarity)
+            similarity.append(trigram_similarity - self._generic_penalty(description))
+            if len(rows) >= self.FUZZY_CANDIDATES:
+                break
         
-        return sorted(candidates, key=lambda x: getattr(x, 'similarity_score', 0), reverse=True)[:20]  # Top 20
+        return NCMCandidates.build(rows, similarity=similarity, fuzzy=fuzzy)
+    
+    def _merge_description_candidates(self, word_candidates: NCMCandidates,
+                                      fuzzy_candidates: NCMCandidates) -> NCMCandidates:
+        """Combina candidatos por palabras y por trigramas, conservando el mejor puntaje"""
+        columns = self.data_loader._columns
+        merged: Dict[Tuple[str, str, str], int] = {}
+        rows, similarity, fuzzy = [], [], []
+        for candidates in (word_candidates, fuzzy_candidates):
+            for row, row_similarity, row_fuzzy in zip(candidates.rows, candidates.similarity, candidates.fuzzy):
+                key = (columns['code'][row], columns['sim'][row], columns['description'][row])
+                existing = merged.get(key)
+                if existing is None:
+                    merged[key] = len(rows)
+                    rows.append(row)
+                    similarity.append(row_similarity)
+                    fuzzy.append(row_fuzzy)
+                    continue
+                # Coincide en ambas búsquedas: puntaje máximo y registro de la similitud difusa
+                if not np.isnan(row_fuzzy):
+                    fuzzy[existing] = row_fuzzy
+                similarity[existing] = max(similarity[existing], row_similarity)
+        
+        merged_candidates = NCMCandidates.build(rows, similarity=similarity, fuzzy=fuzzy)
+        return merged_candidates.take(np.argsort(-merged_candidates.similarity, kind='stable'))
+    
+    def _detect_query_category(self, query: str) -> Optional[str]:
+        """Determina la categoría probable del query"""
+        query_lower = query.lower()
+        for category, keywords in self.CATEGORY_KEYWORDS.items():
+            if any(word in query_lower for word in keywords):
+                return category
+        return None
+    
+    def _chapter_matches_category(self, chapter: int, query_category: Optional[str]) -> bool:
+        """Filtro de capítulos por categoría para evitar falsos positivos"""
+        if query_category == 'electronics':
+            return chapter in [84, 85]
+        if query_category == 'animals':
+            return chapter in range(1, 25)
+        if query_category == 'chemicals':
+            return chapter in range(28, 40)
+        return True
+    
+    def _generic_penalty(self, description: str) -> float:
+        """Penalización por descripciones genéricas ("los demás", "otros")"""
+        if any(generic in description for generic in ['los demás', 'otros', 'las demás']):
+            return 0.2
+        return 0
     
-    def _hierarchical_search(self, query: str) -> List[NCMPosition]:
-        """Búsqueda jerárquica por código NCM"""
+    def _hierarchical_search(self, query: str) -> NCMCandidates:
+        """Búsqueda jerárquica por código NCM (filas y nivel de match, sin materializar posiciones)"""
         base_code = self._extract_base_code(query)
         if not base_code:
             # Si no es un código, intentar búsqueda numérica directa
             if query.isdigit() and len(query) >= 2:
                 base_code = query
             else:
-                return []
+                return NCMCandidates.build([])
         
-        candidates = []
+        rows, match_levels = [], []
         normalized_base = self.data_loader._normalize_code(base_code)
         
         # Buscar por jerarquía: capítulo -> partida -> subpartida
@@ -463,107 +773,101 @@ class NCMSearchEngine:
         for level in search_lengths:
             prefix = normalized_base[:level]
             if len(prefix) == level:
-                # Asegurar que code_searchable sea string
-                searchable_col = self.data['code_searchable'].astype(str)
-                matches = self.data[searchable_col.str.startswith(prefix)]
-                
-                for _, row in matches.iterrows():
-                    position = self._row_to_position(row)
-                    position.hierarchy_match_level = level
-                    candidates.append(position)
+                # Rango de códigos ordenados con el prefijo (sin recorrer el dataset)
+                matches = self.data_loader.rows_with_prefix(prefix)
+                rows.append(matches)
+                match_levels.append(np.full(len(matches), level, dtype=np.int64))
                 
                 # Si encontramos muchos resultados en un nivel específico, no necesitamos más generales
                 if len(matches) > 50 and level >= 4:
                     break
         
-        return candidates
+        if not rows:
+            return NCMCandidates.build([])
+        return NCMCandidates.build(np.concatenate(rows), match_level=np.concatenate(match_levels))
     
-    def _deduplicate_candidates(self, candidates: List[NCMPosition]) -> List[NCMPosition]:
-        """Elimina candidatos duplicados"""
-        seen = set()
-        unique = []
+    def _deduplicate_candidates(self, candidates: NCMCandidates) -> NCMCandidates:
+        """Elimina candidatos duplicados (mismo código y SIM), conservando la primera aparición"""
+        keys = self.data_loader._code_sim_keys[candidates.rows]
+        _, first = np.unique(keys, return_index=True)
+        return candidates.take(np.sort(first))
+    
+    def _score_candidates(self, candidates: NCMCandidates, query: str,
+                          top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Asigna puntajes a candidatos (vectorizado con NumPy)
         
-        for candidate in candidates:
-            key = f"{candidate.code}_{candidate.sim}"
-            if key not in seen:
-                seen.add(key)
-                unique.append(candidate)
+        Args:
+            candidates: Filas candidatas con sus similitudes y nivel de match
+            query: Consulta original
+            top_k: Si se indica, solo se devuelven (y formatean) los top_k mejores
+        """
+        n_candidates = len(candidates)
+        if not n_candidates:
+            return []
+        
+        rows = candidates.rows
+        is_terminal = self.data_loader._is_terminal[rows]
+        levels = self.data_loader._hierarchy_levels[rows]
+        similarity = np.nan_to_num(candidates.similarity, nan=0.0)
+        match_levels = candidates.match_level.astype(np.float64)
+        
+        scores = np.zeros(n_candidates, dtype=np.float64)
+        scores += np.where(is_terminal, 0.3, 0.0)        # Bonus por tipo terminal
+        scores += np.where(levels >= 4, 0.2, 0.0)        # Bonus por nivel jerárquico específico
+        scores += similarity * 0.5                       # Bonus por similitud precomputada
+        scores += (match_levels / 8) * 0.3               # Bonus por match jerárquico
+        
+        # Selección top_k con argpartition; empates en el borde por orden original
+        if top_k is not None and top_k < n_candidates:
+            if top_k <= 0:
+                return []
+            partition = np.argpartition(-scores, top_k - 1)[:top_k]
+            kth_score = scores[partition].min()
+            above = np.flatnonzero(scores > kth_score)
+            ties = np.flatnonzero(scores == kth_score)[:top_k - len(above)]
+            selected = np.concatenate([above, ties])
+        else:
+            selected = np.arange(n_candidates)
+        order = selected[np.lexsort((selected, -scores[selected]))]
         
-        return unique
-    
-    def _score_candidates(self, candidates: List[NCMPosition], query: str) -> List[Dict[str, Any]]:
-        """Asigna puntajes a candidatos"""
+        # Solo los sobrevivientes se materializan y llevan candidate_info completo
         scored = []
-        
-        for candidate in candidates:
-            score = 0.0
-            
-            # Bonus por tipo terminal
-            if candidate.record_type == 'terminal':
-                score += 0.3
-            
-            # Bonus por nivel jerárquico específico
-            if candidate.hierarchy_level >= 4:
-                score += 0.2
-            
-            # Bonus por similitud precomputada
-            if hasattr(candidate, 'similarity_score'):
-                score += candidate.similarity_score * 0.5
-            
-            # Bonus por match jerárquico
-            if hasattr(candidate, 'hierarchy_match_level'):
-                score += (candidate.hierarchy_match_level / 8) * 0.3
-            
+        for i in order:
+            position = self.data_loader.position_at(int(rows[i]))
+            score = float(scores[i])
             scored.append({
-                'position': candidate,
+                'position': position,
                 'score': score,
                 'candidate_info': {
-                    'code': candidate.code,
-                    'sim': candidate.sim,
-                    'description': candidate.description,
+                    'code': position.code,
+                    'sim': position.sim,
+                    'description': position.description,
                     'score': round(score, 3),
-                    'match_reasons': self._get_match_reasons(candidate, query)
+                    'match_reasons': self._get_match_reasons(candidates, i, bool(is_terminal[i]))
                 }
             })
         
-        return sorted(scored, key=lambda x: x['score'], reverse=True)
+        return scored
     
-    def _get_match_reasons(self, candidate: NCMPosition, query: str) -> List[str]:
-        """Obtiene razones de coincidencia"""
+    def _get_match_reasons(self, candidates: NCMCandidates, index: int, is_terminal: bool) -> List[str]:
+        """Obtiene razones de coincidencia de un candidato"""
         reasons = []
         
-        if hasattr(candidate, 'similarity_score'):
-            reasons.append(f"Similitud descripción: {candidate.similarity_score:.2f}")
+        if not np.isnan(candidates.similarity[index]):
+            reasons.append(f"Similitud descripción: {candidates.similarity[index]:.2f}")
         
-        if hasattr(candidate, 'hierarchy_match_level'):
-            reasons.append(f"Match jerárquico nivel {candidate.hierarchy_match_level}")
+        if not np.isnan(candidates.fuzzy[index]):
+            reasons.append(f"Similitud por trigramas: {candidates.fuzzy[index]:.2f}")
         
-        if candidate.record_type == 'terminal':
+        if candidates.match_level[index]:
+            reasons.append(f"Match jerárquico nivel {int(candidates.match_level[index])}")
+        
+        if is_terminal:
             reasons.append("Registro terminal (específico)")
         
         return reasons
     
-    def _row_to_position(self, row) -> NCMPosition:
-        """Convierte fila de DataFrame a NCMPosition"""
-        return NCMPosition(
-            file=row.get('file', ''),
-            chapter=int(row.get('chapter', 0)),
-            code=row.get('code', ''),
-            sim=row.get('sim', ''),
-            description=row.get('description', ''),
-            aec=float(row.get('aec', 0)),
-            die=float(row.get('die', 0)),
-            te=float(row.get('te', 0)),
-            in_field=row.get('in', ''),
-            de=float(row.get('de', 0)),
-            re=float(row.get('re', 0)),
-            code_searchable=row.get('code_searchable', ''),
-            parent=row.get('parent') if pd.notna(row.get('parent')) else None,
-            parent_searchable=row.get('parent_searchable') if pd.notna(row.get('parent_searchable')) else None,
-            hierarchy_level=int(row.get('hierarchy_level', 0)),
-            record_type=row.get('record_type', 'unknown')
-        )
-    
     def _format_exact_result(self, query: str, position: NCMPosition, method: str) -> Dict[str, Any]:
         """Formatea resultado de búsqueda exacta"""
         return {
@@ -583,17 +887,16 @@ class AISelector:
     
     def __init__(self, api_key: str = None):
         self.api_key = api_key or OPENAI_API_KEY
-        self.client = None
+        self.available = bool(OPENAI_AVAILABLE and self.api_key)
         
-        if OPENAI_AVAILABLE and self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
+        if self.available:
             logger.info("Selector IA inicializado correctamente")
         else:
             logger.warning("Selector IA no disponible (falta OpenAI o API key)")
     
     async def select_best_candidate(self, candidates: List[Dict], original_query: str) -> Dict[str, Any]:
         """Selecciona el mejor candidato usando IA"""
-        if not self.client or not candidates:
+        if not self.available or not candidates:
             return self._fallback_selection(candidates, original_query)
         
         try:
@@ -623,7 +926,8 @@ CANDIDATOS DISPONIBLES:
 Selecciona el código más apropiado considerando especificidad y relevancia.
 """
             
-            response = self.client.chat.completions.create(
+            response_text = await async_chat_completion(
+                get_async_openai_client(self.api_key),
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -633,7 +937,7 @@ Selecciona el código más apropiado considerando especificidad y relevancia.
                 response_format={"type": "json_object"}
             )
             
-            ai_decision = json.loads(response.choices[0].message.content)
+            ai_decision = json.loads(response_text)
             
             # Encontrar el candidato seleccionado
             selected_candidate = self._find_selected_candidate(candidates, ai_decision)
@@ -770,25 +1074,8 @@ class NCMPositionMatcher:
             # Paso 2: Búsqueda aproximada
             candidates = self.search_engine.approximate_search(input_query)
             
-            if not candidates:
-                processing_time = (datetime.now() - start_time).total_seconds() * 1000
-                return {
-                    "input": input_query,
-                    "match_type": "sin_resultados",
-                    "error": "No se encontraron candidatos relevantes",
-                    "processing_time_ms": round(processing_time, 2),
-                    "metadata": {"classification_method": "no_matches"}
-                }
-            
             # Paso 3: Selección por IA
-            result = await self.ai_selector.select_best_candidate(candidates, input_query)
-            
-            processing_time = (datetime.now() - start_time).total_seconds() * 1000
-            result["processing_time_ms"] = round(processing_time, 2)
-            result["candidates_analyzed"] = len(candidates)
-            
-            logger.info(f"Selección completada en {processing_time:.2f}ms con {len(candidates)} candidatos")
-            return result
+            return await self.select_from_candidates(input_query, candidates, start_time)
             
         except Exception as e:
             processing_time = (datetime.now() - start_time).total_seconds() * 1000
@@ -801,6 +1088,28 @@ class NCMPositionMatcher:
                 "metadata": {"classification_method": "error"}
             }
     
+    async def select_from_candidates(self, input_query: str, candidates: List[Dict[str, Any]],
+                                     start_time: datetime) -> Dict[str, Any]:
+        """Selecciona (IA o fallback) entre los candidatos de la búsqueda aproximada"""
+        if not candidates:
+            processing_time = (datetime.now() - start_time).total_seconds() * 1000
+            return {
+                "input": input_query,
+                "match_type": "sin_resultados",
+                "error": "No se encontraron candidatos relevantes",
+                "processing_time_ms": round(processing_time, 2),
+                "metadata": {"classification_method": "no_matches"}
+            }
+        
+        result = await self.ai_selector.select_best_candidate(candidates, input_query)
+        
+        processing_time = (datetime.now() - start_time).total_seconds() * 1000
+        result["processing_time_ms"] = round(processing_time, 2)
+        result["candidates_analyzed"] = len(candidates)
+        
+        logger.info(f"Selección completada en {processing_time:.2f}ms con {len(candidates)} candidatos")
+        return result
+    
     def get_statistics(self) -> Dict[str, Any]:
         """Obtiene estadísticas del dataset cargado"""
         data = self.data_loader.data
@@ -828,12 +1137,13 @@ def find_latest_ncm_dataset(fallback_path: str = None) -> str:
     # Buscar en la carpeta de resultados
     results_dir = Path("pdf_reader/ncm/resultados_ncm_hybrid")
     if results_dir.exists():
-        # Buscar archivos de dataset consolidado
-        dataset_files = list(results_dir.glob("dataset_ncm_HYBRID_FIXED_*.csv"))
-        if dataset_files:
-            # Retornar el más reciente
-            latest_file = max(dataset_files, key=lambda f: f.stat().st_mtime)
-            return str(latest_file)
+        # Buscar archivos de dataset consolidado (CSV preferido, JSON como alternativa)
+        for pattern in ("dataset_ncm_HYBRID_FIXED_*.csv", "dataset_ncm_HYBRID_FIXED_*.json"):
+            dataset_files = list(results_dir.glob(pattern))
+            if dataset_files:
+                # Retornar el más reciente
+                latest_file = max(dataset_files, key=lambda f: f.stat().st_mtime)
+                return str(latest_file)
     
     # Usar fallback si no se encuentra nada
     return fallback_path or 'pdf_reader/ncm/resultados_ncm_hybrid/dataset_ncm_HYBRID_FIXED_20250721_175449.csv'
@@ -860,14 +1170,16 @@ Ejemplos de uso:
   python ncm_position_matcher.py --input "8528.72.00" --data posiciones.csv
   python ncm_position_matcher.py --input "televisor LCD" --data posiciones.csv --ai
   python ncm_position_matcher.py --batch productos.json --output resultados.json
+  python ncm_position_matcher.py --batch consultas.txt --output resultados.jsonl --workers 8
   python ncm_position_matcher.py --stats --data posiciones.csv
         """
     )
     
     parser.add_argument('--input', '-i', type=str, help='Código NCM o descripción a buscar')
-    parser.add_argument('--data', '-d', type=str, default=None, help='Archivo CSV con datos NCM (usa el más reciente si no se especifica)')
+    parser.add_argument('--data', '-d', type=str, default=None, help='Archivo CSV o JSON con datos NCM (usa el más reciente si no se especifica)')
     parser.add_argument('--output', '-o', type=str, help='Archivo de salida para resultados (opcional)')
-    parser.add_argument('--batch', '-b', type=str, help='Archivo JSON con múltiples consultas')
+    parser.add_argument('--batch', '-b', type=str, help='Archivo con múltiples consultas (.json lista, .jsonl o texto, una por línea)')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Procesos para búsquedas aproximadas en lote (default: CPUs)')
     parser.add_argument('--stats', action='store_true', help='Mostrar estadísticas del dataset')
     parser.add_argument('--ai', action='store_true', help='Habilitar selección por IA (requiere OpenAI API key)')
     parser.add_argument('--verbose', '-v', action='store_true', help='Logging detallado')
@@ -927,25 +1239,31 @@ Ejemplos de uso:
                 print(f"❌ Error: Archivo de lotes no encontrado: {args.batch}")
                 return 1
             
-            with open(args.batch, 'r', encoding='utf-8') as f:
-                batch_data = json.load(f)
+            from ncm_batch_matcher import NCMBatchMatcher, load_batch_queries
             
-            if not isinstance(batch_data, list):
-                print(f"❌ Error: El archivo de lotes debe contener una lista de consultas")
+            try:
+                queries = load_batch_queries(args.batch)
+            except ValueError as e:
+                print(f"❌ Error: {e}")
                 return 1
             
-            print(f"\n🔄 Procesando {len(batch_data)} consultas...")
-            results = []
-            
-            for i, query in enumerate(batch_data, 1):
-                print(f"Procesando {i}/{len(batch_data)}: {query}")
-                result = await matcher.match_position(str(query))
-                results.append(result)
+            batch_matcher = NCMBatchMatcher(args.data, workers=args.workers, matcher=matcher)
+            output_file = args.output or f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+            print(f"\n🔄 Procesando {len(queries):,} consultas ({batch_matcher.workers} procesos)...")
             
-            # Guardar resultados
-            output_file = args.output or f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
+            if output_file.endswith('.json'):
+                # Formato histórico: lista JSON en el orden de entrada
+                results = [None] * len(queries)
+                async for index, result in batch_matcher.iter_matches(queries):
+                    results[index] = result
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, indent=2, ensure_ascii=False)
+            else:
+                stats = await batch_matcher.run(queries, output_file)
+                print(f"\n📊 LOTE: {stats['total']:,} consultas en {stats['elapsed_seconds']:.1f}s "
+                      f"({stats['queries_per_second']}/s)")
+                print(f"   ✅ Exactas: {stats['exacto']:,} | 🔍 Aproximadas: {stats['aproximado']:,} | "
+                      f"∅ Sin resultados: {stats['sin_resultados']:,} | ❌ Errores: {stats['error']:,}")
             
             print(f"\n✅ Procesamiento completado. Resultados en: {output_file}")
             return 0
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+🧭 NCM Semantic Index - Recuperación semántica local sobre descripciones NCM
+============================================================================
+
+Índice de vectores densos precomputados para todas las posiciones de la base
+oficial NCM, con búsqueda exacta de vecinos más cercanos en CPU. Permite
+obtener una lista corta de posiciones plausibles para una descripción de
+producto sin ningún round-trip de red.
+
+Funcionalidades:
+- Embedding por hashing (palabras con stemming + trigramas), sin red ni modelos
+- Modelo local opcional de sentence-transformers (NCM_EMBEDDING_MODEL)
+- Contexto jerárquico: cada posición se embebe junto a la descripción de su
+  código y de su subpartida ("Los demás" deja de ser ambiguo)
+- Matriz float16 en disco (.npz), invalidada si cambia el dataset
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import json
+import zlib
+import logging
+import threading
+import importlib.util
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any, Union
+
+import numpy as np
+
+from ncm_text_index import tokenize, trigrams
+
+logger = logging.getLogger(__name__)
+
+# sentence-transformers es opcional (se importa solo si se usa)
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec('sentence_transformers') is not None
+
+# Peso de cada nivel de contexto al componer el vector de una posición
+CONTEXT_WEIGHTS = (1.0, 0.6, 0.3)  # descripción propia, código, subpartida
+
+
+class HashingEmbedder:
+    """
+    Embedding determinístico por feature hashing, sin dependencias ni red
+
+    Cada texto se representa con sus términos (stemming) y, con menor peso, sus
+    trigramas de caracteres, ponderados por IDF sobre el corpus NCM; ambos se
+    proyectan a `dim` dimensiones con signo vía CRC32 y el vector resultante se
+    normaliza (L2).
+    """
+
+    def __init__(self, dim: int = 512, trigram_weight: float = 0.5):
+        self.dim = dim
+        self.trigram_weight = trigram_weight
+        self.name = f"hashing-v1-{dim}"
+        self.idf: Dict[str, float] = {}
+        self.default_idf = 1.0
+
+    def _raw_features(self, text: str) -> List[Tuple[str, float]]:
+        return [(t, 1.0) for t in tokenize(text)] + [(g, self.trigram_weight) for g in trigrams(text)]
+
+    def fit(self, texts: List[str]) -> None:
+        """Calcula IDF de términos y trigramas sobre el corpus"""
+        document_frequency: Dict[str, int] = {}
+        for text in texts:
+            for feature in {f for f, _ in self._raw_features(text or '')}:
+                document_frequency[feature] = document_frequency.get(feature, 0) + 1
+        n_texts = len(texts)
+        self.idf = {f: float(np.log((1 + n_texts) / (1 + df)) + 1.0) for f, df in document_frequency.items()}
+        # Features nunca vistas: tan informativas como la más rara del corpus
+        self.default_idf = float(np.log(1 + n_texts) + 1.0)
+
+    def state(self) -> Dict[str, Any]:
+        return {'idf': self.idf, 'default_idf': self.default_idf}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.idf = state.get('idf', {})
+        self.default_idf = state.get('default_idf', 1.0)
+
+    def _features(self, text: str) -> Dict[int, float]:
+        vector: Dict[int, float] = {}
+        for feature, weight in self._raw_features(text):
+            h = zlib.crc32(feature.encode('utf-8'))
+            bucket = h % self.dim
+            sign = 1.0 if (h // self.dim) & 1 else -1.0
+            value = sign * weight * self.idf.get(feature, self.default_idf)
+            vector[bucket] = vector.get(bucket, 0.0) + value
+        return vector
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Vectores normalizados (float32) para una lista de textos"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for bucket, value in self._features(text or '').items():
+                matrix[i, bucket] = value
+        return _normalize_rows(matrix)
+
+
+class SentenceTransformerEmbedder:
+    """Embedding con un modelo local de sentence-transformers (opcional)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+        self.name = 'st-' + model_name.replace('/', '_')
+
+    def fit(self, texts: List[str]) -> None:
+        """El modelo ya viene entrenado"""
+
+    def state(self) -> Dict[str, Any]:
+        return {}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Sin estado adicional"""
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=256, show_progress_bar=False)
+        return _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def get_default_embedder():
+    """Modelo local si NCM_EMBEDDING_MODEL está configurado y disponible; si no, hashing"""
+    model_name = os.getenv('NCM_EMBEDDING_MODEL')
+    if model_name and SENTENCE_TRANSFORMERS_AVAILABLE:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo cargar el modelo de embeddings {model_name}: {e}. Usando hashing.")
+    return HashingEmbedder()
+
+
+def _column(records, name: str) -> List[Any]:
+    if hasattr(records, 'column'):
+        return list(records.column(name))
+    return [r.get(name) for r in records]
+
+
+def _context_text_ids(records) -> Tuple[List[str], np.ndarray]:
+    """
+    Textos únicos y, por fila, los ids de (descripción propia, descripción del
+    código, descripción de la subpartida). -1 indica contexto ausente o repetido.
+    """
+    descriptions = [d or '' for d in _column(records, 'description')]
+    codes = [c or '' for c in _column(records, 'code_searchable')]
+
+    text_ids: Dict[str, int] = {}
+    own = np.fromiter((text_ids.setdefault(d, len(text_ids)) for d in descriptions),
+                      dtype=np.int64, count=len(descriptions))
+
+    # Primera descripción de cada código y de cada subpartida (6 dígitos)
+    first_by_code: Dict[str, int] = {}
+    first_by_subheading: Dict[str, int] = {}
+    for text_id, code in zip(own.tolist(), codes):
+        first_by_code.setdefault(code, text_id)
+        first_by_subheading.setdefault(code[:6], text_id)
+
+    code_ctx = np.fromiter((first_by_code[c] for c in codes), dtype=np.int64, count=len(codes))
+    subheading_ctx = np.fromiter((first_by_subheading[c[:6]] for c in codes), dtype=np.int64, count=len(codes))
+    subheading_ctx[(subheading_ctx == code_ctx) | (subheading_ctx == own)] = -1
+    code_ctx[code_ctx == own] = -1
+
+    return list(text_ids), np.stack([own, code_ctx, subheading_ctx], axis=1)
+
+
+class NCMSemanticIndex:
+    """
+    Matriz de embeddings de todas las posiciones NCM con búsqueda de vecinos más cercanos
+
+    Las posiciones con la misma combinación de descripción y contexto comparten
+    vector: se guardan los vectores únicos (float16) y, por fila, el índice de su vector.
+    """
+
+    def __init__(self, records, embedder=None, dataset_path: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            records: Registros NCM (lista de dicts o dataset compilado)
+            embedder: Embedder a utilizar. Si None, `get_default_embedder()`
+            dataset_path: Dataset de origen; si se indica, la matriz se guarda a su lado
+        """
+        self.embedder = embedder or get_default_embedder()
+        self.n_rows = len(records)
+        self.cache_path = self._cache_path(dataset_path) if dataset_path else None
+
+        cached = self._load_cached(dataset_path)
+        if cached is not None:
+            self.vectors, self.row_vector = cached
+        else:
+            self.vectors, self.row_vector = self._build(records)
+            if dataset_path:
+                self._save(dataset_path)
+        # float16 en disco; float32 en memoria para que cada consulta sea un único matvec
+        self._search_matrix = self.vectors.astype(np.float32)
+
+    def _cache_path(self, dataset_path: Union[str, Path]) -> Path:
+        # Prefijo propio: no debe coincidir con el patrón de búsqueda de datasets (dataset_ncm_*.json)
+        dataset_path = Path(dataset_path)
+        return dataset_path.with_name(f"semantic_index.{self.embedder.name}.{dataset_path.stem}.npz")
+
+    def _fingerprint(self, dataset_path: Union[str, Path]) -> Dict[str, Any]:
+        stat = Path(dataset_path).stat()
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'n_rows': self.n_rows, 'embedder': self.embedder.name}
+
+    def _load_cached(self, dataset_path) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if not self.cache_path or not self.cache_path.exists():
+            return None
+        meta_path = self.cache_path.with_suffix('.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('source') != self._fingerprint(dataset_path):
+                return None
+            with np.load(self.cache_path) as stored:
+                vectors, row_vector = stored['vectors'], stored['row_vector']
+            if row_vector.shape[0] != self.n_rows:
+                return None
+            self.embedder.load_state(meta.get('embedder_state', {}))
+            logger.info(f"Índice semántico cargado: {self.cache_path.name}")
+            return vectors, row_vector
+        except Exception as e:
+            logger.debug(f"No se pudo leer índice semántico {self.cache_path}: {e}")
+            return None
+
+    def _build(self, records) -> Tuple[np.ndarray, np.ndarray]:
+        texts, context_ids = _context_text_ids(records)
+        unique_contexts, row_vector = np.unique(context_ids, axis=0, return_inverse=True)
+        logger.info(f"Construyendo índice semántico ({self.embedder.name}): "
+                    f"{self.n_rows:,} posiciones, {len(unique_contexts):,} vectores únicos")
+        self.embedder.fit(texts)
+        text_vectors = self.embedder.embed(texts)
+
+        vectors = np.zeros((len(unique_contexts), text_vectors.shape[1]), dtype=np.float32)
+        for level, weight in enumerate(CONTEXT_WEIGHTS):
+            ids = unique_contexts[:, level]
+            present = ids >= 0
+            vectors[present] += weight * text_vectors[ids[present]]
+        return _normalize_rows(vectors).astype(np.float16), row_vector.reshape(-1).astype(np.int32)
+
+    def _save(self, dataset_path) -> None:
+        tmp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, vectors=self.vectors, row_vector=self.row_vector)
+            os.replace(tmp_path, self.cache_path)
+            with open(self.cache_path.with_suffix('.json'), 'w', encoding='utf-8') as f:
+                json.dump({'source': self._fingerprint(dataset_path),
+                           'embedder_state': self.embedder.state()}, f, ensure_ascii=False)
+        except Exception as e:
+            logger.debug(f"No se pudo guardar índice semántico {self.cache_path}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def search(self, text: str, top_k: int = 10, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Vecinos más cercanos (similitud coseno) de una descripción de producto
+
+        Returns:
+            Hasta top_k tuplas (fila, score) de mayor a menor score
+        """
+        if not text or not text.strip() or top_k <= 0 or not self.n_rows:
+            return []
+        query = self.embedder.embed([text])[0]
+        if not query.any():
+            return []
+
+        scores = (self._search_matrix @ query)[self.row_vector]
+
+        k = min(top_k, self.n_rows)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.lexsort((best, -scores[best]))]
+        return [(int(row), float(scores[row])) for row in best if scores[row] > min_score]
+
+
+# Índices compartidos por integración NCM (uno por proceso)
+_semantic_indexes = weakref.WeakKeyDictionary()
+_semantic_lock = threading.Lock()
+
+
+def get_semantic_index(integration=None) -> Optional[NCMSemanticIndex]:
+    """
+    Índice semántico de la integración NCM (por defecto, la instancia compartida).
+    Se construye una sola vez por proceso y se reutiliza desde disco entre procesos.
+    """
+    if integration is None:
+        from ncm_official_integration import get_ncm_integration
+        integration = get_ncm_integration()
+    if not getattr(integration, 'ncm_data', None):
+        return None
+
+    index = _semantic_indexes.get(integration)
+    if index is None:
+        with _semantic_lock:
+            index = _semantic_indexes.get(integration)
+            if index is None:
+                index = NCMSemanticIndex(integration.ncm_data, dataset_path=integration.dataset_path)
+                _semantic_indexes[integration] = index
+    return index
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+🔎 NCM Text Index - Índice de texto completo para descripciones NCM
+===================================================================
+
+Índice invertido en memoria sobre las descripciones de la base oficial NCM,
+sin servicios externos de búsqueda.
+
+Funcionalidades:
+- Tokenización para español con plegado de acentos (camión -> camion)
+- Stemming liviano de plurales y género (televisores -> televisor)
+- Listas de postings (término -> documentos, frecuencias)
+- Ranking BM25 que solo recorre documentos que comparten términos con la consulta
+- Índice de trigramas de caracteres para coincidencias tolerantes a errores de tipeo
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import re
+import math
+import logging
+import unicodedata
+from itertools import islice
+from typing import Dict, List, Optional, Tuple, Iterable, Iterator
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Palabras funcionales del español (y algunas del inglés) sin valor discriminante
+STOPWORDS = frozenset({
+    'a', 'al', 'con', 'de', 'del', 'e', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'que', 'se', 'sin', 'su', 'sus', 'u', 'un', 'una',
+    'unos', 'unas', 'y', 'incluso', 'excepto',
+    'and', 'for', 'of', 'the', 'with',
+})
+
+
+def fold_accents(text: str) -> str:
+    """Pasa a minúsculas y elimina acentos/diacríticos (ñ -> n)"""
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    return decomposed.encode('ascii', 'ignore').decode('ascii')
+
+
+def stem(token: str) -> str:
+    """
+    Stemmer liviano para español: unifica plurales y género.
+
+    No pretende ser un stemmer lingüístico completo; alcanza para que
+    "televisores", "televisor", "eléctricas" y "eléctrico" compartan término.
+    """
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith('ces'):
+        token = token[:-3] + 'z'
+    elif token.endswith('es') and len(token) > 4 and token[-3] not in 'aeiou':
+        token = token[:-2]
+    elif token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aoe':
+        token = token[:-1]
+    return token
+
+
+def words(text: str) -> List[str]:
+    """Palabras normalizadas (sin acentos, sin stopwords, sin stemming)"""
+    return [w for w in _TOKEN_RE.findall(fold_accents(text)) if w not in STOPWORDS]
+
+
+def tokenize(text: str) -> List[str]:
+    """Términos indexables de un texto: palabras normalizadas + stemming"""
+    return [stem(w) for w in words(text)]
+
+
+def trigrams(text: str) -> set:
+    """Trigramas de caracteres de cada palabra, con relleno al inicio y al final"""
+    grams = set()
+    for word in words(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class BM25Index:
+    """Índice invertido con ranking BM25 sobre una colección de documentos"""
+
+    def __init__(self, documents: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths: List[int] = []
+        # Las descripciones NCM se repiten mucho ("Los demás", "De algodón")
+        term_cache: Dict[str, List[str]] = {}
+        for doc_id, text in enumerate(documents):
+            text = text or ''
+            terms = term_cache.get(text)
+            if terms is None:
+                terms = term_cache[text] = tokenize(text)
+            lengths.append(len(terms))
+            for term in terms:
+                doc_tf = postings.setdefault(term, {})
+                doc_tf[doc_id] = doc_tf.get(doc_id, 0) + 1
+
+        self.n_docs = len(lengths)
+        self.doc_lengths = np.asarray(lengths, dtype=np.float64)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.n_docs else 0.0
+
+        # Postings compactos: arrays de ids y frecuencias por término
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (np.fromiter(doc_tf.keys(), dtype=np.int32, count=len(doc_tf)),
+                   np.fromiter(doc_tf.values(), dtype=np.float64, count=len(doc_tf)))
+            for term, doc_tf in postings.items()
+        }
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (self.n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            for term, (ids, _) in self.postings.items()
+        }
+        logger.debug(f"Índice BM25: {self.n_docs:,} documentos, {len(self.postings):,} términos")
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Documentos que comparten términos con la consulta, ordenados por BM25
+
+        Returns:
+            Lista de (doc_id, score) de mayor a menor score
+        """
+        return list(islice(self.iter_search(query), top_k))
+
+    def iter_search(self, query: str) -> Iterator[Tuple[int, float]]:
+        """
+        Igual que search, pero entrega los resultados de a uno (en el mismo orden)
+
+        Conviene cuando quien consume filtra y corta antes del final: no se
+        materializan tuplas para los miles de documentos de cola.
+        """
+        terms = set(tokenize(query))
+        ids_parts, score_parts = [], []
+        for term in terms:
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ids, tf = entry
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / (self.avg_doc_length or 1.0))
+            ids_parts.append(ids)
+            score_parts.append(self.idf[term] * tf * (self.k1 + 1) / (tf + norm))
+
+        if not ids_parts:
+            return
+
+        # Acumular solo sobre los documentos tocados por algún término
+        doc_ids, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        order = np.argsort(-scores, kind='stable')
+        for i in order:
+            yield int(doc_ids[i]), float(scores[i])
+
+
+class TrigramIndex:
+    """
+    Índice de trigramas de caracteres (trigrama -> documentos) para búsqueda difusa
+
+    La similitud entre consulta y documento es el coeficiente de Dice sobre
+    sus conjuntos de trigramas, por lo que tolera errores de tipeo y variantes
+    ("televisro" ~ "televisores"). Los textos repetidos se indexan una sola vez.
+    """
+
+    def __init__(self, documents: Iterable[str]):
+        text_ids: Dict[str, int] = {}
+        doc_text: List[int] = []
+        for text in documents:
+            doc_text.append(text_ids.setdefault(text or '', len(text_ids)))
+
+        postings: Dict[str, List[int]] = {}
+        sizes: List[int] = []
+        for text_id, text in enumerate(text_ids):
+            grams = trigrams(text)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(text_id)
+
+        self.n_docs = len(doc_text)
+        self.n_texts = len(sizes)
+        self.text_sizes = np.asarray(sizes, dtype=np.float64)
+        self.postings: Dict[str, np.ndarray] = {
+            gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()
+        }
+
+        # Documentos (filas) de cada texto único, en orden de aparición
+        doc_text_arr = np.asarray(doc_text, dtype=np.int64)
+        order = np.argsort(doc_text_arr, kind='stable')
+        bounds = np.searchsorted(doc_text_arr[order], np.arange(self.n_texts + 1))
+        self._text_docs = [order[bounds[i]:bounds[i + 1]] for i in range(self.n_texts)]
+        logger.debug(f"Índice de trigramas: {self.n_texts:,} textos únicos, {len(self.postings):,} trigramas")
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def search(self, query: str, top_k: int = 20, threshold: float = 0.3) -> List[Tuple[int, float]]:
+        """
+        Documentos con similitud de trigramas >= threshold
+
+        Returns:
+            Hasta top_k tuplas (doc_id, similitud) de mayor a menor similitud
+        """
+        query_grams = trigrams(query)
+        parts = [self.postings[g] for g in query_grams if g in self.postings]
+        if not parts or top_k <= 0:
+            return []
+
+        shared = np.bincount(np.concatenate(parts), minlength=self.n_texts)
+        candidates = np.flatnonzero(shared)
+        similarity = 2.0 * shared[candidates] / (len(query_grams) + self.text_sizes[candidates])
+        keep = similarity >= threshold
+        candidates, similarity = candidates[keep], similarity[keep]
+
+        results: List[Tuple[int, float]] = []
+        for i in np.argsort(-similarity, kind='stable'):
+            for doc_id in self._text_docs[candidates[i]]:
+                results.append((int(doc_id), float(similarity[i])))
+                if len(results) >= top_k:
+                    return results
+        return results
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark del extractor NCM híbrido
+=====================================
+
+Mide páginas/segundo de la extracción de PDFs con 1..N procesos sobre un
+subconjunto de capítulos, y verifica que todas las corridas den exactamente
+los mismos registros que la secuencial.
+
+Con --filas mide filas/segundo de la clasificación de filas (identify_row_structure
++ validate_extracted_record) sobre las filas de todos los capítulos, rearmadas
+desde el dataset consolidado (o las líneas de texto de los PDFs con --pdf-text).
+
+Uso:
+    python benchmark_extractor.py --chapters 1 2 3 --workers 1 2 4
+    python benchmark_extractor.py --filas
+    python benchmark_extractor.py --filas --pdf-text --chapters 1 2
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import io
+import os
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+
+import pdfplumber
+
+from ncm_extractor_hybrid_fix import NCM_CODE_IN_TEXT_RE, NCMExtractorHybridFix, NCMTableProcessor
+
+DEFAULT_DATASET_GLOB = "dataset_ncm_HYBRID_FIXED_*.json"
+
+
+def run_extraction(pdf_dir: Path, chapters, workers: int):
+    """Extrae los capítulos sin procesarlos ni guardarlos; devuelve (registros, páginas, segundos)"""
+    with tempfile.TemporaryDirectory() as results_dir:
+        extractor = NCMExtractorHybridFix(pdf_dir=pdf_dir, results_dir=results_dir, workers=workers)
+        chapter_files = [(c, pdf_dir / f"capitulo_{c:02d}.pdf") for c in chapters]
+        chapter_files = [(c, f) for c, f in chapter_files if f.exists()]
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if workers > 1:
+                results = list(extractor._extract_chapters_parallel(chapter_files, workers))
+            else:
+                results = [extractor.extract_from_pdf(f, c) for c, f in chapter_files]
+        elapsed = time.perf_counter() - start
+
+    records = [records for records, _ in results]
+    pages = sum(max(stats['total_pages'] - 2, 0) for _, stats in results)
+    return records, pages, elapsed
+
+
+def dataset_rows(dataset_path: Path):
+    """Filas (celdas) rearmadas desde los registros del dataset consolidado (corpus de test_ncm_table_processor.py)"""
+    def number(value):
+        return str(int(value)) if value == int(value) else str(value)
+
+    with open(dataset_path, encoding='utf-8') as f:
+        records = json.load(f)['records']
+    rows = []
+    for record in records:
+        row = [record['code'] or '', record['sim'] or ''] + (record['description'] or '').split()
+        row += [number(record[field]) for field in ('aec', 'die', 'te')]
+        if record['in']:
+            row.append(record['in'])
+        row += [number(record[field]) for field in ('de', 're')]
+        rows.append([cell for cell in row if cell])
+    return rows
+
+
+def pdf_text_rows(pdf_dir: Path, chapters):
+    """Filas de las líneas de texto con código NCM de los PDFs (parsear los PDFs es lento)"""
+    rows = []
+    for chapter in chapters:
+        pdf_file = pdf_dir / f"capitulo_{chapter:02d}.pdf"
+        if not pdf_file.exists():
+            continue
+        with pdfplumber.open(pdf_file) as pdf:
+            for page in pdf.pages[2:]:
+                for line in (page.extract_text() or '').split('\n'):
+                    if NCM_CODE_IN_TEXT_RE.search(line):
+                        rows.append(line.split())
+                page.close()
+    return rows
+
+
+def benchmark_rows(rows, repeat: int = 3):
+    """Mejor filas/segundo de `repeat` pasadas de clasificación sobre las filas"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        valid = 0
+        for row in rows:
+            record = NCMTableProcessor.identify_row_structure(row)
+            if record and NCMTableProcessor.validate_extracted_record(record):
+                valid += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return valid, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extracción NCM por cantidad de procesos")
+    parser.add_argument('--chapters', type=int, nargs='+', default=[1, 2, 3], help='Capítulos a extraer')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, os.cpu_count() or 1}), help='Cantidades de procesos a medir')
+    parser.add_argument('--pdf-dir', default=str(Path(__file__).parent / 'ncm_pdf'), help='Directorio de PDFs')
+    parser.add_argument('--filas', action='store_true', help='Medir la clasificación de filas en lugar de la extracción')
+    parser.add_argument('--pdf-text', action='store_true', help='Con --filas: usar el texto de los PDFs de --chapters')
+    parser.add_argument('--dataset', default=None, help='Con --filas: dataset consolidado (default: el más reciente)')
+    args = parser.parse_args()
+
+    if args.filas:
+        if args.pdf_text:
+            rows = pdf_text_rows(Path(args.pdf_dir), args.chapters)
+            source = f"texto de los capítulos {args.chapters}"
+        else:
+            dataset = Path(args.dataset) if args.dataset else max(
+                (Path(__file__).parent / 'resultados_ncm_hybrid').glob(DEFAULT_DATASET_GLOB),
+                key=lambda f: f.stat().st_mtime)
+            rows = dataset_rows(dataset)
+            source = dataset.name
+        valid, elapsed = benchmark_rows(rows)
+        print(f"⏱️ Clasificación de filas - {source}")
+        print("-" * 60)
+        print(f"📋 {len(rows):,} filas en {elapsed:.2f}s ({len(rows) / elapsed:,.0f} filas/s) - {valid:,} registros válidos")
+        return
+
+    print(f"⏱️ Benchmark extractor NCM - capítulos {args.chapters} ({os.cpu_count()} CPUs)")
+    print("-" * 60)
+
+    baseline = None
+    for workers in args.workers:
+        records, pages, elapsed = run_extraction(Path(args.pdf_dir), args.chapters, workers)
+        if baseline is None:
+            baseline = records
+        identical = "✅ idénticos" if records == baseline else "❌ DIFERENTES"
+        total = sum(len(r) for r in records)
+        print(f"👷 {workers:>2} procesos: {pages} páginas en {elapsed:6.1f}s "
+              f"({pages / elapsed:5.2f} pág/s) - {total} registros {identical}")
+
+
+if __name__ == "__main__":
+    main()
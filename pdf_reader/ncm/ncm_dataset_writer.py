@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+📝 NCM Dataset Writer - Escritura en streaming del dataset NCM consolidado
+=========================================================================
+
+Escribe el dataset consolidado capítulo por capítulo, a medida que cada uno
+termina, sin juntar todos los registros en memoria: el pico de memoria queda
+acotado por el capítulo más grande.
+
+Funcionalidades:
+- JSON Lines compacto (un registro por línea)
+- JSON consolidado compatible ({"metadata", "records"}) armado desde el JSONL
+- CSV escrito por capítulo con columnas y tipos fijos (los mismos del Parquet)
+- Parquet opcional (requiere pyarrow)
+- Estadísticas de metadata y del reporte de validación calculadas en forma incremental
+- Archivos temporales renombrados al cerrar: nunca queda un dataset a medio escribir
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import os
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+DATASET_PREFIX = "dataset_ncm_HYBRID_FIXED_"
+DATASET_VERSION = "hybrid_fix_v2.0_intelligent_classification"
+
+FIXES_APPLIED = [
+    "eliminated_duplicate_fields",
+    "corrected_chapter_range_1_to_97",
+    "added_record_type_classification",
+    "improved_hierarchy_validation",
+    "enhanced_fiscal_data_detection",
+    "CRITICAL_FIX_tax_value_parsing_confusion_with_ncm_codes",
+    "comprehensive_record_validation",
+    "enhanced_decimal_filtering",
+    "INTELLIGENT_CLASSIFICATION_v2.0",
+    "context_aware_ncm_reference_detection",
+    "semantic_tax_validation",
+    "pattern_based_ncm_recognition"
+]
+
+
+# Esquema fijo de los registros procesados (igual en todos los capítulos), en orden de columnas
+DATASET_FIELDS = [
+    ('file', 'string'),
+    ('chapter', 'int'),
+    ('code', 'string'),
+    ('sim', 'string'),
+    ('description', 'string'),
+    ('aec', 'float'),
+    ('die', 'float'),
+    ('te', 'float'),
+    ('in', 'string'),
+    ('de', 'float'),
+    ('re', 'float'),
+    ('code_searchable', 'string'),
+    ('parent', 'string'),
+    ('parent_searchable', 'string'),
+    ('hierarchy_level', 'int'),
+    ('record_type', 'string'),
+]
+DATASET_COLUMNS = [name for name, _ in DATASET_FIELDS]
+
+# Enteros nullable: un capítulo con algún nulo no pasa a escribir 4.0 en lugar de 4
+_CSV_DTYPES = {name: {'string': 'object', 'int': 'Int64', 'float': 'float64'}[kind]
+               for name, kind in DATASET_FIELDS}
+
+
+def _parquet_schema():
+    """Esquema Parquet de DATASET_FIELDS"""
+    types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64()}
+    return pa.schema([(name, types[kind]) for name, kind in DATASET_FIELDS])
+
+
+def _csv_frame(records: List[Dict]) -> pd.DataFrame:
+    """Registros con las columnas y tipos de DATASET_FIELDS, sin inferir por capítulo"""
+    return pd.DataFrame.from_records(records, columns=DATASET_COLUMNS).astype(_CSV_DTYPES)
+
+
+class DatasetStats:
+    """Estadísticas del dataset acumuladas registro a registro"""
+
+    def __init__(self):
+        self.total_records = 0
+        self.type_stats: Dict[str, int] = {}
+        self.chapters = set()
+        self.unique_codes = set()
+        self.valid_codes = 0
+        self.valid_descriptions = 0
+        self.with_hierarchy = 0
+        self.terminal_records = 0
+
+    def add(self, record: Dict) -> None:
+        self.total_records += 1
+        record_type = record.get('record_type', 'unknown')
+        self.type_stats[record_type] = self.type_stats.get(record_type, 0) + 1
+        if record.get('chapter') is not None:
+            self.chapters.add(record['chapter'])
+        if record.get('code_searchable') is not None:
+            self.unique_codes.add(record['code_searchable'])
+        self.valid_codes += record.get('code') is not None
+        self.valid_descriptions += record.get('description') is not None
+        self.with_hierarchy += record.get('parent') is not None
+        self.terminal_records += record_type == 'terminal'
+
+    def metadata(self) -> Dict:
+        """Bloque "metadata" del JSON consolidado"""
+        return {
+            "version": DATASET_VERSION,
+            "total_records": self.total_records,
+            "extraction_method": "hybrid_pdfplumber_fixed",
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "total_chapters": len(self.chapters),
+            "chapters_processed": sorted(self.chapters),
+            "record_type_distribution": dict(self.type_stats),
+            "validation_status": "ALL_CRITICAL_FIXES_APPLIED",
+            "fixes_applied": list(FIXES_APPLIED)
+        }
+
+
+class NCMDatasetWriter:
+    """
+    Escritor en streaming del dataset consolidado
+
+    Uso:
+        with NCMDatasetWriter(results_dir) as writer:
+            for chapter_records in ...:
+                writer.write_records(chapter_records)
+        json_file, csv_file = writer.json_file, writer.csv_file
+    """
+
+    def __init__(self, results_dir: Union[str, Path], timestamp: Optional[str] = None,
+                 parquet: bool = False):
+        """
+        Args:
+            results_dir: Directorio de salida
+            timestamp: Sufijo de los archivos (default: ahora, YYYYmmdd_HHMMSS)
+            parquet: Escribir también un .parquet (requiere pyarrow)
+        """
+        if parquet and not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow no está instalado. Instalar con: pip install pyarrow")
+
+        self.results_dir = Path(results_dir)
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        stem = DATASET_PREFIX + (timestamp or datetime.now().strftime('%Y%m%d_%H%M%S'))
+        self.jsonl_file = self.results_dir / f"{stem}.jsonl"
+        self.json_file = self.results_dir / f"{stem}.json"
+        self.csv_file = self.results_dir / f"{stem}.csv"
+        self.parquet_file = self.results_dir / f"{stem}.parquet" if parquet else None
+        self.stats = DatasetStats()
+
+        self._jsonl = open(self._tmp(self.jsonl_file), 'w', encoding='utf-8')
+        self._csv_header_written = False
+        self._parquet_writer = None
+        self._closed = False
+
+    @staticmethod
+    def _tmp(path: Path) -> Path:
+        # El sufijo .tmp evita que un dataset incompleto coincida con dataset_ncm_HYBRID_FIXED_*.json
+        return path.with_name(path.name + '.tmp')
+
+    def __enter__(self) -> 'NCMDatasetWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write_records(self, records: List[Dict]) -> None:
+        """Agrega los registros (normalmente un capítulo completo) a todos los formatos"""
+        if not records:
+            return
+        for record in records:
+            self._jsonl.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self.stats.add(record)
+
+        _csv_frame(records).to_csv(self._tmp(self.csv_file), mode='a' if self._csv_header_written else 'w',
+                                   header=not self._csv_header_written, index=False, encoding='utf-8')
+        self._csv_header_written = True
+
+        if self.parquet_file is not None:
+            schema = _parquet_schema()
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(str(self._tmp(self.parquet_file)), schema)
+            self._parquet_writer.write_table(pa.Table.from_pylist(records, schema=schema))
+
+    def close(self) -> None:
+        """Completa el JSON consolidado (metadata + registros) y publica los archivos"""
+        if self._closed:
+            return
+        self._closed = True
+        self._jsonl.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+        # JSON consolidado: la metadata va primero, así que se arma al final copiando el JSONL
+        with open(self._tmp(self.json_file), 'w', encoding='utf-8') as out, \
+                open(self._tmp(self.jsonl_file), 'r', encoding='utf-8') as lines:
+            out.write('{"metadata":')
+            json.dump(self.stats.metadata(), out, ensure_ascii=False, separators=(',', ':'))
+            out.write(',"records":[')
+            for i, line in enumerate(lines):
+                if i:
+                    out.write(',\n')
+                out.write(line.rstrip('\n'))
+            out.write(']}\n')
+
+        if not self._csv_header_written:
+            _csv_frame([]).to_csv(self._tmp(self.csv_file), index=False, encoding='utf-8')
+        for path in (self.jsonl_file, self.csv_file, self.parquet_file, self.json_file):
+            if path is not None:
+                os.replace(self._tmp(path), path)
+
+    def abort(self) -> None:
+        """Descarta los archivos temporales (error a mitad de la escritura)"""
+        self._closed = True
+        self._jsonl.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        for path in (self.jsonl_file, self.json_file, self.csv_file, self.parquet_file):
+            if path is not None:
+                self._tmp(path).unlink(missing_ok=True)
@@ -5,13 +5,42 @@ Combina el motor de extracción que FUNCIONA con todas las validaciones crítica
 """
 
 import os
+import io
+import sys
 import json
 import re
+import hashlib
+import argparse
+import contextlib
+import multiprocessing
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterator, Union
 from datetime import datetime
 import pandas as pd
 import pdfplumber
+from pdfplumber.table import TableFinder, TableSettings
+from pdfplumber.utils.text import TEXTMAP_KWARGS, WordExtractor, WordMap
+
+from ncm_dataset_writer import DatasetStats, NCMDatasetWriter
+from ncm_page_cache import PAGE_CACHE_FILENAME, NCMPageCache
+
+# Versión del motor de extracción: cambiarla cuando cambien los registros que
+# produce, así la reconstrucción incremental vuelve a extraer todos los capítulos
+EXTRACTOR_VERSION = "hybrid_fix_v1.1"
+# Manifiesto con el SHA-256 de cada PDF extraído (no coincide con dataset_ncm_HYBRID_FIXED_*)
+MANIFEST_FILENAME = "extraction_manifest.json"
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
 class NCMHierarchyProcessor:
     """Procesador CORREGIDO para jerarquías y normalización"""
@@ -103,33 +132,58 @@ class NCMRecordClassifier:
         
         return 'subcategory'
 
+# Patrones compilados una sola vez (se evalúan sobre cada celda de cada fila)
+NCM_CODE_RE = re.compile(
+    r'^(?:\d{2}\.\d{2}|\d{4}\.\d{1,2}|\d{4}\.\d{2}\.\d{2}|\d{4}\.\d{2}\.\d{2}\s+[A-Z0-9]+)$'
+)
+SIM_CODE_RE = re.compile(r'^[0-9]{3}[A-Z]$')
+NCM_CODE_IN_TEXT_RE = re.compile(r'\d{4}\.\d{2}\.\d{2}')
+
+# Columnas de impuestos en el orden en que aparecen los valores de la fila
+TAX_FIELDS = ('aec', 'die', 'te', 'de', 're')
+
+# Palabras que indican referencia a otros códigos NCM
+REFERENCE_INDICATORS = (
+    'excepto', 'del ítem', 'de la subpartida', 'de los ítem', 'de la partida',
+    'citadas en el ítem', 'mencionados en', 'referidos en', 'incluidos en',
+    'contemplados en', 'comprendidos en', 'clasificados en'
+)
+
+
+def _parse_number(text: str) -> Optional[float]:
+    """Valor numérico de una celda ya limpia, o None si no es un número"""
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
 class NCMTableProcessor:
     """Procesador de tablas - USA EL MOTOR QUE FUNCIONA"""
     
     @staticmethod
     def is_ncm_code(text: str) -> bool:
         """Verifica si un texto parece un código NCM"""
-        if not text or pd.isna(text):
+        if not text:
             return False
+        if not isinstance(text, str):
+            if pd.isna(text):
+                return False
+            text = str(text)
         
-        text = str(text).strip()
-        patterns = [
-            r'^\d{2}\.\d{2}$',
-            r'^\d{4}\.\d{1,2}$',
-            r'^\d{4}\.\d{2}\.\d{2}$',
-            r'^\d{4}\.\d{2}\.\d{2}\s+[A-Z0-9]+$',
-        ]
-        
-        return any(re.match(pattern, text) for pattern in patterns)
+        return NCM_CODE_RE.match(text.strip()) is not None
     
     @staticmethod
     def is_sim_code(text: str) -> bool:
         """Verifica si un texto parece un código SIM"""
-        if not text or pd.isna(text):
+        if not text:
             return False
+        if not isinstance(text, str):
+            if pd.isna(text):
+                return False
+            text = str(text)
         
-        text = str(text).strip()
-        return re.match(r'^[0-9]{3}[A-Z]$', text) is not None
+        return SIM_CODE_RE.match(text.strip()) is not None
     
     @staticmethod
     def is_numeric_value(text: str) -> bool:
@@ -137,12 +191,7 @@ class NCMTableProcessor:
         if not text or pd.isna(text):
             return False
         
-        text = str(text).strip()
-        try:
-            float(text)
-            return True
-        except ValueError:
-            return False
+        return _parse_number(str(text).strip()) is not None
     
     @staticmethod
     def is_likely_ncm_reference(cell: str, value: float, context_parts: List[str]) -> bool:
@@ -150,6 +199,17 @@ class NCMTableProcessor:
         Algoritmo inteligente para detectar si un número es una referencia a código NCM
         en lugar de un valor de impuesto
         """
+        high_numbers = len([p for p in context_parts
+                            if NCMTableProcessor.is_numeric_value(p) and float(p) > 10000])
+        return NCMTableProcessor._is_ncm_reference(value, context_parts, high_numbers)
+    
+    @staticmethod
+    def _is_ncm_reference(value: float, context_parts: List[str], high_numbers: int) -> bool:
+        """
+        is_likely_ncm_reference con el conteo de números > 10000 del contexto ya
+        calculado (identify_row_structure lo lleva al día en lugar de recorrer
+        el contexto en cada celda)
+        """
         
         # 1. **FILTRO POR RANGO**: Valores extremadamente altos son probablemente códigos NCM
         if value > 50000:  # Impuestos > 50000% son irreales
@@ -163,15 +223,8 @@ class NCMTableProcessor:
             # 3. **ANÁLISIS DE CONTEXTO**: Verificar palabras clave en la descripción
             context_text = ' '.join(context_parts).lower() if context_parts else ''
             
-            # Palabras que indican referencia a otros códigos NCM
-            reference_indicators = [
-                'excepto', 'del ítem', 'de la subpartida', 'de los ítem', 'de la partida',
-                'citadas en el ítem', 'mencionados en', 'referidos en', 'incluidos en',
-                'contemplados en', 'comprendidos en', 'clasificados en'
-            ]
-            
             # Si hay indicadores de referencia, es muy probable que sea un código NCM
-            if any(indicator in context_text for indicator in reference_indicators):
+            if any(indicator in context_text for indicator in REFERENCE_INDICATORS):
                 return True
             
             # 4. **FILTRO POR PATRÓN NUMÉRICO**: Códigos que siguen estructura NCM
@@ -180,7 +233,7 @@ class NCMTableProcessor:
                 return True
         
         # 5. **FILTRO POR CONTEXTO SEMÁNTICO**: Si ya encontramos varios números altos
-        if len([p for p in context_parts if NCMTableProcessor.is_numeric_value(p) and float(p) > 10000]) >= 2:
+        if high_numbers >= 2:
             # Probablemente estamos en una sección de referencias múltiples
             return value > 10000
         
@@ -231,7 +284,13 @@ class NCMTableProcessor:
     
     @staticmethod
     def identify_row_structure(cells: List[str]) -> Optional[Dict]:
-        """Identifica la estructura de una fila - MOTOR QUE FUNCIONA - CORREGIDO"""
+        """
+        Identifica la estructura de una fila - MOTOR QUE FUNCIONA - CORREGIDO
+        
+        Recorre las celdas una sola vez: cada celda es código NCM (el primero),
+        código SIM (el primero), número (impuesto o referencia a otro código),
+        código IN (el primero) o parte de la descripción.
+        """
         if len(cells) < 2:
             return None
         
@@ -250,34 +309,36 @@ class NCMTableProcessor:
         ncm_found = False
         sim_found = False
         desc_parts = []
+        high_numbers = 0  # Números > 10000 ya agregados a la descripción
         numeric_values = []
         
-        for i, cell in enumerate(cells):
+        for cell in cells:
             cell = cell.strip()
             if not cell:
                 continue
             
             # Identificar código NCM
-            if NCMTableProcessor.is_ncm_code(cell) and not ncm_found:
+            if not ncm_found and NCM_CODE_RE.match(cell):
                 result['ncm'] = cell
                 ncm_found = True
                 continue
             
             # Identificar código SIM
-            if NCMTableProcessor.is_sim_code(cell) and not sim_found:
+            if not sim_found and SIM_CODE_RE.match(cell):
                 result['sim'] = cell
                 sim_found = True
                 continue
             
             # **CORRECCIÓN CRÍTICA V2**: Filtrado inteligente de valores numéricos
-            if NCMTableProcessor.is_numeric_value(cell):
+            value = _parse_number(cell)
+            if value is not None:
                 try:
-                    value = float(cell)
-                    
                     # **ALGORITMO INTELIGENTE DE CLASIFICACIÓN**
-                    if NCMTableProcessor.is_likely_ncm_reference(cell, value, desc_parts):
+                    if NCMTableProcessor._is_ncm_reference(value, desc_parts, high_numbers):
                         # Es una referencia a código NCM, agregar a descripción
                         desc_parts.append(cell)
+                        if value > 10000:
+                            high_numbers += 1
                         continue
                     
                     # **FILTROS DE VALIDACIÓN PARA IMPUESTOS**
@@ -294,25 +355,22 @@ class NCMTableProcessor:
                 continue
             
             # Todo lo demás es descripción
-            if cell and not cell.isdigit():
+            if not cell.isdigit():
                 desc_parts.append(cell)
         
+        # Solo devolver si encontramos al menos un código NCM
+        if not ncm_found:
+            return None
+        
         # Consolidar descripción
         if desc_parts:
             result['descripcion'] = ' '.join(desc_parts)
         
-        # **CORRECCIÓN CRÍTICA**: Asignar valores numéricos solo si son razonables
-        numeric_fields = ['aec', 'die', 'te', 'de', 're']
-        for i, value in enumerate(numeric_values[:len(numeric_fields)]):
-            # **VALIDACIÓN ADICIONAL**: Solo asignar valores de impuestos razonables
-            if 0 <= value <= 10000:  # Impuestos entre 0% y 10000%
-                result[numeric_fields[i]] = value
+        # Valores de impuestos en orden (is_valid_tax_value ya los acotó a 0-10000%)
+        for field, value in zip(TAX_FIELDS, numeric_values):
+            result[field] = value
         
-        # Solo devolver si encontramos al menos un código NCM
-        if result['ncm']:
-            return result
-        
-        return None
+        return result
 
     @staticmethod
     def validate_extracted_record(record: Dict) -> bool:
@@ -326,8 +384,7 @@ class NCMTableProcessor:
             return False
             
         # **VALIDACIÓN INTELIGENTE DE IMPUESTOS**
-        tax_fields = ['aec', 'die', 'te', 'de', 're']
-        for field in tax_fields:
+        for field in TAX_FIELDS:
             value = record.get(field, 0)
             if not isinstance(value, (int, float)) or value < 0:
                 return False
@@ -346,30 +403,164 @@ class NCMTableProcessor:
             
         return True
 
+def _record_key(record: Dict) -> Tuple:
+    return tuple(sorted(record.items()))
+
+
+class NCMPageLayout:
+    """
+    Layout de una página calculado una sola vez
+    
+    Los caracteres de la página se agrupan en palabras y líneas una sola vez;
+    de esas palabras salen tanto las líneas de texto como el texto de cada
+    celda (las palabras cuyo centro de caracteres cae dentro de la celda).
+    """
+    
+    # Tablas delimitadas por líneas. Equivale a la configuración por defecto:
+    # min_words_* solo aplica a las estrategias "text", por eso una segunda
+    # pasada con estos parámetros encontraba exactamente las mismas tablas.
+    TABLE_SETTINGS = {
+        "vertical_strategy": "lines",
+        "horizontal_strategy": "lines",
+        "min_words_vertical": 1,
+        "min_words_horizontal": 1
+    }
+    # Cambiarla si cambia cómo se obtienen tablas o líneas: invalida la caché de páginas
+    VERSION = "1"
+    
+    def __init__(self, tables: List[List[List[str]]], text_lines: List[str], complete: bool = True):
+        """
+        Args:
+            tables: Por tabla, sus filas como celdas no vacías (sin espacios sobrantes)
+            text_lines: Líneas de texto no vacías de la página
+            complete: False si alguna parte falló al leer la página (no se cachea)
+        """
+        self.tables = tables
+        self.text_lines = text_lines
+        self.complete = complete
+    
+    def to_dict(self) -> Dict:
+        return {"tables": self.tables, "text_lines": self.text_lines}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NCMPageLayout':
+        return cls(data["tables"], data["text_lines"])
+    
+    @classmethod
+    def from_page(cls, page, page_num: int) -> 'NCMPageLayout':
+        complete = True
+        settings = TableSettings.resolve(cls.TABLE_SETTINGS)
+        text_settings = settings.text_settings or {}
+        
+        text_lines = []
+        words = []
+        try:
+            # Única agrupación caracteres -> palabras de la página (misma que extract_text)
+            wordmap = WordExtractor(**text_settings).extract_wordmap(page.chars)
+            words = wordmap.tuples
+            text = wordmap.to_textmap(layout_bbox=page.bbox, layout_width=page.width,
+                                      layout_height=page.height, presorted=True).as_string
+            text_lines = [line.strip() for line in text.split('\n') if line.strip()]
+        except Exception as e:
+            print(f"⚠️  Estrategia 3 falló en página {page_num}: {e}")
+            complete = False
+        
+        tables = []
+        try:
+            for table in TableFinder(page, settings).tables:
+                rows = []
+                for row in cls._table_rows(table, words, text_settings):
+                    cleaned_cells = [cell.strip() for cell in row if cell and cell.strip()] if row else []
+                    if cleaned_cells:
+                        rows.append(cleaned_cells)
+                tables.append(rows)
+        except Exception as e:
+            print(f"⚠️  Detección de tablas falló en página {page_num}: {e}")
+            complete = False
+        
+        return cls(tables, text_lines, complete)
+    
+    @staticmethod
+    def _char_in_bbox(char: Dict, bbox: Tuple) -> bool:
+        # Mismo criterio que Table.extract: el centro del carácter dentro de la celda
+        v_mid = (char["top"] + char["bottom"]) / 2
+        h_mid = (char["x0"] + char["x1"]) / 2
+        x0, top, x1, bottom = bbox
+        return x0 <= h_mid < x1 and top <= v_mid < bottom
+    
+    @classmethod
+    def _table_rows(cls, table, words: List[Tuple], text_settings: Dict) -> List[List[Optional[str]]]:
+        """
+        Texto de las celdas a partir de las palabras de la página
+        
+        Si una palabra queda partida entre dos celdas se usa Table.extract
+        (agrupa de nuevo los caracteres de cada celda) para esa tabla.
+        """
+        textmap_settings = {k: v for k, v in text_settings.items() if k in TEXTMAP_KWARGS}
+        x0, top, x1, bottom = table.bbox
+        table_words = [(word, chars) for word, chars in words
+                       if word["x1"] > x0 and word["x0"] < x1 and word["bottom"] > top and word["top"] < bottom]
+        
+        rows = []
+        for row in table.rows:
+            cells = []
+            for cell in row.cells:
+                if cell is None:
+                    cells.append(None)
+                    continue
+                cell_words = []
+                for word, chars in table_words:
+                    inside = [cls._char_in_bbox(char, cell) for char in chars]
+                    if all(inside):
+                        cell_words.append((word, chars))
+                    elif any(inside):
+                        return table.extract(**text_settings)
+                cells.append(WordMap(cell_words).to_textmap(**textmap_settings).as_string if cell_words else "")
+            rows.append(cells)
+        return rows
+
+
 class NCMExtractorHybridFix:
     """Extractor HÍBRIDO - Motor que funciona + Correcciones críticas"""
     
-    def __init__(self):
+    def __init__(self, pdf_dir: Union[str, Path] = "ncm_pdf",
+                 results_dir: Union[str, Path] = "resultados_ncm_hybrid", workers: int = 1,
+                 page_cache: Union[str, Path, None] = None):
+        """
+        Args:
+            pdf_dir: Directorio con los PDFs capitulo_XX.pdf
+            results_dir: Directorio de salida (por capítulo y consolidado)
+            workers: Procesos para extraer páginas en paralelo (1 = secuencial)
+            page_cache: Archivo de la caché de páginas (None = sin caché); con la
+                caché, volver a correr el extractor no vuelve a parsear los PDFs
+        """
         self.hierarchy_processor = NCMHierarchyProcessor()
         self.table_processor = NCMTableProcessor()
         self.record_classifier = NCMRecordClassifier()
-        self.results_dir = Path("resultados_ncm_hybrid")
-        self.results_dir.mkdir(exist_ok=True)
+        self.pdf_dir = Path(pdf_dir)
+        self.results_dir = Path(results_dir)
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, workers or 1)
+        self.page_cache_path = Path(page_cache) if page_cache else None
+        self.page_cache = NCMPageCache(self.page_cache_path, NCMPageLayout.VERSION) if page_cache else None
         
     def extract_from_text(self, text: str, page_num: int) -> List[Dict]:
         """Extrae registros NCM del texto - MOTOR QUE FUNCIONA"""
+        return self.extract_from_lines(text.split('\n'), page_num)
+    
+    def extract_from_lines(self, lines: List[str], page_num: int) -> List[Dict]:
+        """Extrae registros NCM de las líneas de texto de una página"""
         records = []
         
-        lines = text.split('\n')
         for line in lines:
             line = line.strip()
             if not line:
                 continue
             
             # Buscar líneas que contengan códigos NCM
-            if re.search(r'\d{4}\.\d{2}\.\d{2}', line):
-                # Dividir la línea en partes
-                parts = re.split(r'\s+', line)
+            if NCM_CODE_IN_TEXT_RE.search(line):
+                # Dividir la línea en partes (mismos separadores que \s+)
+                parts = line.split()
                 
                 # Tratar de identificar la estructura
                 record = self.table_processor.identify_row_structure(parts)
@@ -380,105 +571,185 @@ class NCMExtractorHybridFix:
     
     def extract_tables_from_page(self, page, page_num: int) -> List[Dict]:
         """MOTOR DE EXTRACCIÓN QUE FUNCIONA + estrategias mejoradas"""
-        all_records = []
+        return self.extract_from_layout(NCMPageLayout.from_page(page, page_num), page_num)
+    
+    def extract_from_layout(self, layout: 'NCMPageLayout', page_num: int) -> List[Dict]:
+        """
+        Registros de una página a partir de su layout (tablas + texto)
+        
+        Una fila que aparece tanto en las tablas como en el texto de la página
+        genera un único registro.
+        """
+        table_records = []
         
         # Estrategia 1: Detección automática de tablas
         try:
-            tables = page.extract_tables()
-            if tables:
-                print(f"📋 Estrategia 1 - Encontradas {len(tables)} tablas en página {page_num}")
-                for table in tables:
-                    if table:
-                        # Procesar tabla directamente (como en el motor que funciona)
-                        for row in table:
-                            if row:
-                                cleaned_cells = [cell.strip() for cell in row if cell and cell.strip()]
-                                if cleaned_cells:
-                                    record = self.table_processor.identify_row_structure(cleaned_cells)
-                                    if record and self.table_processor.validate_extracted_record(record):
-                                        all_records.append(record)
+            if layout.tables:
+                print(f"📋 Estrategia 1 - Encontradas {len(layout.tables)} tablas en página {page_num}")
+                for table in layout.tables:
+                    # Procesar tabla directamente (como en el motor que funciona)
+                    for cleaned_cells in table:
+                        record = self.table_processor.identify_row_structure(cleaned_cells)
+                        if record and self.table_processor.validate_extracted_record(record):
+                            table_records.append(record)
         except Exception as e:
             print(f"⚠️  Estrategia 1 falló en página {page_num}: {e}")
         
-        # Estrategia 2: Configuración personalizada
-        if not all_records:
-            try:
-                tables = page.extract_tables(table_settings={
-                    "vertical_strategy": "lines",
-                    "horizontal_strategy": "lines",
-                    "min_words_vertical": 1,
-                    "min_words_horizontal": 1
-                })
-                if tables:
-                    print(f"📋 Estrategia 2 - Encontradas {len(tables)} tablas en página {page_num}")
-                    for table in tables:
-                        if table:
-                            for row in table:
-                                if row:
-                                    cleaned_cells = [cell.strip() for cell in row if cell and cell.strip()]
-                                    if cleaned_cells:
-                                        record = self.table_processor.identify_row_structure(cleaned_cells)
-                                        if record and self.table_processor.validate_extracted_record(record):
-                                            all_records.append(record)
-            except Exception as e:
-                print(f"⚠️  Estrategia 2 falló en página {page_num}: {e}")
-        
         # Estrategia 3: Extracción basada en texto (SIEMPRE EJECUTAR)
         try:
-            text = page.extract_text()
-            if text:
-                records = self.extract_from_text(text, page_num)
-                all_records.extend(records)
-                if records:
-                    print(f"📋 Estrategia 3 - Extraídos {len(records)} registros de texto en página {page_num}")
+            text_records = self.extract_from_lines(layout.text_lines, page_num)
         except Exception as e:
             print(f"⚠️  Estrategia 3 falló en página {page_num}: {e}")
+            text_records = []
+        
+        # Las filas ya extraídas de las tablas no se repiten desde el texto
+        seen = Counter(_record_key(record) for record in table_records)
+        records = list(table_records)
+        for record in text_records:
+            key = _record_key(record)
+            if seen[key]:
+                seen[key] -= 1
+                continue
+            records.append(record)
+        
+        if text_records:
+            print(f"📋 Estrategia 3 - Extraídos {len(text_records)} registros de texto en página {page_num}")
         
-        return all_records
+        return records
     
     def extract_from_pdf(self, pdf_path: Path, chapter_num: int) -> Tuple[List[Dict], Dict]:
         """Extrae datos de un PDF completo - MOTOR HÍBRIDO"""
         print(f"📑 Procesando capítulo {chapter_num:02d}: {pdf_path.name}")
         
-        all_records = []
-        pages_processed = 0
+        total_pages = 0
+        pages = []
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                total_pages = len(pdf.pages)
+            # El PDF solo se abre si alguna página no está en la caché
+            with contextlib.ExitStack() as stack:
+                opened = []
+                
+                def get_pdf():
+                    if not opened:
+                        opened.append(stack.enter_context(pdfplumber.open(pdf_path)))
+                    return opened[0]
+                
+                pdf_sha256 = file_sha256(pdf_path) if self.page_cache is not None else None
+                total_pages = self._page_count(pdf_sha256, get_pdf)
                 
                 # Procesar páginas desde la 3 en adelante
                 for page_num in range(2, total_pages):
-                    page = pdf.pages[page_num]
                     real_page_num = page_num + 1
                     
                     print(f"🔍 Procesando página {real_page_num}/{total_pages}...")
                     
                     # Extraer registros de la página
-                    page_records = self.extract_tables_from_page(page, real_page_num)
-                    
-                    if page_records:
-                        all_records.extend(page_records)
-                        pages_processed += 1
-                        print(f"✅ Página {real_page_num}: {len(page_records)} registros extraídos")
-                    else:
-                        print(f"⚠️  Página {real_page_num}: sin registros")
+                    layout = self._page_layout(pdf_sha256, page_num, lambda: get_pdf().pages[page_num])
+                    page_records = self.extract_from_layout(layout, real_page_num)
+                    self._add_page_records(real_page_num, page_records, pages)
         
         except Exception as e:
             print(f"❌ Error procesando PDF: {e}")
         
+        return self._chapter_result(chapter_num, total_pages, pages)
+    
+    def _page_count(self, pdf_sha256: Optional[str], get_pdf) -> int:
+        """Cantidad de páginas del PDF (de la caché si está)"""
+        if self.page_cache is not None and pdf_sha256:
+            total_pages = self.page_cache.get_page_count(pdf_sha256)
+            if total_pages is not None:
+                return total_pages
+        total_pages = len(get_pdf().pages)
+        if self.page_cache is not None and pdf_sha256:
+            self.page_cache.put_page_count(pdf_sha256, total_pages)
+        return total_pages
+    
+    def _page_layout(self, pdf_sha256: Optional[str], page_num: int, get_page) -> NCMPageLayout:
+        """Layout de la página `page_num` (desde 0): de la caché, o parseando la página con pdfplumber"""
+        if self.page_cache is not None and pdf_sha256:
+            cached = self.page_cache.get_page(pdf_sha256, page_num + 1)
+            if cached is not None:
+                return NCMPageLayout.from_dict(cached)
+        
+        page = get_page()
+        try:
+            layout = NCMPageLayout.from_page(page, page_num + 1)
+        finally:
+            page.close()  # Libera el layout cacheado de la página
+        
+        if self.page_cache is not None and pdf_sha256 and layout.complete:
+            self.page_cache.put_page(pdf_sha256, page_num + 1, layout.to_dict())
+        return layout
+    
+    def _add_page_records(self, real_page_num: int, page_records: List[Dict], pages: List[List[Dict]]):
+        """Agrega los registros de una página (si los hay) e informa el resultado"""
+        if page_records:
+            pages.append(page_records)
+            print(f"✅ Página {real_page_num}: {len(page_records)} registros extraídos")
+        else:
+            print(f"⚠️  Página {real_page_num}: sin registros")
+    
+    def _chapter_result(self, chapter_num: int, total_pages: int,
+                        pages: List[List[Dict]]) -> Tuple[List[Dict], Dict]:
+        """Une los registros de las páginas (en orden) y arma las estadísticas del capítulo"""
+        all_records = [record for page_records in pages for record in page_records]
+        
         # Estadísticas de extracción
         extraction_stats = {
             'total_pages': total_pages,
-            'pages_processed': pages_processed,
+            'pages_processed': len(pages),
             'records_extracted': len(all_records),
             'extraction_method': 'hybrid_fix'
         }
         
-        print(f"📊 Capítulo {chapter_num} completado: {len(all_records)} registros de {pages_processed} páginas")
+        print(f"📊 Capítulo {chapter_num} completado: {len(all_records)} registros de {len(pages)} páginas")
         
         return all_records, extraction_stats
     
+    def _extract_chapters_parallel(self, chapters: List[Tuple[int, Path]],
+                                   workers: int) -> Iterator[Tuple[List[Dict], Dict]]:
+        """
+        Extrae las páginas de todos los capítulos en un pool de procesos
+        
+        Las páginas se reparten individualmente entre los workers (cada uno con
+        sus propios PDFs abiertos) y los resultados se consumen en el orden
+        original de capítulos y páginas, así que registros, estadísticas y logs
+        son idénticos a la extracción secuencial.
+        
+        Yields:
+            (registros, estadísticas) de cada capítulo, en el orden de `chapters`
+        """
+        page_counts = []
+        tasks = []
+        for chapter_num, pdf_file in chapters:
+            pdf_sha256 = file_sha256(pdf_file) if self.page_cache is not None else None
+            try:
+                with contextlib.ExitStack() as stack:
+                    total_pages = self._page_count(
+                        pdf_sha256, lambda: stack.enter_context(pdfplumber.open(pdf_file)))
+            except Exception as e:
+                print(f"❌ Error procesando PDF {pdf_file.name}: {e}")
+                total_pages = 0
+            page_counts.append(total_pages)
+            tasks.extend((str(pdf_file), page_num, pdf_sha256) for page_num in range(2, total_pages))
+        
+        page_cache = str(self.page_cache_path) if self.page_cache_path else None
+        # spawn: el extractor corre dentro de procesos con hilos (Streamlit), donde fork
+        # puede heredar locks tomados. Los workers importan este módulo por nombre.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_page_worker,
+                                 initargs=(str(self.pdf_dir), str(self.results_dir), page_cache)) as pool:
+            page_outputs = pool.map(_extract_page_task, tasks, chunksize=1)
+            for (chapter_num, pdf_file), total_pages in zip(chapters, page_counts):
+                print(f"📑 Procesando capítulo {chapter_num:02d}: {pdf_file.name}")
+                pages = []
+                # Resultados de las páginas 3..n del capítulo, con los mensajes que imprimió cada worker
+                for page_num, (page_records, page_log) in zip(range(2, total_pages), page_outputs):
+                    print(f"🔍 Procesando página {page_num + 1}/{total_pages}...")
+                    sys.stdout.write(page_log)
+                    self._add_page_records(page_num + 1, page_records, pages)
+                yield self._chapter_result(chapter_num, total_pages, pages)
+    
     def process_and_enhance_records(self, records: List[Dict], chapter_num: int, pdf_name: str) -> List[Dict]:
         """Procesa registros con CORRECCIONES CRÍTICAS aplicadas"""
         enhanced_records = []
@@ -521,9 +792,18 @@ class NCMExtractorHybridFix:
         
         return enhanced_records
     
-    def process_all_chapters(self, start_chapter: int = 1, end_chapter: int = 97) -> List[Dict]:  # ✅ CORREGIDO: 97
-        """Procesa todos los capítulos 1-97 con MOTOR HÍBRIDO"""
-        pdf_dir = Path("ncm_pdf")
+    def process_all_chapters(self, start_chapter: int = 1, end_chapter: int = 97,
+                             workers: Optional[int] = None) -> List[Dict]:  # ✅ CORREGIDO: 97
+        """
+        Procesa todos los capítulos 1-97 con MOTOR HÍBRIDO
+        
+        Args:
+            start_chapter: Primer capítulo
+            end_chapter: Último capítulo (inclusive)
+            workers: Procesos para extraer páginas (default: el del extractor)
+        """
+        pdf_dir = self.pdf_dir
+        workers = max(1, workers or self.workers)
         
         if not pdf_dir.exists():
             print(f"❌ Directorio no encontrado: {pdf_dir}")
@@ -531,24 +811,47 @@ class NCMExtractorHybridFix:
         
         print(f"🚀 Procesando capítulos {start_chapter}-{end_chapter} con EXTRACTOR HÍBRIDO")
         print(f"📁 Directorio: {pdf_dir}")
+        if workers > 1:
+            print(f"⚙️  Extracción paralela por página con {workers} procesos")
+        
+        chapters = self._find_chapter_pdfs(start_chapter, end_chapter)
         
         all_results = []
         successful_extractions = 0
         
-        for chapter_num in range(start_chapter, end_chapter + 1):
-            pdf_file = pdf_dir / f"capitulo_{chapter_num:02d}.pdf"
-            
-            if not pdf_file.exists():
-                print(f"⚠️  Archivo no encontrado: {pdf_file}")
-                continue
-            
+        for chapter_num, pdf_file, enhanced_records in self._run_chapters(chapters, end_chapter, workers):
+            if enhanced_records:
+                all_results.extend(enhanced_records)
+                successful_extractions += 1
+        
+        print(f"\n🏁 PROCESAMIENTO COMPLETADO")
+        print(f"✅ Capítulos procesados exitosamente: {successful_extractions}/{end_chapter-start_chapter+1}")
+        print(f"📊 Total de registros extraídos: {len(all_results)}")
+        
+        return all_results
+    
+    def _run_chapters(self, chapters: List[Tuple[int, Path]], end_chapter: int,
+                      workers: int) -> Iterator[Tuple[int, Path, List[Dict]]]:
+        """
+        Extrae, procesa y guarda cada capítulo de `chapters`
+        
+        Yields:
+            (capítulo, PDF, registros procesados) en orden; lista vacía si no hubo datos
+        """
+        if workers > 1 and chapters:
+            extractions = self._extract_chapters_parallel(chapters, workers)
+        else:
+            extractions = (self.extract_from_pdf(pdf_file, chapter_num) for chapter_num, pdf_file in chapters)
+        
+        for chapter_num, pdf_file in chapters:
             print(f"\n{'='*60}")
             print(f"📖 PROCESANDO CAPÍTULO {chapter_num}/{end_chapter}")
             print(f"📄 Archivo: {pdf_file.name}")
             print('='*60)
             
             # Extraer datos del capítulo
-            chapter_records, stats = self.extract_from_pdf(pdf_file, chapter_num)
+            chapter_records, stats = next(extractions)
+            enhanced_records = []
             
             if chapter_records:
                 # Procesar con CORRECCIONES CRÍTICAS
@@ -557,8 +860,6 @@ class NCMExtractorHybridFix:
                 # Guardar resultados
                 self.save_chapter_results(enhanced_records, chapter_num, pdf_file.name, stats)
                 
-                all_results.extend(enhanced_records)
-                successful_extractions += 1
                 print(f"✅ Capítulo {chapter_num} completado: {len(enhanced_records)} registros válidos")
                 
                 # Mostrar estadísticas por tipo
@@ -571,12 +872,201 @@ class NCMExtractorHybridFix:
                 
             else:
                 print(f"❌ Sin datos válidos para capítulo {chapter_num}")
+            
+            yield chapter_num, pdf_file, enhanced_records
+    
+    def _find_chapter_pdfs(self, start_chapter: int, end_chapter: int) -> List[Tuple[int, Path]]:
+        """PDFs capitulo_XX.pdf existentes en el rango, en orden"""
+        chapters = []
+        for chapter_num in range(start_chapter, end_chapter + 1):
+            pdf_file = self.pdf_dir / f"capitulo_{chapter_num:02d}.pdf"
+            
+            if not pdf_file.exists():
+                print(f"⚠️  Archivo no encontrado: {pdf_file}")
+                continue
+            chapters.append((chapter_num, pdf_file))
+        return chapters
+    
+    # ------------------------------------------------------------------
+    # Reconstrucción incremental (manifiesto de hashes por capítulo)
+    # ------------------------------------------------------------------
+    
+    @property
+    def manifest_path(self) -> Path:
+        return self.results_dir / MANIFEST_FILENAME
+    
+    def load_manifest(self) -> Dict:
+        """Manifiesto de extracción; vacío si no existe, está dañado o es de otra versión del extractor"""
+        empty = {"extractor_version": EXTRACTOR_VERSION, "chapters": {}}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        if manifest.get("extractor_version") != EXTRACTOR_VERSION or not isinstance(manifest.get("chapters"), dict):
+            print("♻️  Manifiesto de otra versión del extractor: se reextraen todos los capítulos")
+            return empty
+        return manifest
+    
+    def _save_manifest(self, manifest: Dict) -> None:
+        """Escritura atómica: un corte a mitad de camino deja el manifiesto anterior"""
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def load_chapter_records(self, chapter_num: int) -> Optional[List[Dict]]:
+        """Registros guardados de un capítulo (capitulo_XX_hybrid.json), o None si no están"""
+        json_file = self.results_dir / f"capitulo_{chapter_num:02d}_hybrid.json"
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                return json.load(f)["records"]
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _plan_chapters(self, start_chapter: int, end_chapter: int,
+                       force: bool) -> Tuple[Dict, List[Tuple[int, Path, str, bool]]]:
+        """
+        Compara los PDFs del rango con el manifiesto
         
-        print(f"\n🏁 PROCESAMIENTO COMPLETADO")
-        print(f"✅ Capítulos procesados exitosamente: {successful_extractions}/{end_chapter-start_chapter+1}")
-        print(f"📊 Total de registros extraídos: {len(all_results)}")
+        Returns:
+            (manifiesto, [(capítulo, PDF, sha256, reutilizable)]) en orden de capítulo
+        """
+        manifest = self.load_manifest()
+        entries = manifest["chapters"]
+        chapters = self._find_chapter_pdfs(start_chapter, end_chapter)
         
-        return all_results
+        # Capítulos del rango cuyo PDF ya no existe
+        present = {f"{chapter_num:02d}" for chapter_num, _ in chapters}
+        for chapter_num in range(start_chapter, end_chapter + 1):
+            if f"{chapter_num:02d}" not in present:
+                entries.pop(f"{chapter_num:02d}", None)
+        
+        plan = []
+        for chapter_num, pdf_file in chapters:
+            sha256 = file_sha256(pdf_file)
+            entry = entries.get(f"{chapter_num:02d}")
+            cached = bool(not force and entry and entry.get("sha256") == sha256 and
+                          (entry.get("records") == 0 or
+                           (self.results_dir / f"capitulo_{chapter_num:02d}_hybrid.json").exists()))
+            plan.append((chapter_num, pdf_file, sha256, cached))
+        return manifest, plan
+    
+    def _iter_chapter_records(self, manifest: Dict, plan: List[Tuple[int, Path, str, bool]],
+                              end_chapter: int, workers: int) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Registros de cada capítulo del plan, en orden y de a uno por vez
+        
+        Los capítulos reutilizables se leen de su capitulo_XX_hybrid.json; el resto
+        se extrae (en orden, intercalado con los anteriores) y se registra en el manifiesto.
+        """
+        entries = manifest["chapters"]
+        reused = sum(1 for *_, cached in plan if cached)
+        print(f"♻️  {reused} capítulos sin cambios; {len(plan) - reused} a extraer")
+        
+        pending = [(chapter_num, pdf_file) for chapter_num, pdf_file, _, cached in plan if not cached]
+        extractions = self._run_chapters(pending, end_chapter, workers)
+        hashes = {chapter_num: sha256 for chapter_num, _, sha256, _ in plan}
+        
+        for chapter_num, pdf_file, sha256, cached in plan:
+            if cached:
+                records = [] if entries[f"{chapter_num:02d}"].get("records") == 0 else self.load_chapter_records(chapter_num)
+                if records is not None:
+                    yield chapter_num, records
+                    continue
+                # JSON ilegible: se extrae aparte, sin alterar el orden de los demás
+                records = next(self._run_chapters([(chapter_num, pdf_file)], end_chapter, workers))[2]
+            else:
+                _, _, records = next(extractions)
+            
+            entries[f"{chapter_num:02d}"] = {
+                "file": pdf_file.name,
+                "sha256": hashes[chapter_num],
+                "records": len(records),
+                "extracted_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            self._save_manifest(manifest)  # Tras cada capítulo: un corte no pierde lo ya extraído
+            yield chapter_num, records
+        self._save_manifest(manifest)
+    
+    def update_chapters(self, start_chapter: int = 1, end_chapter: int = 97,
+                        workers: Optional[int] = None, force: bool = False) -> List[Dict]:
+        """
+        Extrae solo los capítulos cuyo PDF cambió desde la última extracción
+        
+        Cada PDF se identifica por su SHA-256; los capítulos sin cambios (mismo hash
+        y misma versión del extractor) se toman de su capitulo_XX_hybrid.json.
+        
+        Args:
+            start_chapter: Primer capítulo
+            end_chapter: Último capítulo (inclusive)
+            workers: Procesos para extraer páginas (default: el del extractor)
+            force: Reextraer todos los capítulos aunque no hayan cambiado
+        
+        Returns:
+            Registros de todos los capítulos del rango, en orden de capítulo
+        """
+        workers = max(1, workers or self.workers)
+        if not self.pdf_dir.exists():
+            print(f"❌ Directorio no encontrado: {self.pdf_dir}")
+            return []
+        
+        manifest, plan = self._plan_chapters(start_chapter, end_chapter, force)
+        return [record for _, records in self._iter_chapter_records(manifest, plan, end_chapter, workers)
+                for record in records]
+    
+    def build_dataset(self, start_chapter: int = 1, end_chapter: int = 97, workers: Optional[int] = None,
+                      force: bool = False, parquet: bool = False) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Actualiza los capítulos modificados y genera el dataset consolidado
+        
+        Los capítulos se escriben en el consolidado uno por uno, a medida que se
+        leen o extraen, así que en memoria hay a lo sumo un capítulo. Si ningún
+        PDF cambió y el consolidado de esos mismos capítulos sigue en disco, se
+        reutiliza sin reescribirlo.
+        
+        Args:
+            parquet: Escribir también el dataset en Parquet (requiere pyarrow)
+        
+        Returns:
+            (ruta JSON, ruta CSV) del dataset consolidado, o (None, None) sin datos
+        """
+        workers = max(1, workers or self.workers)
+        if not self.pdf_dir.exists():
+            print(f"❌ Directorio no encontrado: {self.pdf_dir}")
+            return None, None
+        
+        manifest, plan = self._plan_chapters(start_chapter, end_chapter, force)
+        fingerprint = hashlib.sha256(json.dumps(
+            [EXTRACTOR_VERSION, start_chapter, end_chapter,
+             sorted((f"{chapter_num:02d}", sha256) for chapter_num, _, sha256, _ in plan)]
+        ).encode('utf-8')).hexdigest()
+        
+        dataset = manifest.get("dataset") or {}
+        outputs = ("json", "csv", "parquet") if parquet else ("json", "csv")
+        if (all(cached for *_, cached in plan) and dataset.get("fingerprint") == fingerprint
+                and all((self.results_dir / dataset.get(name, '')).is_file() for name in outputs)):
+            print(f"✅ Dataset consolidado al día: {self.results_dir / dataset['json']}")
+            return str(self.results_dir / dataset["json"]), str(self.results_dir / dataset["csv"])
+        
+        with NCMDatasetWriter(self.results_dir, parquet=parquet) as writer:
+            for _, records in self._iter_chapter_records(manifest, plan, end_chapter, workers):
+                writer.write_records(records)
+        
+        if not writer.stats.total_records:
+            for path in (writer.json_file, writer.jsonl_file, writer.csv_file, writer.parquet_file):
+                if path is not None:
+                    path.unlink(missing_ok=True)
+            print("⚠️  No hay datos para consolidar")
+            return None, None
+        
+        self._report_dataset(writer)
+        manifest["dataset"] = {"fingerprint": fingerprint, "json": writer.json_file.name,
+                               "csv": writer.csv_file.name, "jsonl": writer.jsonl_file.name}
+        if writer.parquet_file is not None:
+            manifest["dataset"]["parquet"] = writer.parquet_file.name
+        self._save_manifest(manifest)
+        return str(writer.json_file), str(writer.csv_file)
     
     def save_chapter_results(self, records: List[Dict], chapter_num: int, pdf_name: str, stats: Dict):
         """Guarda resultados con formato CORREGIDO"""
@@ -588,7 +1078,7 @@ class NCMExtractorHybridFix:
             "total_records": len(records),
             "extraction_stats": stats,
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "version": "hybrid_fix_v1.0",
+            "version": EXTRACTOR_VERSION,
             "records": records
         }
         
@@ -601,90 +1091,88 @@ class NCMExtractorHybridFix:
             df.to_csv(csv_file, index=False, encoding='utf-8')
             print(f"💾 Capítulo {chapter_num} guardado: {json_file} y {csv_file}")
     
-    def create_consolidated_dataset(self, all_results: List[Dict]) -> Tuple[str, str]:
+    def create_consolidated_dataset(self, all_results: List[Dict], parquet: bool = False) -> Tuple[str, str]:
         """Crea dataset consolidado CORREGIDO"""
         if not all_results:
             print("⚠️  No hay datos para consolidar")
             return None, None
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        # Estadísticas por tipo
-        type_stats = {}
-        for record in all_results:
-            record_type = record.get('record_type', 'unknown')
-            type_stats[record_type] = type_stats.get(record_type, 0) + 1
-        
-        # JSON consolidado
-        json_file = self.results_dir / f"dataset_ncm_HYBRID_FIXED_{timestamp}.json"
-        consolidated_json = {
-            "metadata": {
-                "version": "hybrid_fix_v2.0_intelligent_classification",
-                "total_records": len(all_results),
-                "extraction_method": "hybrid_pdfplumber_fixed",
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "total_chapters": len(set(record['chapter'] for record in all_results)),
-                "chapters_processed": sorted(list(set(record['chapter'] for record in all_results))),
-                "record_type_distribution": type_stats,
-                "validation_status": "ALL_CRITICAL_FIXES_APPLIED",
-                "fixes_applied": [
-                    "eliminated_duplicate_fields",
-                    "corrected_chapter_range_1_to_97", 
-                    "added_record_type_classification",
-                    "improved_hierarchy_validation",
-                    "enhanced_fiscal_data_detection",
-                    "CRITICAL_FIX_tax_value_parsing_confusion_with_ncm_codes",
-                    "comprehensive_record_validation",
-                    "enhanced_decimal_filtering",
-                    "INTELLIGENT_CLASSIFICATION_v2.0",
-                    "context_aware_ncm_reference_detection",
-                    "semantic_tax_validation",
-                    "pattern_based_ncm_recognition"
-                ]
-            },
-            "records": all_results
-        }
-        
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(consolidated_json, f, indent=2, ensure_ascii=False)
-        
-        # CSV consolidado
-        csv_file = self.results_dir / f"dataset_ncm_HYBRID_FIXED_{timestamp}.csv"
-        df = pd.DataFrame(all_results)
-        df.to_csv(csv_file, index=False, encoding='utf-8')
+        with NCMDatasetWriter(self.results_dir, parquet=parquet) as writer:
+            writer.write_records(all_results)
         
+        self._report_dataset(writer)
+        return str(writer.json_file), str(writer.csv_file)
+    
+    def _report_dataset(self, writer: NCMDatasetWriter):
         print(f"✅ Dataset HÍBRIDO CORREGIDO creado:")
-        print(f"   📋 JSON: {json_file}")
-        print(f"   📊 CSV: {csv_file}")
+        print(f"   📋 JSON: {writer.json_file}")
+        print(f"   📄 JSONL: {writer.jsonl_file}")
+        print(f"   📊 CSV: {writer.csv_file}")
+        if writer.parquet_file is not None:
+            print(f"   🗃️  Parquet: {writer.parquet_file}")
         
         # Reporte de validación
-        self.print_validation_report(df, type_stats)
-        
-        return str(json_file), str(csv_file)
+        self.print_validation_report(writer.stats)
     
-    def print_validation_report(self, df: pd.DataFrame, type_stats: Dict):
+    def print_validation_report(self, stats: DatasetStats):
         """Reporte de validación crítica final"""
+        total = stats.total_records
         print(f"\n🔍 REPORTE DE VALIDACIÓN CRÍTICA FINAL")
         print("="*50)
-        print(f"📋 Total de registros: {len(df):,}")
-        print(f"📚 Capítulos procesados: {df['chapter'].nunique()}")
-        print(f"🔢 Códigos NCM únicos: {df['code_searchable'].nunique():,}")
+        print(f"📋 Total de registros: {total:,}")
+        print(f"📚 Capítulos procesados: {len(stats.chapters)}")
+        print(f"🔢 Códigos NCM únicos: {len(stats.unique_codes):,}")
         
         print(f"\n📊 DISTRIBUCIÓN POR TIPO:")
-        for record_type, count in type_stats.items():
-            percentage = (count / len(df)) * 100
+        for record_type, count in stats.type_stats.items():
+            percentage = (count / total) * 100
             print(f"   {record_type}: {count:,} registros ({percentage:.1f}%)")
         
         print(f"\n🔍 VALIDACIONES CRÍTICAS:")
-        valid_codes = df['code'].notna().sum()
-        valid_descriptions = df['description'].notna().sum()
-        with_hierarchy = df['parent'].notna().sum()
-        terminal_records = (df['record_type'] == 'terminal').sum()
-        
-        print(f"   ✅ Códigos válidos: {valid_codes}/{len(df)} ({valid_codes/len(df)*100:.1f}%)")
-        print(f"   ✅ Descripciones válidas: {valid_descriptions}/{len(df)} ({valid_descriptions/len(df)*100:.1f}%)")
-        print(f"   ✅ Con jerarquía: {with_hierarchy}/{len(df)} ({with_hierarchy/len(df)*100:.1f}%)")
-        print(f"   💰 Registros terminales: {terminal_records}/{len(df)} ({terminal_records/len(df)*100:.1f}%)")
+        print(f"   ✅ Códigos válidos: {stats.valid_codes}/{total} ({stats.valid_codes/total*100:.1f}%)")
+        print(f"   ✅ Descripciones válidas: {stats.valid_descriptions}/{total} ({stats.valid_descriptions/total*100:.1f}%)")
+        print(f"   ✅ Con jerarquía: {stats.with_hierarchy}/{total} ({stats.with_hierarchy/total*100:.1f}%)")
+        print(f"   💰 Registros terminales: {stats.terminal_records}/{total} ({stats.terminal_records/total*100:.1f}%)")
+
+# Estado de cada proceso del pool: un extractor y los PDFs abiertos por ese proceso
+# (los handles de pdfplumber no se comparten entre procesos)
+MAX_OPEN_PDFS_PER_WORKER = 4
+_worker_extractor: Optional[NCMExtractorHybridFix] = None
+_worker_pdfs: "OrderedDict[str, pdfplumber.PDF]" = OrderedDict()
+
+
+def _init_page_worker(pdf_dir: str, results_dir: str, page_cache: Optional[str]) -> None:
+    global _worker_extractor
+    _worker_extractor = NCMExtractorHybridFix(pdf_dir=pdf_dir, results_dir=results_dir, page_cache=page_cache)
+
+
+def _worker_pdf(pdf_path: str) -> pdfplumber.PDF:
+    """PDF abierto en este proceso (se conservan los últimos MAX_OPEN_PDFS_PER_WORKER)"""
+    pdf = _worker_pdfs.get(pdf_path)
+    if pdf is None:
+        pdf = _worker_pdfs[pdf_path] = pdfplumber.open(pdf_path)
+        while len(_worker_pdfs) > MAX_OPEN_PDFS_PER_WORKER:
+            _, oldest = _worker_pdfs.popitem(last=False)
+            oldest.close()
+    else:
+        _worker_pdfs.move_to_end(pdf_path)
+    return pdf
+
+
+def _extract_page_task(task: Tuple[str, int, Optional[str]]) -> Tuple[List[Dict], str]:
+    """Extrae una página en un worker; devuelve (registros, mensajes impresos)"""
+    pdf_path, page_num, pdf_sha256 = task
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            layout = _worker_extractor._page_layout(pdf_sha256, page_num,
+                                                    lambda: _worker_pdf(pdf_path).pages[page_num])
+            records = _worker_extractor.extract_from_layout(layout, page_num + 1)
+        except Exception as e:
+            print(f"❌ Error procesando página {page_num + 1} de {Path(pdf_path).name}: {e}")
+            records = []
+    return records, log.getvalue()
+
 
 def main():
     """Función principal HÍBRIDA CORREGIDA"""
@@ -693,17 +1181,31 @@ def main():
     print("Motor funcional + Correcciones críticas + Rango 1-97")
     print("-" * 60)
     
-    extractor = NCMExtractorHybridFix()
+    parser = argparse.ArgumentParser(description="Extractor NCM híbrido desde los PDFs oficiales por capítulo")
+    parser.add_argument('--start', type=int, default=1, help='Primer capítulo (default: 1)')
+    parser.add_argument('--end', type=int, default=97, help='Último capítulo (default: 97)')
+    parser.add_argument('--workers', '-w', type=int, default=os.cpu_count() or 1,
+                        help='Procesos para extraer páginas en paralelo (default: CPUs; 1 = secuencial)')
+    parser.add_argument('--pdf-dir', default='ncm_pdf', help='Directorio con los PDFs capitulo_XX.pdf')
+    parser.add_argument('--results-dir', default='resultados_ncm_hybrid', help='Directorio de salida')
+    parser.add_argument('--force', action='store_true',
+                        help='Reextraer todos los capítulos aunque sus PDFs no hayan cambiado')
+    parser.add_argument('--no-page-cache', action='store_true',
+                        help=f'No usar la caché de páginas ({PAGE_CACHE_FILENAME} en el directorio de salida)')
+    parser.add_argument('--parquet', action='store_true', help='Escribir también el dataset en Parquet (requiere pyarrow)')
+    args = parser.parse_args()
     
-    # Para testing: procesar solo algunos capítulos
-    # all_results = extractor.process_all_chapters(start_chapter=1, end_chapter=3)
+    # Con la caché de páginas, reclasificar todo (--force tras ajustar las heurísticas) no vuelve a parsear los PDFs
+    page_cache = None if args.no_page_cache else Path(args.results_dir) / PAGE_CACHE_FILENAME
+    extractor = NCMExtractorHybridFix(pdf_dir=args.pdf_dir, results_dir=args.results_dir,
+                                      workers=args.workers, page_cache=page_cache)
     
-    # Para procesamiento completo (1-97):
-    all_results = extractor.process_all_chapters(start_chapter=1, end_chapter=97)
+    # Para testing: procesar solo algunos capítulos (--start 1 --end 3)
+    # Solo se extraen los capítulos cuyo PDF cambió; el resto sale de capitulo_XX_hybrid.json
+    json_file, csv_file = extractor.build_dataset(start_chapter=args.start, end_chapter=args.end,
+                                                 force=args.force, parquet=args.parquet)
     
-    if all_results:
-        json_file, csv_file = extractor.create_consolidated_dataset(all_results)
-        
+    if json_file:
         print(f"\n🎉 EXTRACCIÓN HÍBRIDA COMPLETADA")
         print(f"📁 Archivos creados en: {extractor.results_dir}")
         print(f"📋 Dataset JSON: {json_file}")
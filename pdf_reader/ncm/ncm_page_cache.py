@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+🗄️ NCM Page Cache - Caché en disco del layout de cada página de los PDFs NCM
+===========================================================================
+
+Guarda las celdas de tablas y las líneas de texto que pdfplumber obtiene de
+cada página, para que al volver a correr el extractor (por ejemplo, después de
+ajustar identify_row_structure o validate_extracted_record) no haya que volver
+a parsear los PDFs: parsear una página lleva ~1.5 s, leerla de la caché, ms.
+
+Funcionalidades:
+- Clave por SHA-256 del PDF + número de página (un PDF modificado no reutiliza nada)
+- Versión del layout: cambiarla invalida las páginas guardadas con otra
+- Cantidad de páginas por PDF, para no abrir PDFs completamente cacheados
+- Almacenamiento compacto (JSON comprimido con zlib) en SQLite, seguro entre procesos
+
+Autor: Desarrollado para comercio exterior argentino
+"""
+
+import json
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+PAGE_CACHE_FILENAME = "page_cache.sqlite3"
+
+
+class NCMPageCache:
+    """Caché (sha256 del PDF, página) -> layout de la página"""
+
+    def __init__(self, path: Union[str, Path], layout_version: str):
+        """
+        Args:
+            path: Archivo SQLite de la caché
+            layout_version: Versión del formato de layout; las entradas de otra versión se ignoran
+        """
+        self.path = Path(path)
+        self.layout_version = layout_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    pdf_sha256 TEXT NOT NULL,
+                    page_num INTEGER NOT NULL,
+                    layout_version TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (pdf_sha256, page_num)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    pdf_sha256 TEXT PRIMARY KEY,
+                    total_pages INTEGER NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM pages WHERE layout_version = ?', (self.layout_version,)
+            ).fetchone()[0]
+
+    def get_page(self, pdf_sha256: str, page_num: int) -> Optional[Dict]:
+        """Layout guardado de la página (número desde 1), o None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM pages WHERE pdf_sha256 = ? AND page_num = ? AND layout_version = ?',
+                (pdf_sha256, page_num, self.layout_version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put_page(self, pdf_sha256: str, page_num: int, layout: Dict) -> None:
+        data = zlib.compress(json.dumps(layout, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages (pdf_sha256, page_num, layout_version, data) VALUES (?, ?, ?, ?)',
+                (pdf_sha256, page_num, self.layout_version, data)
+            )
+            self._conn.commit()
+
+    def get_page_count(self, pdf_sha256: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT total_pages FROM documents WHERE pdf_sha256 = ?', (pdf_sha256,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_page_count(self, pdf_sha256: str, total_pages: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO documents (pdf_sha256, total_pages) VALUES (?, ?)',
+                (pdf_sha256, total_pages)
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM pages')
+            self._conn.execute('DELETE FROM documents')
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -70,6 +70,17 @@ def get_secrets_manager():
     """Función de compatibilidad - devuelve los secrets de Streamlit"""
     return st.secrets
 
+def get_shared_ncm_integration():
+    """
+    Integración NCM oficial compartida por todas las sesiones y threads del proceso
+
+    No se usa st.cache_resource: get_ncm_integration() ya la comparte por proceso y
+    no guarda una instancia sin dataset, así que una carga fallida se reintenta.
+    """
+    from ncm_official_integration import get_ncm_integration
+    with st.spinner("📚 Cargando base de datos oficial NCM..."):
+        return get_ncm_integration()
+
 # Cargar API keys desde el archivo centralizado
 API_KEYS = get_api_keys_dict()
 
@@ -93,6 +104,7 @@ try:
     from carriers_apis_conections.dhl_integration import DHLFreightService
     # Mantener freight_estimation como fallback
     from freight_estimation import load_freight_rates, calculate_air_freight, calculate_sea_freight
+    from landed_cost_grid import calculate_shipping_metrics, derechos_from_ncm_result
     MODULES_AVAILABLE = True
 except ImportError as e:
     st.error(f"Error importing modules: {e}")
@@ -586,25 +598,8 @@ def log_flow_step(step_name, status="STARTED", data=None):
     debug_log(f"Flow Step: {step_name} - {status}", data, level="FLOW")
 
 def _get_duties_from_ncm_result(ncm_result: dict) -> float:
-    """Extrae los derechos de importación del resultado del NCM"""
-    
-    if not ncm_result:
-        return 0.0
-    
-    # Usar datos del tratamiento arancelario del nuevo sistema integrado
-    tratamiento = ncm_result.get('tratamiento_arancelario', {})
-    derechos_str = tratamiento.get('derechos_importacion', '0.0%')
-    
-    try:
-        import re
-        # Extraer número de la string (ej: "20.0%" -> 20.0)
-        cleaned_str = re.sub(r'[^\d.]', '', str(derechos_str))
-        if cleaned_str:
-            return float(cleaned_str)
-    except (ValueError, TypeError):
-        debug_log(f"No se pudo parsear derechos de importación: '{derechos_str}'. Usando 0.0%.", level="WARNING")
-    
-    return 0.0
+    """Extrae los derechos de importación del resultado del NCM (misma lógica que la grilla de costos)"""
+    return derechos_from_ncm_result(ncm_result)
 
 def _get_tasa_estadistica_from_ncm_result(ncm_result: dict) -> float:
     """Extrae la tasa estadística del resultado del NCM"""
@@ -660,55 +655,7 @@ def _calculate_shipping_metrics(editable_data: dict, import_quantity: int) -> di
     Returns:
         Dict con todas las métricas de envío calculadas
     """
-    packaging_type = editable_data.get('packaging_type', 'individual')
-    
-    if packaging_type == "individual":
-        # EMBALAJE INDIVIDUAL: cada unidad en su propia caja
-        peso_unitario_kg = float(editable_data.get('weight_kg', 0.0))
-        dims = editable_data.get('dimensions_cm', {"length": 0.0, "width": 0.0, "height": 0.0})
-        
-        peso_total_kg = peso_unitario_kg * import_quantity
-        
-        if all(d > 0 for d in dims.values()):
-            volumen_unitario_cbm = (dims['length'] * dims['width'] * dims['height']) / 1_000_000
-            volumen_total_cbm = volumen_unitario_cbm * import_quantity
-            peso_volumetrico_kg = volumen_total_cbm * 167
-        else:
-            volumen_total_cbm = 0
-            peso_volumetrico_kg = 0
-            
-    else:  # multiple
-        # EMBALAJE MÚLTIPLE: usar peso total de la caja y calcular número de cajas necesarias
-        units_per_box = editable_data.get('units_per_box', 1)
-        box_dims = editable_data.get('box_dimensions_cm', {"length": 0.0, "width": 0.0, "height": 0.0})
-        box_total_weight_kg = float(editable_data.get('box_total_weight_kg', 0.0))
-        
-        # Calcular número de cajas necesarias
-        num_boxes = math.ceil(import_quantity / units_per_box)
-        
-        # Peso total = peso total de cada caja × número de cajas
-        peso_total_kg = box_total_weight_kg * num_boxes
-        
-        # Volumen basado en las dimensiones de las cajas
-        if all(d > 0 for d in box_dims.values()):
-            volumen_caja_cbm = (box_dims['length'] * box_dims['width'] * box_dims['height']) / 1_000_000
-            volumen_total_cbm = volumen_caja_cbm * num_boxes
-            peso_volumetrico_kg = volumen_total_cbm * 167
-        else:
-            volumen_total_cbm = 0
-            peso_volumetrico_kg = 0
-    
-    # Calcular peso facturable (el mayor entre peso físico y volumétrico)
-    peso_facturable_kg = max(peso_total_kg, peso_volumetrico_kg) if peso_volumetrico_kg > 0 else peso_total_kg
-    
-    return {
-        "peso_total_kg": peso_total_kg,
-        "volumen_total_cbm": volumen_total_cbm,
-        "peso_volumetrico_kg": peso_volumetrico_kg,
-        "peso_facturable_kg": peso_facturable_kg,
-        "packaging_type": packaging_type,
-        "num_boxes": math.ceil(import_quantity / editable_data.get('units_per_box', 1)) if packaging_type == "multiple" else import_quantity
-    }
+    return calculate_shipping_metrics(editable_data, import_quantity)
 
 
 def _get_all_official_taxes_from_ncm_result(ncm_result: dict) -> dict:
@@ -2240,13 +2187,15 @@ def execute_landed_cost_calculation(tipo_importador, destino_importacion, provin
                 
                 # NUEVO: Usar clasificador profundo con expertise de despachante de aduanas
                 from ai_ncm_deep_classifier import DeepNCMClassifier
+                from async_clients import run_with_async_clients
                 
                 deep_classifier = DeepNCMClassifier(
                     api_key=API_KEYS.get("OPENAI_API_KEY"),
-                    debug_callback=debug_log
+                    debug_callback=debug_log,
+                    ncm_backend=get_shared_ncm_integration()
                 )
                 
-                deep_result = asyncio.run(deep_classifier.classify_product_deep(
+                deep_result = run_with_async_clients(deep_classifier.classify_product_deep(
                     description=enhanced_description,
                     image_url=editable_data['image_url']
                 ))
@@ -2467,8 +2416,8 @@ dest_postal: {destination_details.get('postalCode', 'C1000')}
 weight: {peso_facturable_kg:.2f} kg""")
                         with col_tech2:
                             # Mostrar códigos postales normalizados para DHL
-                            from carriers_apis_conections.unified_shipping_api import UnifiedShippingAPI
-                            api_temp = UnifiedShippingAPI()
+                            from carriers_apis_conections.unified_shipping_api import get_shared_shipping_api
+                            api_temp = get_shared_shipping_api()
                             dest_postal_norm = api_temp._normalize_postal_code(destination_details.get('postalCode', 'C1000'), destination_details.get('countryCode', 'AR'))
                             origin_postal_norm = api_temp._normalize_postal_code(origin_details.get('postalCode', '518000'), origin_details.get('countryCode', 'CN'))
                             st.code(f"""DHL API (normalizado):
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+🧪 Test Async Clients
+=====================
+
+Verifica que las llamadas asíncronas al LLM respeten el límite de concurrencia,
+pasen por la caché persistente, que los clientes se compartan por event loop y
+que se cierren al terminar una ejecución suelta.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+import llm_cache
+import async_clients
+from async_clients import (
+    async_chat_completion, get_async_openai_client, get_llm_semaphore, run_with_async_clients
+)
+from llm_cache import LLMResponseCache
+
+
+class _SlowAsyncClient:
+    """Cliente con la forma de AsyncOpenAI que mide las llamadas simultáneas"""
+
+    def __init__(self):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **request):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        content = request['messages'][-1]['content'].upper()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_concurrency_limit_and_cache(tmp_path, monkeypatch):
+    """Nunca hay más llamadas en vuelo que LLM_MAX_CONCURRENCY; las repetidas salen de caché"""
+    monkeypatch.setenv('LLM_MAX_CONCURRENCY', '3')
+    monkeypatch.setattr(llm_cache, '_llm_cache', LLMResponseCache(tmp_path / 'llm.sqlite3'))
+    monkeypatch.setattr(llm_cache, '_llm_cache_initialized', True)
+    client = _SlowAsyncClient()
+
+    async def run():
+        prompts = [f"producto {i}" for i in range(10)]
+        first = await asyncio.gather(*(
+            async_chat_completion(client, model="gpt-4o-mini", temperature=0,
+                                  messages=[{"role": "user", "content": p}])
+            for p in prompts
+        ))
+        second = await async_chat_completion(client, model="gpt-4o-mini", temperature=0,
+                                             messages=[{"role": "user", "content": prompts[0]}])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [f"PRODUCTO {i}" for i in range(10)]
+    assert second == "PRODUCTO 0"
+    assert client.calls == 10
+    assert client.max_in_flight == 3
+    llm_cache._llm_cache.close()
+
+
+def test_clients_are_shared_per_event_loop():
+    """Dentro de un loop se reutiliza el cliente; cada loop nuevo tiene el suyo"""
+    async def grab():
+        return get_async_openai_client('sk-test'), get_async_openai_client('sk-test'), get_llm_semaphore()
+
+    client_a, client_b, semaphore_a = asyncio.run(grab())
+    client_c, _, semaphore_c = asyncio.run(grab())
+    assert client_a is client_b
+    assert client_a is not client_c
+    assert semaphore_a is not semaphore_c
+
+
+def test_run_with_async_clients_closes_loop_clients():
+    """Los clientes creados en la corrida se cierran antes de que vuelva asyncio.run"""
+    async def classify():
+        client = get_async_openai_client('sk-test')
+        loop = asyncio.get_running_loop()
+        assert loop in async_clients._loop_state
+        return client, loop
+
+    client, loop = run_with_async_clients(classify())
+    assert client.is_closed()
+    assert loop not in async_clients._loop_state
+
+
+class _FakeNCMBackend:
+    """Integración NCM mínima: un match jerárquico intermedio con tres subcategorías"""
+
+    subcategories = [{"ncm_code": f"8528.72.{i}0", "description": f"sub {i}", "record_type": "terminal"}
+                     for i in range(1, 4)]
+
+    def normalize_ncm_code(self, code):
+        return code
+
+    def search_exact_ncm(self, code):
+        return None
+
+    def search_hierarchical_ncm(self, code, max_results=10):
+        return [{"ncm_code": "8528.72", "record_type": "intermediate", "match_score": 0.9}]
+
+    def get_subcategories(self, code):
+        return list(self.subcategories)
+
+
+def test_hierarchical_llm_refinement_is_opt_in(monkeypatch):
+    """Sin activarlo no hay llamadas extra al LLM y el orden de candidatos es el original"""
+    from ai_ncm_deep_classifier import DeepNCMClassifier
+
+    monkeypatch.delenv('NCM_REFINE_HIERARCHICAL_MATCHES', raising=False)
+    calls = []
+
+    async def fake_analyze(self, subcategories, description, parent):
+        calls.append(parent["ncm_code"])
+        return subcategories[-1]
+
+    monkeypatch.setattr(DeepNCMClassifier, "_analyze_subcategories_with_llm", fake_analyze)
+
+    def explore(classifier):
+        result = asyncio.run(classifier.explore_ncm_hierarchy("8528.72", "televisor"))
+        return [c["ncm_code"] for c in result["final_candidates"]]
+
+    default = DeepNCMClassifier(api_key="sk-test", ncm_backend=_FakeNCMBackend())
+    assert default.refine_hierarchical_matches is False
+    assert explore(default) == ["8528.72.10", "8528.72.20", "8528.72.30"]
+    assert calls == []
+
+    monkeypatch.setenv('NCM_REFINE_HIERARCHICAL_MATCHES', '1')
+    refined = DeepNCMClassifier(api_key="sk-test", ncm_backend=_FakeNCMBackend())
+    assert explore(refined) == ["8528.72.30", "8528.72.10", "8528.72.20"]
+    assert calls == ["8528.72"]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+🧪 Test Freight Estimation - RateTable
+======================================
+
+Verifica que la tabla de tarifas indexada dé los mismos precios interpolados
+que el cálculo anterior (ordenar + np.interp por llamada) para todas las zonas,
+en consultas de un peso o de un array, y el precio por escalón de 0.5 kg.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from freight_estimation import RateTable, calculate_air_freight, load_freight_rates
+
+CSV = """KG,Zona 1,Zona 2,Zona 3,Zona 4,Zona 5,Zona 6
+1.0,30.10,32.40,35.00,38.20,"1,041.50",45.00
+0.5,25.00,27.10,29.90,31.00,35.75,40.20
+2.0,40.00,44.00,48.00,52.00,58.00,63.00
+Tarifa,,,,,,
+10.0,90.00,98.00,105.00,115.00,"1,240.00",140.00
+"""
+
+
+def _old_interp(weight, df, zone):
+    """Cálculo previo: ordenar por KG en cada llamada y np.interp"""
+    df = df.sort_values(by='KG').reset_index(drop=True)
+    return np.interp(weight, df['KG'], df[zone])
+
+
+def _old_frame(path):
+    df = pd.read_csv(path)
+    for col in df.columns:
+        df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', ''), errors='coerce')
+    return df.dropna()
+
+
+@pytest.fixture
+def rates_csv(tmp_path):
+    path = tmp_path / "extracted_tables.csv"
+    path.write_text(CSV, encoding="utf-8")
+    return path
+
+
+def test_interpolated_matches_previous_calculation(rates_csv):
+    """Mismos precios que antes para todas las zonas, uno a uno y en lote"""
+    table = load_freight_rates(rates_csv)
+    old = _old_frame(rates_csv)
+    assert len(table) == 4
+    assert table.zone_names == [f"Zona {i}" for i in range(1, 7)]
+
+    weights = np.array([0.1, 0.5, 0.75, 1.0, 1.3, 2.0, 7.25, 10.0, 25.0])
+    for zone in table.zone_names:
+        expected = [_old_interp(w, old, zone) for w in weights]
+        assert [table.price(w, zone=zone) for w in weights] == expected
+        assert table.price(weights, zone=zone).tolist() == expected
+    assert calculate_air_freight(1.3, table) == _old_interp(1.3, old, "Zona 5")
+    # El DataFrame de antes sigue siendo aceptado
+    assert calculate_air_freight(1.3, old) == _old_interp(1.3, old, "Zona 5")
+
+
+def test_step_pricing_by_half_kilo_bracket(rates_csv):
+    """Por escalón: se redondea a 0.5 kg y se cobra la primera fila que lo cubre"""
+    table = load_freight_rates(rates_csv)
+    weights = [0.2, 0.5, 0.51, 1.0, 1.01, 2.0, 2.2, 12.0]
+    assert table.price(weights, zone=5, pricing="step").tolist() == [
+        35.75, 35.75, 1041.5, 1041.5, 58.0, 58.0, 1240.0, 1240.0
+    ]
+    assert calculate_air_freight(0.7, table, zone="Zona 1", pricing="step") == 30.10
+
+
+def test_missing_zone_or_file(tmp_path, rates_csv):
+    table = load_freight_rates(rates_csv)
+    assert calculate_air_freight(1.0, table, zone="Zona 9") == 0.0
+    assert calculate_air_freight(1.0, None) == 0.0
+    assert load_freight_rates(tmp_path / "no_existe.csv") is None
+    with pytest.raises(ValueError):
+        table.price(1.0, zone="Zona 9")
+    with pytest.raises(ValueError):
+        table.price(1.0, pricing="promedio")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+🧪 Test Import Tax Calculator - cálculo en lote
+===============================================
+
+Verifica que calculate_batch dé, fila por fila, exactamente los mismos montos
+que calculate_all_taxes sobre una grilla de CIF x importador x destino x
+origen x provincia x derechos, incluidos los casos de redondeo al medio centavo,
+y que la tabla de perfiles de alícuotas se pueda recargar desde un archivo versionado.
+"""
+
+import itertools
+import json
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from import_tax_calculator import (
+    BATCH_TAX_KEYS, DestinoImportacion, ImportData, ImportTaxCalculator,
+    OrigenMercancia, RateProfile, TipoImportador
+)
+
+CIF_VALUES = [0.01, 0.5, 1.25, 16.5, 99.99, 150.0, 1234.567, 10000.0, 33333.335, 987654.3219]
+DUTIES = [None, 0, 2, 12.6, 35.0]
+PROVINCES = ["CABA", "CORDOBA", "TIERRA_DEL_FUEGO"]
+
+
+def _grid():
+    return list(itertools.product(CIF_VALUES, TipoImportador, DestinoImportacion, OrigenMercancia,
+                                  PROVINCES, DUTIES, [False, True], [False, True]))
+
+
+def test_batch_matches_scalar_bit_for_bit():
+    """Cada monto, alícuota y total del lote es idéntico al float del Decimal escalar"""
+    calculator = ImportTaxCalculator()
+    grid = _grid()
+    columns = list(zip(*grid))
+    batch = calculator.calculate_batch(
+        cif_values=columns[0], tipo_importador=columns[1], destino=columns[2], origen=columns[3],
+        provincia=columns[4], derechos_importacion_pct=columns[5],
+        es_bien_capital=columns[6], tiene_exencion_iva=columns[7]
+    )
+    assert len(batch) == len(grid)
+
+    for row, (cif, tipo, destino, origen, provincia, pct, capital, exento) in zip(batch.itertuples(), grid):
+        scalar = calculator.calculate_all_taxes(ImportData(
+            cif_value=Decimal(str(cif)), tipo_importador=tipo, destino=destino, origen=origen,
+            derechos_importacion_pct=Decimal(str(pct)) if pct is not None else None,
+            es_bien_capital=capital, tiene_exencion_iva=exento, provincia=provincia
+        ))
+        for key, tax in zip(BATCH_TAX_KEYS, scalar.impuestos):
+            assert getattr(row, f"{key}_monto") == float(tax.monto), (key, cif, tipo, destino, pct)
+            assert getattr(row, f"{key}_alicuota") == float(tax.alicuota), (key, cif, pct)
+            assert getattr(row, f"{key}_aplica") == tax.aplica, (key, cif, tipo, destino)
+        base_iva = Decimal(str(cif)) + scalar.impuestos[0].monto + scalar.impuestos[1].monto
+        assert row.base_imponible_iva == float(base_iva)
+        assert row.total_impuestos == float(scalar.total_impuestos)
+        assert row.costo_total == float(scalar.costo_total)
+        assert row.incidencia_porcentual == float(scalar.incidencia_porcentual)
+
+
+def test_batch_broadcasts_scalars_and_accepts_strings():
+    """Los argumentos únicos se repiten en todas las filas y los enums aceptan su valor"""
+    calculator = ImportTaxCalculator()
+    batch = calculator.calculate_batch([1000, 2000.5], tipo_importador="monotributista",
+                                       destino="uso_propio", derechos_importacion_pct=[None, 18])
+    assert batch["tipo_importador"].tolist() == ["monotributista", "monotributista"]
+    assert batch["percepcion_ganancias_monto"].tolist() == [0.0, 0.0]
+    assert batch["iibb_aplica"].tolist() == [False, False]
+    assert batch["derechos_importacion_monto"].tolist() == [0.0, 360.09]
+
+
+def test_batch_large_values_use_exact_integers():
+    """Valores fuera del rango seguro de int64 se calculan igual, con enteros de Python"""
+    calculator = ImportTaxCalculator()
+    cif = Decimal("123456789012.123456789")
+    batch = calculator.calculate_batch([cif], derechos_importacion_pct=[Decimal("35")])
+    scalar = calculator.calculate_all_taxes(ImportData(
+        cif_value=cif, tipo_importador=TipoImportador.RESPONSABLE_INSCRIPTO,
+        destino=DestinoImportacion.REVENTA, origen=OrigenMercancia.EXTRAZONA,
+        derechos_importacion_pct=Decimal("35")
+    ))
+    assert batch["total_impuestos"][0] == float(scalar.total_impuestos)
+    assert batch["costo_total"][0] == float(scalar.costo_total)
+
+
+def test_batch_rejects_invalid_input():
+    """CIF no positivo, enums inválidos y largos distintos fallan como en el escalar"""
+    calculator = ImportTaxCalculator()
+    with pytest.raises(ValueError):
+        calculator.calculate_batch([100, 0])
+    with pytest.raises(ValueError):
+        calculator.calculate_batch([100], tipo_importador="consumidor")
+    with pytest.raises(ValueError):
+        calculator.calculate_batch([100, 200], provincia=["CABA"])
+
+
+def test_rate_profiles_keep_known_results():
+    """La tabla de perfiles reproduce el cálculo de referencia (RI, reventa, extrazona)"""
+    calculator = ImportTaxCalculator()
+    assert len(calculator.rate_profiles) == 3 * 3 * 2 * (len(calculator.iibb_rates) + 1)
+    result = calculator.calculate_all_taxes(ImportData(
+        cif_value=Decimal("10000"), tipo_importador=TipoImportador.RESPONSABLE_INSCRIPTO,
+        destino=DestinoImportacion.REVENTA, origen=OrigenMercancia.EXTRAZONA,
+        derechos_importacion_pct=Decimal("16")
+    ))
+    assert [tax.monto for tax in result.impuestos] == [
+        Decimal("1600.00"), Decimal("300.00"), Decimal("2499.00"),
+        Decimal("2380.00"), Decimal("714.00"), Decimal("297.50")
+    ]
+    assert calculator.rate_profile(TipoImportador.MONOTRIBUTISTA, DestinoImportacion.USO_PROPIO,
+                                   OrigenMercancia.MERCOSUR, "JUJUY") == RateProfile(
+        tasa_estadistica=None, iva=Decimal("0.21"), iva_bien_capital=Decimal("0.105"),
+        percepcion_iva=None, percepcion_ganancias=None, iibb=None
+    )
+
+
+def test_rates_config_reload_drives_scalar_and_batch(tmp_path):
+    """Un archivo de alícuotas nuevo cambia el escalar y el lote por igual"""
+    config_path = tmp_path / "alicuotas.json"
+    ImportTaxCalculator().save_rates_config(config_path)
+    config = json.loads(config_path.read_text(encoding="utf-8"))
+    assert ImportTaxCalculator(rates_config=config_path).rate_profiles == ImportTaxCalculator().rate_profiles
+
+    config["version"] = "2026-01"
+    config["tax_rates"]["tasa_estadistica"] = "0.025"
+    config["iibb_rates"]["MENDOZA"] = "0.0375"
+    config_path.write_text(json.dumps(config), encoding="utf-8")
+
+    calculator = ImportTaxCalculator()
+    calculator.load_rates_config(config_path)
+    assert calculator.rates_version == "2026-01"
+    scalar = calculator.calculate_all_taxes(ImportData(
+        cif_value=Decimal("1234.56"), tipo_importador=TipoImportador.RESPONSABLE_INSCRIPTO,
+        destino=DestinoImportacion.REVENTA, origen=OrigenMercancia.EXTRAZONA, provincia="MENDOZA"
+    ))
+    batch = calculator.calculate_batch([Decimal("1234.56")], provincia="MENDOZA")
+    assert scalar.impuestos[1].alicuota == Decimal("0.025")
+    assert scalar.impuestos[5].alicuota == Decimal("0.0375")
+    for key, tax in zip(BATCH_TAX_KEYS, scalar.impuestos):
+        assert batch[f"{key}_monto"][0] == float(tax.monto)
+
+    config["schema_version"] = 99
+    config_path.write_text(json.dumps(config), encoding="utf-8")
+    with pytest.raises(ValueError):
+        calculator.load_rates_config(config_path)
+    assert calculator.rates_version == "2026-01"
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+🧪 Test Landed Cost Grid
+========================
+
+Verifica que la grilla de sensibilidad dé el mismo landed cost que el recálculo
+de la app combinación por combinación, cotizando el courier una sola vez por
+escalón de peso.
+"""
+
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from freight_estimation import RateTable
+from import_tax_calculator import calcular_impuestos_importacion
+from landed_cost_grid import (
+    FLETE_COURIER, FLETE_MARITIMO, calculate_shipping_metrics, landed_cost_grid
+)
+
+PRODUCT = {"packaging_type": "individual", "weight_kg": 0.35,
+           "dimensions_cm": {"length": 20.0, "width": 15.0, "height": 10.0}}
+NCM_RESULT = {"tratamiento_arancelario": {"derechos_importacion": "20.0%"}}
+CONFIG = {"tipo_importador": "responsable_inscripto", "destino_importacion": "reventa", "provincia": "CORDOBA"}
+
+
+class _CountingQuote:
+    """Cotizador courier de prueba: 12 USD por kg, cuenta las llamadas"""
+
+    def __init__(self):
+        self.weights = []
+
+    def __call__(self, weight_kg):
+        self.weights.append(weight_kg)
+        return 12.0 * weight_kg, "TEST - Express"
+
+
+def test_grid_matches_app_formula():
+    """Cada celda coincide con impuestos + flete unitario + honorarios de la app"""
+    prices, quantities, fx_rates = [9.99, 25.5, 120.0], [1, 10, 50], [1000.0, 1746.96]
+    quote = _CountingQuote()
+    grid = landed_cost_grid(PRODUCT, prices, quantities, fx_rates, [FLETE_COURIER, FLETE_MARITIMO],
+                            ncm_result=NCM_RESULT, configuracion=CONFIG, quote_fn=quote)
+    assert len(grid) == 3 * 3 * 2 * 2
+
+    for (price, quantity, fx, mode), row in grid.iterrows():
+        taxes = calcular_impuestos_importacion(cif_value=price, tipo_importador="responsable_inscripto",
+                                               destino="reventa", origen="extrazona", provincia="CORDOBA",
+                                               derechos_importacion_pct=20.0)
+        metrics = calculate_shipping_metrics(PRODUCT, quantity)
+        assert row["impuestos_usd"] == float(taxes.total_impuestos)
+        if mode == FLETE_COURIER:
+            # Cotizado por el escalón de 0.5 kg que cubre el peso facturable
+            bracket = math.ceil(metrics["peso_facturable_kg"] / 0.5) * 0.5
+            assert row["flete_total_usd"] == 12.0 * bracket
+            assert row["metodo_flete"] == "TEST - Express"
+        else:
+            assert row["flete_total_usd"] == metrics["volumen_total_cbm"] * 90.0
+        flete_unitario = row["flete_total_usd"] / quantity
+        expected = price + float(taxes.total_impuestos) + flete_unitario + price * 0.02
+        assert row["landed_cost_usd"] == expected
+        assert row["landed_cost_ars"] == expected * fx
+        assert row["landed_cost_total_usd"] == expected * quantity
+
+    # Una cotización por escalón de peso, no por combinación
+    assert sorted(quote.weights) == [1.0, 5.5, 25.5]
+    assert grid.attrs["cotizaciones_courier"] == 3
+
+
+def test_courier_failure_falls_back_to_rate_table():
+    """Si el cotizador falla se usa la tabla de tarifas, también una vez por escalón"""
+    calls = []
+
+    def failing_quote(weight_kg):
+        calls.append(weight_kg)
+        raise RuntimeError("sin conexión")
+
+    rates = RateTable([0.5, 1.0, 30.0], {"Zona 5": [20.0, 30.0, 300.0]})
+    grid = landed_cost_grid(PRODUCT, [10.0, 20.0], [1], [1000.0, 1500.0], [FLETE_COURIER],
+                            quote_fn=failing_quote, freight_rates=rates)
+    assert calls == [1.0]
+    assert set(grid["flete_total_usd"]) == {30.0}
+    assert set(grid["metodo_flete"]) == {"Fallback DHL Zona 5"}
+    assert grid.loc[(20.0, 1, 1500.0, FLETE_COURIER), "flete_unitario_usd"] == 30.0
+
+
+def test_grid_rejects_unknown_freight_mode():
+    with pytest.raises(ValueError):
+        landed_cost_grid(PRODUCT, [10.0], [1], [1000.0], ["Tren"], quote_fn=_CountingQuote())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+🧪 Test LLM Response Cache
+==========================
+
+Verifica claves por contenido, expiración por TTL, desalojo LRU y que las
+respuestas cacheadas eviten la llamada a la API.
+"""
+
+import asyncio
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from llm_cache import LLMResponseCache, acached_chat_completion, make_cache_key
+
+
+class _CountingClient:
+    """Cliente con la forma de AsyncOpenAI que cuenta las llamadas a la API"""
+
+    def __init__(self, content):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._content = content
+
+    async def _create(self, **request):
+        self.calls += 1
+        message = SimpleNamespace(content=self._content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _complete(client, cache, **request):
+    return asyncio.run(acached_chat_completion(client, cache=cache, **request))
+
+
+def _messages(text, image_b64=None):
+    content = [{"type": "text", "text": text}]
+    if image_b64:
+        content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}})
+    return [{"role": "system", "content": "Responde en JSON."}, {"role": "user", "content": content}]
+
+
+def test_key_normalizes_whitespace_and_hashes_images():
+    """Espacios irrelevantes no cambian la clave; el contenido de la imagen sí"""
+    base = make_cache_key("gpt-4o-mini", _messages("Televisor  LED 55\"", "QUJD"), temperature=0)
+    assert base == make_cache_key("gpt-4o-mini", _messages("  Televisor LED 55\" ", "QUJD"), temperature=0)
+    assert base != make_cache_key("gpt-4o-mini", _messages("Televisor LED 55\"", "REVG"), temperature=0)
+    assert base != make_cache_key("gpt-4o-mini", _messages("Televisor LED 55\"", "QUJD"), temperature=0.1)
+    assert base != make_cache_key("gpt-4o", _messages("Televisor LED 55\"", "QUJD"), temperature=0)
+
+
+def test_cached_completion_skips_api_on_hit(tmp_path):
+    """La segunda llamada idéntica se responde desde disco, también tras reabrir"""
+    path = tmp_path / 'llm.sqlite3'
+    client = _CountingClient(json.dumps({"ncm_inicial_estimado": "8528.72.00"}))
+    request = dict(model="gpt-4o-mini", messages=_messages("Televisor"), temperature=0,
+                   response_format={"type": "json_object"})
+
+    cache = LLMResponseCache(path)
+    first = _complete(client, cache=cache, **request)
+    second = _complete(client, cache=cache, **request)
+    cache.close()
+    assert first == second
+    assert client.calls == 1
+
+    reopened = LLMResponseCache(path)
+    assert _complete(client, cache=reopened, **request) == first
+    assert client.calls == 1
+    reopened.close()
+
+
+def test_invalid_json_is_not_cached(tmp_path):
+    """Una respuesta que no es JSON válido no queda guardada para siempre"""
+    cache = LLMResponseCache(tmp_path / 'llm.sqlite3')
+    client = _CountingClient("no es json")
+    request = dict(model="gpt-4o-mini", messages=_messages("Televisor"), temperature=0,
+                   response_format={"type": "json_object"})
+    _complete(client, cache=cache, **request)
+    _complete(client, cache=cache, **request)
+    assert client.calls == 2
+    assert len(cache) == 0
+    cache.close()
+
+
+def test_locked_cache_falls_through_to_api(tmp_path, monkeypatch):
+    """Un "database is locked" al leer no hace fallar la clasificación: se consulta la API"""
+    cache = LLMResponseCache(tmp_path / 'llm.sqlite3')
+
+    def locked(key):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "get", locked)
+    client = _CountingClient("respuesta")
+    request = dict(model="gpt-4o-mini", messages=_messages("Televisor"), temperature=0)
+    assert _complete(client, cache=cache, **request) == "respuesta"
+    assert _complete(client, cache=cache, **request) == "respuesta"
+    assert client.calls == 2
+    cache.close()
+
+
+def test_ttl_expiry_and_lru_eviction(tmp_path):
+    """Las entradas vencidas no se devuelven y se desaloja la menos usada"""
+    expired = LLMResponseCache(tmp_path / 'ttl.sqlite3', ttl_seconds=-1)
+    expired.put('a', '1')
+    assert expired.get('a') is None
+    expired.close()
+
+    cache = LLMResponseCache(tmp_path / 'lru.sqlite3', max_entries=2)
+    cache.put('a', '1')
+    time.sleep(0.01)
+    cache.put('b', '2')
+    time.sleep(0.01)
+    assert cache.get('a') == '1'  # 'b' pasa a ser la menos usada
+    time.sleep(0.01)
+    cache.put('c', '3')
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    cache.close()
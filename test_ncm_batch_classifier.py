@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Batch Classifier
+============================
+
+Verifica la clasificación en lote: concurrencia acotada, deduplicación de
+descripciones idénticas, lectura CSV/JSONL y reanudación desde el checkpoint.
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ai_ncm_deep_classifier import DeepNCMClassifier
+from ncm_batch_classifier import classify_file, load_checkpoint, read_products
+
+
+class _FakeClassifier(DeepNCMClassifier):
+    """Clasificador sin red: registra llamadas y concurrencia"""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def classify_product_deep(self, description, image_url=None):
+        self.calls.append(description)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return {"final_classification": {"ncm_completo": f"NCM-{description}"}}
+
+
+def test_classify_many_bounds_concurrency_and_deduplicates():
+    """Nunca hay más productos en proceso que el límite y los duplicados se clasifican una vez"""
+    classifier = _FakeClassifier()
+    products = [{"id": i, "description": f"producto {i % 6}"} for i in range(20)]
+
+    async def collect():
+        return [item async for item in classifier.classify_many(products, concurrency=3)]
+
+    items = asyncio.run(collect())
+    assert sorted(int(item["id"]) for item in items) == list(range(20))
+    assert len(classifier.calls) == 6
+    assert classifier.max_in_flight <= 3
+    assert sum(item["deduplicated"] for item in items) == 14
+    for item in items:
+        assert item["result"]["final_classification"]["ncm_completo"] == f"NCM-{item['description']}"
+
+
+def test_read_products_from_csv(tmp_path):
+    """Las columnas en español y los ids faltantes se normalizan"""
+    csv_path = tmp_path / 'catalogo.csv'
+    csv_path.write_text("sku,descripcion,imagen\nA1,Televisor LED,\n,Cable USB,http://x/img.jpg\n", encoding='utf-8')
+    products = list(read_products(csv_path))
+    assert products == [
+        {"id": "A1", "description": "Televisor LED", "image_url": None},
+        {"id": "2", "description": "Cable USB", "image_url": "http://x/img.jpg"},
+    ]
+
+
+def test_resume_skips_completed_and_retries_errors(tmp_path):
+    """Tras una caída se retoma sin repetir productos ya clasificados"""
+    input_path = tmp_path / 'catalogo.jsonl'
+    input_path.write_text("".join(
+        json.dumps({"id": f"p{i}", "description": f"producto {i}"}) + "\n" for i in range(5)
+    ), encoding='utf-8')
+    output_path = tmp_path / 'salida.jsonl'
+    output_path.write_text(
+        json.dumps({"id": "p0", "result": {"final_classification": {}}}) + "\n"
+        + json.dumps({"id": "p1", "result": {"error": "timeout"}}) + "\n"
+        + '{"id": "p2", "res', encoding='utf-8'
+    )
+
+    assert load_checkpoint(output_path) == {"p0"}
+    assert output_path.read_text(encoding='utf-8').endswith("\n")
+
+    classifier = _FakeClassifier()
+    stats = asyncio.run(classify_file(input_path, output_path, classifier=classifier, concurrency=2))
+    assert stats["total"] == 5
+    assert stats["skipped"] == 1
+    assert stats["classified"] == 4
+    assert sorted(classifier.calls) == [f"producto {i}" for i in range(1, 5)]
+    assert load_checkpoint(output_path) == {f"p{i}" for i in range(5)}
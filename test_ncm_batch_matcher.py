@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Batch Matcher
+=========================
+
+Verifica que el motor de lotes produzca los mismos resultados que
+match_position consulta por consulta, en proceso y con pool de procesos.
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ncm_batch_matcher import NCMBatchMatcher, load_batch_queries
+from test_ncm_position_matcher import RECORDS
+
+QUERIES = [
+    '8528.72.00 190Y', '8528.72.00.190Y', '8528.72.00', '85287200', '0101.21.00 100W',
+    'televisores lcd', 'caballos sangre pura', '8528', '', 'zzzz sin coincidencias', '85.28.72.00',
+]
+
+
+def _strip_timing(result):
+    return {k: v for k, v in result.items() if k != 'processing_time_ms'}
+
+
+def _dataset(tmp_path) -> Path:
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    json_path.write_text(json.dumps({'metadata': {}, 'records': RECORDS}), encoding='utf-8')
+    return json_path
+
+
+def _batch_results(batch: NCMBatchMatcher):
+    async def collect():
+        results = [None] * len(QUERIES)
+        async for index, result in batch.iter_matches(QUERIES):
+            results[index] = result
+        return results
+    return asyncio.run(collect())
+
+
+def test_batch_matches_single_queries(tmp_path):
+    """Cada resultado del lote es igual al de match_position (en proceso y con pool)"""
+    batch = NCMBatchMatcher(str(_dataset(tmp_path)), workers=1)
+    expected = [asyncio.run(batch.matcher.match_position(q)) for q in QUERIES]
+    expected = [_strip_timing(r) for r in expected]
+
+    assert [_strip_timing(r) for r in _batch_results(batch)] == expected
+
+    batch.workers, batch.chunk_size = 2, 1
+    assert [_strip_timing(r) for r in _batch_results(batch)] == expected
+
+
+def test_run_streams_jsonl_with_stats(tmp_path):
+    """La salida JSONL tiene una línea por consulta con su índice y hay estadísticas por tipo"""
+    queries_path = tmp_path / 'consultas.txt'
+    queries_path.write_text('8528.72.00 190Y\ntelevisores lcd\n\nzzzz\n', encoding='utf-8')
+    queries = load_batch_queries(queries_path)
+    assert queries == ['8528.72.00 190Y', 'televisores lcd', 'zzzz']
+
+    batch = NCMBatchMatcher(str(_dataset(tmp_path)), workers=1)
+    output_path = tmp_path / 'resultados.jsonl'
+    stats = asyncio.run(batch.run(queries, output_path))
+
+    lines = [json.loads(line) for line in output_path.read_text(encoding='utf-8').splitlines()]
+    assert sorted(line['batch_index'] for line in lines) == [0, 1, 2]
+    assert stats['total'] == 3
+    assert stats['exacto'] == 1
+    assert stats['exacto'] + stats['aproximado'] + stats['sin_resultados'] + stats['error'] == 3
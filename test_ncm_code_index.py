@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Code Index
+======================
+
+Verifica que el índice jerárquico por prefijos devuelva los mismos registros,
+y en el mismo orden, que un recorrido lineal del dataset.
+"""
+
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ncm_official_integration import NCMCodeIndex
+
+RECORDS = [
+    {'code_searchable': '85287200', 'chapter': 85, 'sim': '', 'record_type': 'subcategory'},
+    {'code_searchable': '01012100', 'chapter': 1, 'sim': '100W', 'record_type': 'terminal'},
+    {'code_searchable': '85287100', 'chapter': 85, 'sim': '', 'record_type': 'terminal'},
+    {'code_searchable': '85287200', 'chapter': 85, 'sim': '900F', 'record_type': 'terminal'},
+    {'code_searchable': '01012900', 'chapter': 1, 'sim': '', 'record_type': 'subcategory'},
+    {'code_searchable': '85171300', 'chapter': 85, 'sim': '', 'record_type': 'terminal'},
+    {'code_searchable': '85287200', 'chapter': 85, 'sim': '190Y', 'record_type': 'terminal'},
+]
+
+
+def _linear_prefix(prefix):
+    return [i for i, r in enumerate(RECORDS) if r['code_searchable'].startswith(prefix)]
+
+
+def test_prefix_queries_match_linear_scan():
+    index = NCMCodeIndex(RECORDS)
+    for prefix in ['85', '8528', '852872', '85287200', '01', '0101', '99', '']:
+        assert index.positions_with_prefix(prefix) == _linear_prefix(prefix)
+        assert index.count_prefix(prefix) == len(_linear_prefix(prefix))
+        # Con límite se devuelven los primeros en orden del dataset
+        assert index.positions_with_prefix(prefix, limit=2) == _linear_prefix(prefix)[:2]
+    assert index.positions_with_prefix('85', limit=0) == []
+
+
+def test_exact_code_and_chapter_queries():
+    index = NCMCodeIndex(RECORDS)
+    assert index.positions_for_code('85287200') == [0, 3, 6]
+    assert index.positions_for_code('852872') == []
+    assert index.chapter_positions(1) == [1, 4]
+    assert index.chapter_positions(2) == []
+
+
+def test_hash_lookups_and_terminal_children():
+    index = NCMCodeIndex(RECORDS)
+    assert index.first_position('85287200') == 0
+    assert index.first_position('99999999') is None
+    assert index.position_for_code_sim('85287200', '190Y') == 6
+    assert index.position_for_code_sim('85287200', ' 900F ') == 3
+    assert index.position_for_code_sim('85287200', '') == 0
+    assert index.position_for_code_sim('85287100', '100W') is None
+    # Solo terminales con SIM, ordenados por SIM
+    assert index.terminal_children('85287200') == [6, 3]
+    assert index.terminal_children('85287100') == []
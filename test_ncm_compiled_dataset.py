@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Compiled Dataset
+============================
+
+Verifica que el formato binario columnar reproduzca exactamente los registros
+del dataset JSON consolidado y que se detecten artefactos desactualizados.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ncm_compiled_dataset import (
+    CompiledNCMDataset,
+    compile_ncm_dataset,
+    compiled_path_for,
+    is_compiled_dataset_fresh,
+    load_compiled_dataset,
+)
+
+SAMPLE_RECORDS = [
+    {'file': 'capitulo_01.pdf', 'chapter': 1, 'code': '0101.21.00', 'sim': '',
+     'description': '- - Reproductores de raza pura', 'aec': 0.0, 'die': 0.0, 'te': 0.0,
+     'in': '', 'de': 0.0, 're': 0.0, 'code_searchable': '01012100', 'parent': '010121',
+     'parent_searchable': '010121', 'hierarchy_level': 4, 'record_type': 'subcategory'},
+    {'file': 'capitulo_01.pdf', 'chapter': 1, 'code': '0101.21.00', 'sim': '100W',
+     'description': 'Sangre pura de carrera', 'aec': 0.0, 'die': 0.0, 'te': 0.0,
+     'in': 'LA', 'de': 9.0, 're': 0.5, 'code_searchable': '01012100', 'parent': '010121',
+     'parent_searchable': '010121', 'hierarchy_level': 4, 'record_type': 'terminal'},
+    {'file': 'capitulo_85.pdf', 'chapter': 85, 'code': '8528.72.00', 'sim': '190Y',
+     'description': 'Los demás, con pantalla de ñandú "ÁÉÍ"', 'aec': 20.0, 'die': 0.0, 'te': 3.0,
+     'in': '', 'de': 0.0, 're': 0.1, 'code_searchable': '85287200', 'parent': None,
+     'parent_searchable': None, 'hierarchy_level': 4, 'record_type': 'terminal'},
+]
+
+
+def _write_dataset(path: Path) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': {'version': 'test'}, 'records': SAMPLE_RECORDS}, f, ensure_ascii=False)
+
+
+def test_roundtrip_matches_json_records(tmp_path):
+    """Cada vista del dataset compilado es igual al registro JSON original"""
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    _write_dataset(json_path)
+
+    compiled_path = compile_ncm_dataset(json_path)
+    dataset = CompiledNCMDataset(compiled_path)
+    try:
+        assert len(dataset) == len(SAMPLE_RECORDS)
+        assert dataset.metadata == {'version': 'test'}
+        for view, record in zip(dataset, SAMPLE_RECORDS):
+            assert view.to_dict() == record
+            assert view.get('missing_field', 'default') == 'default'
+        assert dataset[-1]['parent'] is None
+        assert dataset.column('code_searchable') == [r['code_searchable'] for r in SAMPLE_RECORDS]
+        assert dataset.column('aec').tolist() == [r['aec'] for r in SAMPLE_RECORDS]
+    finally:
+        dataset.close()
+
+
+def test_stale_artifact_is_ignored(tmp_path):
+    """Si el JSON fuente cambia, el artefacto compilado deja de usarse"""
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    _write_dataset(json_path)
+    assert load_compiled_dataset(json_path) is None
+
+    compile_ncm_dataset(json_path)
+    assert is_compiled_dataset_fresh(json_path)
+
+    stat = json_path.stat()
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not is_compiled_dataset_fresh(json_path)
+    assert load_compiled_dataset(json_path) is None
+    assert compiled_path_for(json_path).exists()
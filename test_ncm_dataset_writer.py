@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Dataset Writer
+==========================
+
+Verifica que el escritor en streaming del dataset consolidado produzca los
+mismos registros y metadata que escribir todo de una vez, en JSON, JSONL y CSV,
+y que el CSV tenga columnas y tipos fijos en todos los capítulos.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root / "pdf_reader" / "ncm"))
+
+from ncm_dataset_writer import DATASET_COLUMNS, PYARROW_AVAILABLE, NCMDatasetWriter
+
+
+def _record(chapter, code, record_type, parent='0101'):
+    return {'file': f'capitulo_{chapter:02d}.pdf', 'chapter': chapter, 'code': code, 'sim': '100W',
+            'description': f'Producto {code} "ñandú"', 'aec': 2.0, 'die': 0.0, 'te': 3.0, 'in': '',
+            'de': 0.0, 're': 0.5, 'code_searchable': code.replace('.', ''), 'parent': parent,
+            'parent_searchable': parent, 'hierarchy_level': 4, 'record_type': record_type}
+
+
+CHAPTERS = [
+    [_record(1, '0101.21.00', 'subcategory'), _record(1, '0101.21.00', 'terminal')],
+    [_record(2, '0201.10.00', 'terminal', parent=None)],
+]
+
+
+def test_streamed_chapters_match_single_write(tmp_path):
+    """Escribir por capítulos da los mismos archivos que escribir todo junto"""
+    with NCMDatasetWriter(tmp_path / "stream", timestamp="t") as streamed:
+        for chapter in CHAPTERS:
+            streamed.write_records(chapter)
+    with NCMDatasetWriter(tmp_path / "once", timestamp="t") as once:
+        once.write_records([r for chapter in CHAPTERS for r in chapter])
+
+    all_records = [r for chapter in CHAPTERS for r in chapter]
+    data = json.loads(streamed.json_file.read_text(encoding='utf-8'))
+    assert data['records'] == all_records
+    assert data['metadata']['total_records'] == 3
+    assert data['metadata']['chapters_processed'] == [1, 2]
+    assert data['metadata']['record_type_distribution'] == {'subcategory': 1, 'terminal': 2}
+
+    lines = streamed.jsonl_file.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == all_records
+    assert streamed.csv_file.read_bytes() == once.csv_file.read_bytes()
+    assert pd.read_csv(streamed.csv_file)['code'].tolist() == [r['code'] for r in all_records]
+
+    assert streamed.stats.with_hierarchy == 2
+    assert len(streamed.stats.unique_codes) == 2
+    # Sin archivos temporales al cerrar
+    assert not list((tmp_path / "stream").glob("*.tmp"))
+
+
+def test_csv_columns_and_types_are_fixed(tmp_path):
+    """Cada capítulo se escribe con las mismas columnas y tipos, aunque traiga nulos o claves en otro orden"""
+    no_level = dict(_record(3, '0301.11.00', 'terminal'), hierarchy_level=None)
+    reordered = dict(reversed(list(_record(4, '0401.10.00', 'terminal').items())))
+    with NCMDatasetWriter(tmp_path, timestamp="t") as writer:
+        writer.write_records(CHAPTERS[0])
+        writer.write_records([no_level])
+        writer.write_records([reordered])
+
+    lines = writer.csv_file.read_text(encoding='utf-8').splitlines()
+    assert lines[0] == ','.join(DATASET_COLUMNS)
+    assert len(lines) == 5
+    rows = pd.read_csv(writer.csv_file, dtype=str, keep_default_na=False)
+    assert rows['hierarchy_level'].tolist() == ['4', '4', '', '4']
+    assert rows['code'].tolist() == ['0101.21.00', '0101.21.00', '0301.11.00', '0401.10.00']
+    assert rows['aec'].tolist() == ['2.0'] * 4
+
+
+def test_failed_write_leaves_no_dataset(tmp_path):
+    """Un error a mitad de la escritura no deja un dataset parcial"""
+    with pytest.raises(RuntimeError):
+        with NCMDatasetWriter(tmp_path, timestamp="t") as writer:
+            writer.write_records(CHAPTERS[0])
+            raise RuntimeError("corte")
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.skipif(not PYARROW_AVAILABLE, reason="pyarrow no instalado")
+def test_parquet_output(tmp_path):
+    """El Parquet opcional contiene todos los registros con esquema fijo"""
+    import pyarrow.parquet as pq
+
+    with NCMDatasetWriter(tmp_path, timestamp="t", parquet=True) as writer:
+        for chapter in CHAPTERS:
+            writer.write_records(chapter)
+    table = pq.read_table(writer.parquet_file)
+    assert table.to_pylist() == [r for chapter in CHAPTERS for r in chapter]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Incremental Extraction
+==================================
+
+Verifica que la reconstrucción del dataset NCM extraiga solo los capítulos
+cuyo PDF cambió y que el consolidado resultante sea el de una extracción completa.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root / "pdf_reader" / "ncm"))
+
+from ncm_extractor_hybrid_fix import MANIFEST_FILENAME, NCMExtractorHybridFix
+
+
+def _fake_extract(calls):
+    """Reemplazo de extract_from_pdf: un registro derivado del contenido del PDF"""
+    def extract_from_pdf(self, pdf_path, chapter_num):
+        calls.append(chapter_num)
+        content = pdf_path.read_text()
+        record = {'ncm': f'{chapter_num:02d}01.10.00', 'sim': '100A', 'descripcion': content,
+                  'aec': 2.0, 'die': 0.0, 'te': 0.0, 'in': '', 'de': 0.0, 're': 0.0}
+        return [record], {'total_pages': 3, 'pages_processed': 1, 'records_extracted': 1,
+                          'extraction_method': 'hybrid_fix'}
+    return extract_from_pdf
+
+
+def _write_pdfs(pdf_dir, contents):
+    pdf_dir.mkdir(exist_ok=True)
+    for chapter_num, content in contents.items():
+        (pdf_dir / f"capitulo_{chapter_num:02d}.pdf").write_text(content)
+
+
+def _dataset_records(json_file):
+    with open(json_file, encoding='utf-8') as f:
+        return json.load(f)['records']
+
+
+def test_only_changed_chapters_are_extracted(tmp_path, monkeypatch):
+    """Tras cambiar un PDF se reextrae solo ese capítulo y el consolidado queda completo"""
+    calls = []
+    monkeypatch.setattr(NCMExtractorHybridFix, 'extract_from_pdf', _fake_extract(calls))
+    pdf_dir, results_dir = tmp_path / "pdf", tmp_path / "resultados"
+    _write_pdfs(pdf_dir, {1: "Caballos vivos", 2: "Carne bovina", 3: "Pescados"})
+    extractor = NCMExtractorHybridFix(pdf_dir=pdf_dir, results_dir=results_dir)
+
+    json_file, _ = extractor.build_dataset(1, 3)
+    assert calls == [1, 2, 3]
+    assert [r['description'] for r in _dataset_records(json_file)] == ["Caballos vivos", "Carne bovina", "Pescados"]
+
+    # Sin cambios: no se extrae nada y se reutiliza el consolidado
+    calls.clear()
+    assert extractor.build_dataset(1, 3)[0] == json_file
+    assert calls == []
+
+    # Actualización de un capítulo
+    _write_pdfs(pdf_dir, {2: "Carne bovina (arancel actualizado)"})
+    json_file_2, _ = extractor.build_dataset(1, 3)
+    assert calls == [2]
+    assert [r['description'] for r in _dataset_records(json_file_2)] == [
+        "Caballos vivos", "Carne bovina (arancel actualizado)", "Pescados"]
+
+    # El manifiesto no se confunde con un dataset consolidado
+    assert not MANIFEST_FILENAME.startswith("dataset_ncm_HYBRID_FIXED_")
+
+
+def test_removed_pdf_and_force(tmp_path, monkeypatch):
+    """Un PDF eliminado sale del dataset; force reextrae todo"""
+    calls = []
+    monkeypatch.setattr(NCMExtractorHybridFix, 'extract_from_pdf', _fake_extract(calls))
+    pdf_dir, results_dir = tmp_path / "pdf", tmp_path / "resultados"
+    _write_pdfs(pdf_dir, {1: "Caballos vivos", 2: "Carne bovina"})
+    extractor = NCMExtractorHybridFix(pdf_dir=pdf_dir, results_dir=results_dir)
+    extractor.update_chapters(1, 2)
+
+    (pdf_dir / "capitulo_02.pdf").unlink()
+    calls.clear()
+    records = extractor.update_chapters(1, 2)
+    assert calls == []
+    assert [r['chapter'] for r in records] == [1]
+    assert list(extractor.load_manifest()['chapters']) == ['01']
+
+    records = extractor.update_chapters(1, 2, force=True)
+    assert calls == [1]
+    assert len(records) == 1
+
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Page Cache
+======================
+
+Verifica que la caché de páginas guarde el layout por PDF + página, respete
+la versión del layout y que el extractor, con la caché llena, no vuelva a
+abrir los PDFs.
+"""
+
+import shutil
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root / "pdf_reader" / "ncm"))
+
+import ncm_extractor_hybrid_fix
+from ncm_extractor_hybrid_fix import NCMExtractorHybridFix
+from ncm_page_cache import NCMPageCache
+
+PDF_DIR = project_root / "pdf_reader" / "ncm" / "ncm_pdf"
+
+LAYOUT = {"tables": [[["0101.21.00", "100W", "Sangre pura"]]], "text_lines": ["Capítulo 1", "0101.21.00 100W ñandú 0 0"]}
+
+
+def test_cache_roundtrip_and_version(tmp_path):
+    """Las páginas se recuperan intactas y solo para la misma versión de layout"""
+    path = tmp_path / "pages.sqlite3"
+    cache = NCMPageCache(path, layout_version="1")
+    assert cache.get_page("abc", 3) is None
+    cache.put_page("abc", 3, LAYOUT)
+    cache.put_page_count("abc", 5)
+    assert cache.get_page("abc", 3) == LAYOUT
+    assert cache.get_page("abc", 4) is None
+    assert cache.get_page("otro", 3) is None
+    assert cache.get_page_count("abc") == 5
+    cache.close()
+
+    assert NCMPageCache(path, layout_version="1").get_page("abc", 3) == LAYOUT
+    assert NCMPageCache(path, layout_version="2").get_page("abc", 3) is None
+
+
+def test_cached_rerun_skips_pdf_parsing(tmp_path, monkeypatch):
+    """Con la caché llena la reextracción da lo mismo sin abrir el PDF"""
+    pdf_dir = tmp_path / "pdf"
+    pdf_dir.mkdir()
+    shutil.copy(PDF_DIR / "capitulo_01.pdf", pdf_dir / "capitulo_01.pdf")
+    extractor = NCMExtractorHybridFix(pdf_dir=pdf_dir, results_dir=tmp_path / "out",
+                                      page_cache=tmp_path / "pages.sqlite3")
+
+    records, stats = extractor.extract_from_pdf(pdf_dir / "capitulo_01.pdf", 1)
+    assert records and extractor.page_cache.misses == stats['total_pages'] - 2
+
+    def no_pdf(*args, **kwargs):
+        raise AssertionError("No debería abrirse el PDF")
+    monkeypatch.setattr(ncm_extractor_hybrid_fix.pdfplumber, 'open', no_pdf)
+
+    cached_records, cached_stats = extractor.extract_from_pdf(pdf_dir / "capitulo_01.pdf", 1)
+    assert cached_records == records
+    assert cached_stats == stats
+    assert extractor.page_cache.hits == stats['total_pages'] - 2
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Page Layout
+=======================
+
+Verifica que la extracción por página derive tablas y texto de una única
+agrupación de palabras y que una fila presente en ambos no genere registros duplicados.
+"""
+
+import sys
+from pathlib import Path
+
+import pdfplumber
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root / "pdf_reader" / "ncm"))
+
+from ncm_extractor_hybrid_fix import NCMExtractorHybridFix, NCMPageLayout
+
+PDF_DIR = project_root / "pdf_reader" / "ncm" / "ncm_pdf"
+
+ROW = ['0101.21.00', '100W', 'Sangre', 'pura', 'de', 'carrera', '0', '0', '0', '9', '0,5']
+OTHER_ROW = ['0101.29.00', '900R', 'Los', 'demás', '2', '0', '0', '0', '0']
+
+
+def test_rows_in_tables_and_text_are_not_duplicated(tmp_path):
+    """La misma fila vista por tablas y por texto produce un solo registro"""
+    extractor = NCMExtractorHybridFix(results_dir=tmp_path)
+    layout = NCMPageLayout(tables=[[ROW]], text_lines=[' '.join(ROW), ' '.join(OTHER_ROW)])
+
+    records = extractor.extract_from_layout(layout, page_num=3)
+    text_only = extractor.extract_from_layout(NCMPageLayout([], layout.text_lines), page_num=3)
+
+    assert len(text_only) == 2
+    assert records == text_only
+
+
+def test_layout_matches_pdfplumber_output(tmp_path):
+    """El layout reproduce las tablas y el texto que devuelve pdfplumber para la página"""
+    with pdfplumber.open(PDF_DIR / "capitulo_01.pdf") as pdf:
+        page = pdf.pages[2]
+        layout = NCMPageLayout.from_page(page, 3)
+        expected_lines = [line.strip() for line in page.extract_text().split('\n') if line.strip()]
+        expected_tables = page.extract_tables()
+
+        assert layout.text_lines == expected_lines
+        # Las celdas salen de las palabras de la página y coinciden con Table.extract
+        assert layout.tables == [
+            [[cell.strip() for cell in row if cell and cell.strip()] for row in table
+             if any(cell and cell.strip() for cell in row)]
+            for table in expected_tables
+        ]
+
+        extractor = NCMExtractorHybridFix(results_dir=tmp_path)
+        assert extractor.extract_tables_from_page(page, 3) == extractor.extract_from_text(page.extract_text(), 3)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Parallel Extraction
+===============================
+
+Verifica que la extracción por página con un pool de procesos (spawn) produzca
+exactamente los mismos registros que la extracción secuencial.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root / "pdf_reader" / "ncm"))
+
+from ncm_extractor_hybrid_fix import NCMExtractorHybridFix
+
+PDF_DIR = project_root / "pdf_reader" / "ncm" / "ncm_pdf"
+
+
+@pytest.mark.skipif(not (PDF_DIR / "capitulo_02.pdf").exists(), reason="PDFs NCM no disponibles")
+def test_parallel_extraction_matches_serial(tmp_path):
+    """workers=2 da los mismos registros, en el mismo orden, que workers=1"""
+    serial = NCMExtractorHybridFix(pdf_dir=PDF_DIR, results_dir=tmp_path / "serial", workers=1)
+    parallel = NCMExtractorHybridFix(pdf_dir=PDF_DIR, results_dir=tmp_path / "parallel", workers=2)
+
+    expected = serial.process_all_chapters(1, 2)
+    assert expected
+    assert parallel.process_all_chapters(1, 2) == expected
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Position Matcher
+============================
+
+Verifica la carga vectorizada de `NCMDataLoader` desde CSV y JSON consolidado
+y que la búsqueda aproximada trabaje sobre filas, materializando solo el top-k.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ncm_position_matcher import NCMCandidates, NCMDataLoader, NCMPositionMatcher
+
+RECORDS = [
+    {'file': 'capitulo_01.pdf', 'chapter': 1, 'code': '0101.21.00', 'sim': '100W',
+     'description': 'Sangre pura de carrera', 'aec': 0.0, 'die': 0.0, 'te': 0.0, 'in': 'LA',
+     'de': 9.0, 're': 0.5, 'code_searchable': '01012100', 'parent': '010121',
+     'parent_searchable': '010121', 'hierarchy_level': 4, 'record_type': 'terminal'},
+    {'file': 'capitulo_85.pdf', 'chapter': 85, 'code': '8528.72.00', 'sim': '',
+     'description': 'Los demás, en colores', 'aec': 20.0, 'die': 0.0, 'te': 3.0, 'in': '',
+     'de': 0.0, 're': 0.0, 'code_searchable': '85287200', 'parent': None,
+     'parent_searchable': None, 'hierarchy_level': 4, 'record_type': 'subcategory'},
+    {'file': 'capitulo_85.pdf', 'chapter': 85, 'code': '8528.72.00', 'sim': '190Y',
+     'description': 'Televisores LCD', 'aec': 20.0, 'die': 0.0, 'te': 3.0, 'in': '',
+     'de': 0.0, 're': 0.1, 'code_searchable': '85287200', 'parent': '852872',
+     'parent_searchable': '852872', 'hierarchy_level': 4, 'record_type': 'terminal'},
+]
+
+
+def _check_loader(loader: NCMDataLoader):
+    assert len(loader.positions) == 2
+    assert '01012100' in loader.positions
+    tv = loader.positions['85287200']
+    assert [p.sim for p in tv] == ['', '190Y']
+    horse = loader.positions['01012100'][0]
+    # Los códigos conservan ceros iniciales y los tipos son nativos
+    assert horse.code_searchable == '01012100'
+    assert horse.chapter == 1 and isinstance(horse.chapter, int)
+    assert horse.re == 0.5 and horse.in_field == 'LA'
+
+
+def test_loader_from_csv(tmp_path):
+    csv_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.csv'
+    pd.DataFrame(RECORDS).to_csv(csv_path, index=False)
+    _check_loader(NCMDataLoader(str(csv_path)))
+
+
+def test_loader_from_json_and_search(tmp_path):
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    json_path.write_text(json.dumps({'metadata': {}, 'records': RECORDS}), encoding='utf-8')
+    _check_loader(NCMDataLoader(str(json_path)))
+
+    matcher = NCMPositionMatcher(str(json_path))
+    result = matcher.search_engine.exact_search('8528.72.00 190Y')
+    assert result['position']['sim'] == '190Y'
+    candidates = matcher.search_engine.approximate_search('0101')
+    assert candidates[0]['position'].code == '0101.21.00'
+
+
+def test_approximate_search_tolerates_typos(tmp_path):
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    json_path.write_text(json.dumps({'metadata': {}, 'records': RECORDS}), encoding='utf-8')
+
+    matcher = NCMPositionMatcher(str(json_path))
+    candidates = matcher.search_engine.approximate_search('televisres')
+    assert candidates[0]['position'].sim == '190Y'
+    assert any('trigramas' in reason for reason in candidates[0]['candidate_info']['match_reasons'])
+
+
+def test_score_candidates_top_k_keeps_stable_order(tmp_path):
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    json_path.write_text(json.dumps({'metadata': {}, 'records': RECORDS}), encoding='utf-8')
+    engine = NCMPositionMatcher(str(json_path)).search_engine
+
+    candidates = NCMCandidates.build([1, 0, 2])
+    full = engine._score_candidates(candidates, 'q')
+    # Terminales empatados conservan el orden de entrada
+    assert [c['position'].sim for c in full] == ['100W', '190Y', '']
+    assert full[0]['candidate_info']['score'] == 0.5
+    top = engine._score_candidates(candidates, 'q', top_k=2)
+    assert [c['position'] for c in top] == [c['position'] for c in full[:2]]
+
+
+def test_score_candidates_from_column_arrays(tmp_path, monkeypatch):
+    """El puntaje sale de las columnas del loader y de los arreglos de la búsqueda"""
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    json_path.write_text(json.dumps({'metadata': {}, 'records': RECORDS}), encoding='utf-8')
+    engine = NCMPositionMatcher(str(json_path)).search_engine
+    loader = engine.data_loader
+    materialized = []
+    position_at = loader.position_at
+    monkeypatch.setattr(loader, 'position_at', lambda row: materialized.append(row) or position_at(row))
+
+    candidates = NCMCandidates.build([0, 1, 2], similarity=[0.2, 0.9, float('nan')],
+                                     fuzzy=[float('nan'), 0.8, float('nan')], match_level=[0, 0, 8])
+    top = engine._score_candidates(candidates, 'q', top_k=2)
+    # 0.3 terminal + 0.2 nivel + 0.3 match 8/8 | 0.2 nivel + 0.45 similitud
+    assert [(c['position'].sim, c['candidate_info']['score']) for c in top] == [('190Y', 0.8), ('', 0.65)]
+    assert materialized == [2, 1]
+    assert top[0]['candidate_info']['match_reasons'] == ["Match jerárquico nivel 8", "Registro terminal (específico)"]
+    assert top[1]['candidate_info']['match_reasons'] == ["Similitud descripción: 0.90", "Similitud por trigramas: 0.80"]
+
+
+def test_hierarchical_search_materializes_only_top_k(tmp_path, monkeypatch):
+    """La búsqueda por prefijo devuelve filas; solo los candidatos devueltos se convierten en NCMPosition"""
+    records = [dict(RECORDS[2], sim=f'{i:03d}Y', code_searchable='85287200') for i in range(30)]
+    records += [dict(RECORDS[0], code_searchable='85011000', code='8501.10.00'), RECORDS[0]]
+    json_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    json_path.write_text(json.dumps({'metadata': {}, 'records': records}), encoding='utf-8')
+    engine = NCMPositionMatcher(str(json_path)).search_engine
+    loader = engine.data_loader
+
+    for prefix in ['85', '8528', '852872', '8501', '01', '9', '']:
+        expected = [i for i, r in enumerate(records) if r['code_searchable'].startswith(prefix)]
+        assert loader.rows_with_prefix(prefix).tolist() == expected
+
+    materialized = []
+    position_at = loader.position_at
+    monkeypatch.setattr(loader, 'position_at', lambda row: materialized.append(row) or position_at(row))
+    candidates = engine.approximate_search('8528')
+    assert len(candidates) == 15
+    assert len(materialized) == 15
+    assert all(c['position'].code == '8528.72.00' for c in candidates)
+    assert 'Match jerárquico nivel 2' in candidates[0]['candidate_info']['match_reasons']
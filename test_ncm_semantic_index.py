@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Semantic Index
+==========================
+
+Verifica la recuperación semántica local (embedding por hashing) y la
+reutilización de la matriz guardada en disco.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ncm_semantic_index import HashingEmbedder, NCMSemanticIndex
+
+RECORDS = [
+    {'code_searchable': '61091000', 'description': 'Camisetas interiores'},
+    {'code_searchable': '61091000', 'description': 'De algodón'},
+    {'code_searchable': '85183000', 'description': 'Auriculares, incluidos los de casco'},
+    {'code_searchable': '87120010', 'description': 'Bicicletas'},
+    {'code_searchable': '87120010', 'description': 'Construidas en aleaciones de aluminio'},
+    {'code_searchable': '52081100', 'description': 'De algodón'},
+]
+
+
+def test_search_uses_hierarchical_context():
+    index = NCMSemanticIndex(RECORDS, embedder=HashingEmbedder(dim=256))
+    assert index.search('auriculares bluetooth', top_k=1)[0][0] == 2
+    # "De algodón" bajo camisetas le gana a "De algodón" de otro código
+    rows = [row for row, _ in index.search('camiseta de algodon', top_k=3)]
+    assert rows.index(1) < rows.index(5)
+    assert index.search('', top_k=3) == []
+
+
+def test_matrix_is_cached_next_to_dataset(tmp_path):
+    dataset_path = tmp_path / 'dataset_ncm_HYBRID_FIXED_test.json'
+    dataset_path.write_text(json.dumps({'records': RECORDS}), encoding='utf-8')
+
+    built = NCMSemanticIndex(RECORDS, embedder=HashingEmbedder(dim=256), dataset_path=dataset_path)
+    assert built.cache_path.exists()
+    assert built.vectors.dtype.name == 'float16'
+    # El artefacto no debe confundirse con un dataset consolidado
+    assert list(tmp_path.glob('dataset_ncm_HYBRID_FIXED_*.json')) == [dataset_path]
+
+    loaded = NCMSemanticIndex(RECORDS, embedder=HashingEmbedder(dim=256), dataset_path=dataset_path)
+    assert loaded.search('bicicleta aluminio', top_k=3) == built.search('bicicleta aluminio', top_k=3)
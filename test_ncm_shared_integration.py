@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Shared Integration
+==============================
+
+Verifica que la integración NCM oficial se cargue una sola vez por proceso,
+que los clasificadores la compartan salvo que se inyecte otro backend y que
+una carga fallida del dataset no quede guardada en la instancia compartida.
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+import ncm_official_integration
+from ai_ncm_deep_classifier import DeepNCMClassifier
+
+RECORDS = [{'code_searchable': '01012100', 'chapter': 1, 'sim': '100W', 'record_type': 'terminal'}]
+
+
+def _fake_integration(monkeypatch, loaded=lambda attempt: True, delay=0.0):
+    """Reemplaza NCMOfficialIntegration por una que cuenta las cargas del dataset"""
+    loads = []
+
+    class _FakeIntegration:
+        def __init__(self):
+            loads.append(1)
+            time.sleep(delay)
+            self.ncm_data = RECORDS if loaded(len(loads)) else None
+
+    monkeypatch.setattr(ncm_official_integration, 'NCMOfficialIntegration', _FakeIntegration)
+    monkeypatch.setattr(ncm_official_integration, '_ncm_integration_instance', None)
+    return loads
+
+
+def test_concurrent_first_calls_load_once(monkeypatch):
+    """Varios hilos pidiendo la integración a la vez cargan el dataset una sola vez"""
+    loads = _fake_integration(monkeypatch, delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ncm_official_integration.get_ncm_integration()))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(loads) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+
+
+def test_classifiers_share_the_process_integration(monkeypatch):
+    """Sin backend inyectado los clasificadores usan la instancia del proceso"""
+    loads = _fake_integration(monkeypatch)
+    first = DeepNCMClassifier(api_key="sk-test")
+    second = DeepNCMClassifier(api_key="sk-test")
+    assert first.ncm_integration is second.ncm_integration is ncm_official_integration.get_ncm_integration()
+    assert len(loads) == 1
+
+    backend = object()
+    assert DeepNCMClassifier(api_key="sk-test", ncm_backend=backend).ncm_integration is backend
+    assert len(loads) == 1
+
+
+def test_failed_dataset_load_is_not_cached(monkeypatch):
+    """Si el dataset no cargó, get_ncm_integration() lo reintenta en lugar de guardar la instancia vacía"""
+    loads = _fake_integration(monkeypatch, loaded=lambda attempt: attempt > 1)
+    get_ncm_integration = ncm_official_integration.get_ncm_integration
+
+    assert get_ncm_integration().ncm_data is None
+    loaded = get_ncm_integration()
+    assert loaded.ncm_data is RECORDS
+    assert get_ncm_integration() is loaded
+    assert len(loads) == 2
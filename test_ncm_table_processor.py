@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Table Processor
+===========================
+
+Corpus de regresión para la clasificación de filas del extractor NCM: cada
+registro del dataset consolidado se rearma como fila (código, SIM, palabras
+de la descripción, impuestos) con el mismo dataset_rows que mide
+benchmark_extractor.py, y el resultado de identify_row_structure +
+validate_extracted_record debe ser exactamente el de referencia.
+"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root / "pdf_reader" / "ncm"))
+
+from benchmark_extractor import dataset_rows
+from ncm_extractor_hybrid_fix import NCMTableProcessor
+
+DATASET = (project_root / "pdf_reader" / "ncm" / "resultados_ncm_hybrid"
+           / "dataset_ncm_HYBRID_FIXED_20250807_125734.json")
+
+# Huella de los resultados de referencia sobre las 49.247 filas del corpus
+CORPUS_ROWS = 49247
+CORPUS_SHA256 = "11f1653bd1fe10bedde7242a9f651d2f1ff2a19d8e1593a25fcb3348b0669918"
+
+
+def _classify(row):
+    record = NCMTableProcessor.identify_row_structure(row)
+    return [record, bool(record and NCMTableProcessor.validate_extracted_record(record))]
+
+
+@pytest.mark.skipif(not DATASET.exists(), reason="Dataset NCM consolidado no disponible")
+def test_regression_corpus_from_shipped_dataset():
+    """Toda la clasificación del corpus coincide con la huella de referencia"""
+    results = [_classify(row) for row in dataset_rows(DATASET)]
+    digest = hashlib.sha256(json.dumps(results, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+    assert len(results) == CORPUS_ROWS
+    assert all(valid for _, valid in results)
+    assert digest == CORPUS_SHA256
+
+
+def test_row_structure():
+    """Casos puntuales: códigos, referencias a otras posiciones, código IN e impuestos"""
+    record = NCMTableProcessor.identify_row_structure(
+        ['0101.21.00', '100W', 'Sangre', 'pura', 'de', 'carrera', '0', '0', '0', 'LA', '9', '0.5'])
+    assert record == {'ncm': '0101.21.00', 'sim': '100W', 'descripcion': 'Sangre pura de carrera',
+                      'aec': 0.0, 'die': 0.0, 'te': 0.0, 'in': 'LA', 'de': 9.0, 're': 0.5}
+
+    # Números con forma de código NCM (o tras "excepto") van a la descripción
+    record = NCMTableProcessor.identify_row_structure(
+        ['8528.72.00', 'Excepto', 'los', 'del', 'ítem', '85287100', '20', '0', '3'])
+    assert record['descripcion'] == 'Excepto los del ítem 85287100'
+    assert (record['aec'], record['die'], record['te']) == (20.0, 0.0, 3.0)
+
+    # Sin código NCM no hay registro; valores irreales de impuesto se descartan
+    assert NCMTableProcessor.identify_row_structure(['Los', 'demás', '2']) is None
+    record = NCMTableProcessor.identify_row_structure(['0101.29.00', 'Los', 'demás', '7777', '2'])
+    assert record['aec'] == 2.0
+
+    assert NCMTableProcessor.is_ncm_code('0101.21.00 AB')
+    assert not NCMTableProcessor.is_ncm_code(float('nan'))
+    assert NCMTableProcessor.is_sim_code(' 900R ')
+    assert NCMTableProcessor.is_numeric_value('1e5')
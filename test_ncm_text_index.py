@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+🧪 Test NCM Text Index
+======================
+
+Verifica tokenización en español y ranking BM25 del índice de descripciones.
+"""
+
+import sys
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from ncm_text_index import BM25Index, TrigramIndex, fold_accents, tokenize
+
+DOCS = [
+    'Camiones de bomberos',
+    'Los demás',
+    'Televisores en colores, con pantalla de cristal líquido (LCD)',
+    'De algodón',
+    'Camión grúa',
+    'Tejidos de algodón teñidos',
+]
+
+
+def test_tokenize_folds_accents_and_stems():
+    assert fold_accents('Camión ÑANDÚ') == 'camion nandu'
+    assert tokenize('Los televisores eléctricos') == tokenize('televisor eléctrica')
+    assert tokenize('de la con y') == []
+    assert tokenize('luces lápices') == ['luz', 'lapiz']
+
+
+def test_bm25_only_returns_documents_sharing_terms():
+    index = BM25Index(DOCS)
+    hits = index.search('camion')
+    assert {doc_id for doc_id, _ in hits} == {0, 4}
+    assert index.search('xyz inexistente') == []
+
+
+def test_bm25_ranks_more_matching_terms_first():
+    index = BM25Index(DOCS)
+    hits = index.search('tejidos de algodon')
+    assert hits[0][0] == 5
+    assert [doc_id for doc_id, _ in hits] == [5, 3]
+    assert hits[0][1] > hits[1][1] > 0
+    assert len(index.search('algodon', top_k=1)) == 1
+
+
+def test_trigram_index_tolerates_typos():
+    index = TrigramIndex(DOCS)
+    hits = index.search('camiomes', threshold=0.3)
+    assert {doc_id for doc_id, _ in hits} == {0, 4}
+    assert index.search('televisres lcd', top_k=1)[0][0] == 2
+    # Textos repetidos se expanden a todas sus filas
+    docs = DOCS + ['De algodón']
+    assert {doc_id for doc_id, _ in TrigramIndex(docs).search('algodon', threshold=0.9)} == {3, 6}
+    assert index.search('qqqq') == []
+    assert len(index.search('algodon', top_k=1, threshold=0.1)) == 1
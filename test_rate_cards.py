@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+🧪 Test Rate Cards - tarifarios offline de carriers
+===================================================
+
+Verifica la importación del tarifario PDF de DHL (precios, incrementos y
+zonificación), la importación de CSVs, el vencimiento de los tarifarios y que
+UnifiedShippingAPI cotice con el tarifario los carriers que lo tienen y consulte
+en vivo solo al resto.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from carriers_apis_conections.rate_cards import PDFPLUMBER_AVAILABLE, RateCardStore, billable_weight_kg
+from carriers_apis_conections.unified_shipping_api import ShippingQuote, UnifiedShippingAPI
+
+DHL_PDF = project_root / "pdf_reader" / "dhl_carrier" / "SUNA SOLUTIONS_AR_102628161_spa_20250704-234913-041.PDF"
+SERVICE = "EXPRESS WORLDWIDE IMPORT"
+
+
+@pytest.mark.skipif(not PDFPLUMBER_AVAILABLE or not DHL_PDF.exists(), reason="pdfplumber o tarifario DHL no disponible")
+def test_import_dhl_pdf(tmp_path):
+    """Precios por escalón, incrementos más allá de 300 kg y zonas del PDF de DHL"""
+    store = RateCardStore(tmp_path / "cards.sqlite3")
+    counts = store.import_dhl_pdf(DHL_PDF)
+    assert counts["zonas"] == 233
+    assert counts[SERVICE] > 0 and counts[f"{SERVICE} DOCUMENTOS"] > 0
+
+    # Zonas hacia Argentina, incluidos nombres partidos en dos líneas y "Islas Vírgenes (US) (VI)"
+    assert [store.zone_for("DHL", code, "AR") for code in ("CN", "US", "HK", "DO", "VI")] == ["5", "3", "5", "2", "2"]
+    assert store.zone_for("DHL", "CN", "BR") is None
+
+    def price(weight_kg, documents=False):
+        return [q.cost_usd for q in store.quote(weight_kg, "CN", "AR", documents=documents)]
+
+    assert price(0.5) == [164.06]
+    assert price(0.5, documents=True) == [124.22]
+    assert price(1.2) == price(1.5)  # Se cobra el escalón que cubre el peso
+    assert price(300) == [9795.15]
+    # 301 kg: última fila + 1 incremento de 1 kg desde 300.1 kg (zona 5: 35.32)
+    assert price(301) == [round(9795.15 + 35.32, 2)]
+    assert price(350.2) == [round(9795.15 + 51 * 35.32, 2)]
+
+
+def test_import_csv_and_expiry(tmp_path):
+    """CSV ancho y largo, comodines de zona y tarifario vencido"""
+    wide = tmp_path / "dhl.csv"
+    wide.write_text('KG,Zona 1,Zona 5\n0.5,50.00,164.06\n1.0,60.00,"1,190.00"\n', encoding="utf-8")
+    long = tmp_path / "fedex.csv"
+    long.write_text("zone,weight_kg,price\nB,1,150.0\nB,2,170.0\n", encoding="utf-8")
+
+    store = RateCardStore(tmp_path / "cards.sqlite3")
+    assert store.import_csv(wide, "DHL", SERVICE) == 4
+    assert store.import_csv(long, "FEDEX", "INTERNATIONAL PRIORITY", valid_days=-1) == 2
+    store.set_zones("DHL", {("CN", "AR"): "Zona 5", ("*", "AR"): "1"})
+    store.set_zones("FEDEX", {("CN", "*"): "B"})
+
+    quotes = store.quote(0.8, "cn", "AR")
+    assert [(q.carrier, q.zone, q.cost_usd) for q in quotes] == [("DHL", "5", 1190.0)]  # FedEx vencido
+    assert store.quote(0.8, "DE", "AR")[0].cost_usd == 60.0
+    assert store.quote(5.0, "CN", "AR") == []  # Sin incrementos cargados
+    assert store.quote(1.0, "CN", "AR", now=time.time() + 365 * 86400) == []
+
+    # Se reabre desde disco con el mismo contenido
+    reopened = RateCardStore(tmp_path / "cards.sqlite3")
+    assert [c["carrier"] for c in reopened.cards()] == ["DHL", "FEDEX"]
+    assert reopened.quote(0.8, "CN", "AR")[0].cost_usd == 1190.0
+
+
+def test_unified_api_combines_rate_cards_and_live(tmp_path, monkeypatch):
+    """Los carriers con tarifario vigente no se consultan en vivo; el resto sí, y gana el más barato"""
+    store = RateCardStore(tmp_path / "cards.sqlite3")
+    store.save_card("DHL", SERVICE, [("5", 0.5, 164.06), ("5", 1.0, 216.54), ("5", 1.5, 268.0)])
+    store.set_zones("DHL", {("CN", "AR"): "5"})
+
+    api = UnifiedShippingAPI(test_mode=True, rate_cards=store)
+    api.fedex_client, api.dhl_client = object(), object()
+    live_calls = []
+    fedex_cost = 250.0
+
+    def fake_quotes(request, carriers=None):
+        live_calls.append(carriers)
+        return {"FedEx": [ShippingQuote("FedEx", "INTERNATIONAL PRIORITY", fedex_cost, "USD", 3, True,
+                                        rate_type="ACCOUNT")]}
+
+    monkeypatch.setattr(api, "get_all_quotes", fake_quotes)
+
+    # 20x15x10 cm / 5000 = 0.6 kg facturables -> escalón de 1 kg
+    def best_rate(origin_country="CN"):
+        return api.get_best_rate(weight=0.35, origin_country=origin_country, dest_country="AR",
+                                 dimensions_cm={"length": 20, "width": 15, "height": 10})
+
+    # DHL sale del tarifario; FedEx, sin tarifario, se cotiza en vivo y es más caro
+    result = best_rate()
+    assert result["success"] and result["source"] == "rate_card"
+    assert (result["carrier"], result["cost_usd"], result["rate_type"]) == ("DHL", 216.54, "RATE_CARD")
+    assert [q.carrier for q in result["alternatives"]] == ["FedEx"]
+    assert live_calls == [["FedEx"]]
+
+    fedex_cost = 180.0
+    result = best_rate()
+    assert (result["carrier"], result["cost_usd"], result["source"]) == ("FedEx", 180.0, "live")
+    assert [q.rate_type for q in result["alternatives"]] == ["RATE_CARD"]
+
+    # Con tarifario vigente para todos los carriers no hay llamadas en vivo
+    store.save_card("FEDEX", "INTERNATIONAL PRIORITY", [("B", 1.0, 150.0)])
+    store.set_zones("FEDEX", {("CN", "*"): "B"})
+    live_calls.clear()
+    result = best_rate()
+    assert (result["carrier"], result["cost_usd"], result["source"]) == ("FEDEX", 150.0, "rate_card")
+    assert live_calls == []
+
+    # Sin tarifario para la ruta se consultan todos los carriers en vivo
+    result = best_rate(origin_country="US")
+    assert (result["carrier"], result["source"]) == ("FedEx", "live")
+    assert live_calls == [None]
+
+
+def test_billable_weight():
+    assert billable_weight_kg(2.0) == 2.0
+    assert billable_weight_kg(0.35, {"length": 20, "width": 15, "height": 10}) == 0.6
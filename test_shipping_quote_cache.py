@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+🧪 Test Shipping Quote Cache - caché de cotizaciones de carriers
+================================================================
+
+Verifica la clave por envío normalizado, la expiración por TTL, la persistencia
+entre instancias, el single-flight de consultas concurrentes y que
+UnifiedShippingAPI solo consulte a los carriers una vez por envío equivalente.
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Agregar directorio del proyecto al path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from carriers_apis_conections import quote_cache, unified_shipping_api
+from carriers_apis_conections.quote_cache import ShippingQuoteCache, make_quote_key
+from carriers_apis_conections.unified_shipping_api import (
+    ShippingQuote, UnifiedShippingAPI, get_shared_shipping_api
+)
+
+ROUTE = ("CN", "518000", "AR", "C1000")
+
+
+def test_key_normalizes_shipment():
+    """Mismo escalón de peso facturable, mayúsculas, espacios y orden de medidas -> misma clave"""
+    base = make_quote_key(1.2, *ROUTE)
+    assert make_quote_key(1.5, "cn", " 518000", "ar", "c 1000") == base
+    assert make_quote_key(1.6, *ROUTE) != base
+    assert make_quote_key(1.2, *ROUTE, service="fastest") != base
+    assert make_quote_key(1.2, *ROUTE, currency="EUR") != base
+    # Sandbox y producción nunca comparten cotizaciones
+    assert make_quote_key(1.2, *ROUTE, test_mode=False) != base
+
+    dims = {"length": 20, "width": 15, "height": 10}
+    assert make_quote_key(0.3, *ROUTE, dimensions_cm=dims) == make_quote_key(
+        0.4, *ROUTE, dimensions_cm={"length": 9.5, "width": 19, "height": 14})
+    # 40x30x20 cm / 5000 = 4.8 kg facturables aunque pese 0.3 kg
+    big = {"length": 40, "width": 30, "height": 20}
+    assert make_quote_key(0.3, *ROUTE, dimensions_cm=big) == make_quote_key(4.9, *ROUTE, dimensions_cm=big)
+
+
+def test_cache_ttl_and_persistence(tmp_path):
+    path = tmp_path / "quotes.sqlite3"
+    cache = ShippingQuoteCache(path, ttl_seconds=3600)
+    cache.put("k", {"success": True, "cost_usd": 10.5})
+    assert ShippingQuoteCache(path).get("k") == {"success": True, "cost_usd": 10.5}
+
+    expired = ShippingQuoteCache(path, ttl_seconds=0.05)
+    time.sleep(0.1)
+    assert expired.get("k") is None
+    assert len(expired) == 0
+
+
+def test_single_flight_shares_one_fetch(tmp_path):
+    """Pedidos concurrentes con la misma clave esperan la misma consulta"""
+    cache = ShippingQuoteCache(tmp_path / "quotes.sqlite3")
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"success": True, "cost_usd": 42.0}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("k", fetch))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"success": True, "cost_usd": 42.0}] * 8
+    assert cache.get_or_fetch("k", fetch) == {"success": True, "cost_usd": 42.0}
+    assert len(calls) == 1
+
+
+def test_unified_api_caches_successful_quotes(tmp_path, monkeypatch):
+    """Un envío equivalente sale de la caché; los errores no se cachean"""
+    api = UnifiedShippingAPI(test_mode=True, quote_cache=ShippingQuoteCache(tmp_path / "quotes.sqlite3"))
+    requests = []
+
+    def fake_quotes(request, carriers=None):
+        requests.append(request)
+        return {"DHL": [ShippingQuote("DHL", "EXPRESS WORLDWIDE", 80.0, "USD", 4, True, rate_type="ACCOUNT")],
+                "FedEx": [ShippingQuote("FedEx", "INTERNATIONAL PRIORITY (ACCOUNT)", 95.5, "USD", 3, True,
+                                        raw_response={"serviceType": "INTERNATIONAL_PRIORITY"})]}
+
+    monkeypatch.setattr(api, "get_all_quotes", fake_quotes)
+    first = api.get_best_rate(weight=1.2, origin_country="CN", origin_postal="518000")
+    second = api.get_best_rate(weight=1.4, origin_country="CN", origin_postal="518000")
+    assert len(requests) == 1
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["best_quote"] == first["best_quote"]
+    assert second["alternatives"] == first["alternatives"]
+    assert second["all_quotes"]["FedEx"][0].raw_response == {"serviceType": "INTERNATIONAL_PRIORITY"}
+    assert second["request"].weight_kg == 1.4
+    # Se cotizó el escalón completo (1.5 kg), válido para 1.2 y 1.4 kg
+    assert [r.weight_kg for r in requests] == [1.5]
+
+    # prefer_speed es otra clave
+    assert api.get_best_rate(weight=1.2, origin_country="CN", prefer_speed=True)["carrier"] == "FedEx"
+    assert len(requests) == 2
+
+    monkeypatch.setattr(api, "get_all_quotes", lambda request, carriers=None: requests.append(request) or {})
+    assert not api.get_best_rate(weight=10, origin_country="CN")["success"]
+    assert not api.get_best_rate(weight=10, origin_country="CN")["success"]
+    assert len(requests) == 4
+
+
+def test_test_mode_and_production_do_not_share_entries(tmp_path, monkeypatch):
+    """Una cotización de sandbox no se devuelve a un pedido de producción, ni al revés"""
+    cache = ShippingQuoteCache(tmp_path / "quotes.sqlite3")
+    sandbox = UnifiedShippingAPI(test_mode=True, quote_cache=cache)
+    production = UnifiedShippingAPI(test_mode=False, quote_cache=cache)
+    for api, cost in ((sandbox, 10.0), (production, 99.0)):
+        monkeypatch.setattr(api, "get_all_quotes", lambda request, carriers=None, cost=cost: {
+            "DHL": [ShippingQuote("DHL", "EXPRESS WORLDWIDE", cost, "USD", 4, True)]})
+
+    assert sandbox.get_best_rate(weight=2.0, origin_country="CN")["cost_usd"] == 10.0
+    result = production.get_best_rate(weight=2.0, origin_country="CN")
+    assert (result["cost_usd"], result["cached"]) == (99.0, False)
+    assert sandbox.get_best_rate(weight=2.0, origin_country="CN")["cost_usd"] == 10.0
+    assert len(cache) == 2
+
+
+def test_unreadable_cache_falls_through_to_carriers(tmp_path, monkeypatch):
+    """Un error de SQLite al leer la caché se trata como miss y se cotiza igual"""
+    cache = ShippingQuoteCache(tmp_path / "quotes.sqlite3")
+
+    def locked(key):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "get", locked)
+    assert cache.get_or_fetch("k", lambda: {"success": True, "cost_usd": 7.0}) == {"success": True, "cost_usd": 7.0}
+
+
+def test_shared_api_is_reused(tmp_path, monkeypatch):
+    """La instancia compartida conserva los clientes y usa la caché global"""
+    monkeypatch.setenv("SHIPPING_QUOTE_CACHE_PATH", str(tmp_path / "quotes.sqlite3"))
+    monkeypatch.setattr(quote_cache, "_quote_cache_initialized", False)
+    monkeypatch.setattr(unified_shipping_api, "_shared_apis", {})
+    api = get_shared_shipping_api(test_mode=True)
+    assert api.quote_cache is not None and api.quote_cache.path == tmp_path / "quotes.sqlite3"
+    assert get_shared_shipping_api(test_mode=True) is get_shared_shipping_api(test_mode=True)
+    assert get_shared_shipping_api(test_mode=True) is not get_shared_shipping_api(test_mode=False)